@@ -1,3 +1,92 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import (Announcement, AnnouncementRecipient, CheckIn, Event, Order, OrganizerMetrics, OutboundEmail,
+                     RecommendationList, TicketCategory, TicketTier, UploadedImage)
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'template_name', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'template_name')
+    search_fields = ('recipient',)
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+
+
+class TicketTierInline(admin.TabularInline):
+    model = TicketTier
+    extra = 0
+
+
+@admin.register(Event)
+class EventAdmin(admin.ModelAdmin):
+    list_display = ('title', 'organizer', 'category', 'status', 'start_date')
+    list_filter = ('status', 'category')
+    search_fields = ('title', 'location')
+    list_select_related = ('organizer',)
+    raw_id_fields = ('organizer',)
+
+
+@admin.register(TicketCategory)
+class TicketCategoryAdmin(admin.ModelAdmin):
+    list_display = ('name', 'event', 'sort_order')
+    list_select_related = ('event',)
+    raw_id_fields = ('event',)
+    inlines = [TicketTierInline]
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'email', 'event', 'status', 'total_amount', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('email',)
+    list_select_related = ('event',)
+    raw_id_fields = ('event', 'buyer')
+
+
+@admin.register(CheckIn)
+class CheckInAdmin(admin.ModelAdmin):
+    list_display = ('ticket', 'event', 'device_id', 'scanned_at', 'recorded_at')
+    list_select_related = ('ticket__event', 'event')
+    raw_id_fields = ('ticket', 'event')
+
+
+@admin.register(OrganizerMetrics)
+class OrganizerMetricsAdmin(admin.ModelAdmin):
+    list_display = ('organizer', 'total_revenue', 'total_attendees', 'total_events', 'updated_at', 'reconciled_at')
+    list_select_related = ('organizer',)
+    readonly_fields = ('organizer', 'total_revenue', 'total_attendees', 'total_events', 'updated_at', 'reconciled_at')
+
+
+@admin.register(RecommendationList)
+class RecommendationListAdmin(admin.ModelAdmin):
+    list_display = ('key', 'computed_at')
+    search_fields = ('key',)
+    readonly_fields = ('key', 'events', 'computed_at')
+
+
+@admin.register(UploadedImage)
+class UploadedImageAdmin(admin.ModelAdmin):
+    list_display = ('key', 'kind', 'owner', 'status', 'width', 'height', 'attempts', 'created_at')
+    list_filter = ('kind', 'status')
+    list_select_related = ('owner',)
+    raw_id_fields = ('owner',)
+    readonly_fields = ('key', 'variants', 'processed_at', 'last_error')
+
+
+@admin.register(Announcement)
+class AnnouncementAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'event', 'sender', 'status', 'recipient_count', 'created_at', 'completed_at')
+    list_filter = ('status',)
+    list_select_related = ('event', 'sender')
+    raw_id_fields = ('event', 'sender')
+    readonly_fields = ('recipient_count', 'completed_at')
+
+
+@admin.register(AnnouncementRecipient)
+class AnnouncementRecipientAdmin(admin.ModelAdmin):
+    list_display = ('email', 'announcement', 'status', 'attempts', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('email',)
+    list_select_related = ('announcement',)
+    raw_id_fields = ('announcement',)
+    readonly_fields = ('message_id', 'last_error', 'sent_at')
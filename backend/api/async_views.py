@@ -0,0 +1,138 @@
+# api/async_views.py
+"""
+Async registration and login views (served through backend/asgi.py).
+
+They mirror UserRegistrationView and UserLoginView but await password
+hashing on the bounded pools in api/hash_pool.py instead of hashing inline,
+and answer 503 + Retry-After when a pool's queue is full or it lost a worker.
+Enabled by settings.ASYNC_AUTH_VIEWS (see api/urls.py).
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+
+from .hash_pool import PoolUnavailable, get_hash_pool, hash_password, verify_password
+from .hashing import dummy_password_hash
+from .mail_queue import enqueue_email
+from .models import CustomUser
+from .serializers import LoginCredentialsSerializer, UserPayload, UserRegisterSerializer
+from .views import get_tokens_for_user
+
+
+def pool_unavailable_response(error):
+    response = JsonResponse(
+        {'detail': 'The server is busy. Please try again shortly.'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+    response['Retry-After'] = str(error.retry_after)
+    return response
+
+
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of APIView: JSON in, JSON out, CSRF exempt.
+    """
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def parse_body(self, request):
+        if request.content_type == 'application/json':
+            try:
+                return json.loads(request.body or b'{}')
+            except ValueError:
+                return None
+        return request.POST.dict()
+
+
+class AsyncUserRegistrationView(AsyncAPIView):
+    """
+    API endpoint for user registration with email and password.
+    """
+    query_budget = 3
+
+    async def post(self, request):
+        data = self.parse_body(request)
+        if data is None:
+            return JsonResponse({'detail': 'Malformed JSON.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = UserRegisterSerializer(data=data)
+        if not await sync_to_async(serializer.is_valid)(): # Unique email check hits the database
+            print("AsyncUserRegistrationView serializer errors:", serializer.errors)
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            encoded_password = await get_hash_pool('register').run(hash_password, serializer.validated_data['password'])
+        except PoolUnavailable as e:
+            return pool_unavailable_response(e)
+
+        try:
+            user = await sync_to_async(serializer.save)(encoded_password=encoded_password)
+        except IntegrityError:
+            return JsonResponse({'email': ['A user with that email already exists.']},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        # New client accounts always go through profile completion
+        payload = UserPayload(user, needs_profile_completion=user.role == 'client')
+        tokens = get_tokens_for_user(user, payload)
+        await sync_to_async(enqueue_email)(
+            'api/emails/account_confirmation.html',
+            "Welcome to Sari-Sari Events! Your Account is Ready",
+            user.email,
+            {'first_name': user.first_name, 'email': user.email},
+        )
+
+        return JsonResponse({
+            'message': 'User registered successfully.',
+            'user': payload.data,
+            'tokens': tokens,
+        }, status=status.HTTP_201_CREATED)
+
+
+class AsyncUserLoginView(AsyncAPIView):
+    """
+    API endpoint for user login with email and password.
+    Returns JWT tokens upon successful authentication.
+    """
+    query_budget = 2 # The user, and an update when its password hash is upgraded
+
+    async def post(self, request):
+        data = self.parse_body(request)
+        if data is None:
+            return JsonResponse({'detail': 'Malformed JSON.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = LoginCredentialsSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        email = serializer.validated_data['email']
+        password = serializer.validated_data['password']
+
+        user = await CustomUser.objects.filter(email=email).afirst()
+        # Unknown emails are checked against a dummy hash so they cost the same as real logins
+        encoded = user.password if user else await sync_to_async(dummy_password_hash)()
+        try:
+            is_valid, upgraded_hash = await get_hash_pool('login').run(verify_password, password, encoded)
+        except PoolUnavailable as e:
+            return pool_unavailable_response(e)
+
+        if user is None or not is_valid or not user.is_active:
+            return JsonResponse({'non_field_errors': ['Invalid login credentials.']},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        if upgraded_hash:
+            user.password = upgraded_hash
+            await user.asave(update_fields=['password'])
+
+        # For login, if they are a client and any required profile fields are missing, flag it.
+        payload = UserPayload(user)
+        tokens = get_tokens_for_user(user, payload)
+        return JsonResponse({
+            'message': 'Login successful.',
+            'user': payload.data,
+            'tokens': tokens,
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,89 @@
+# api/attendees.py
+"""
+Attendee (ticket holder) queries shared by the organizer attendee list and
+exports, so both always apply the same filters.
+
+Search on PostgreSQL is index-backed (see the Ticket indexes): queries
+shorter than TRIGRAM_MIN_LENGTH are name/email prefix matches served by
+text_pattern_ops indexes, longer ones are substring matches served by
+pg_trgm GIN indexes. Exports read every matching row anyway, so they keep
+matching substrings at any length (`indexed_search=False`). Tickets carry their event's organizer, so the
+organizer scope is a plain indexed column rather than a join.
+
+Counting every match of a broad search over hundreds of thousands of
+tickets costs more than the page itself, so `count_attendees` counts
+exactly only up to EXACT_COUNT_LIMIT and otherwise returns the planner's
+row estimate.
+"""
+import json
+
+from django.db import connections
+from django.db.models import F, Q
+
+from .models import Ticket
+
+# Columns of an attendee row, in export order: (header, ticket field path)
+ATTENDEE_COLUMNS = (
+    ('Ticket ID', 'id'),
+    ('Name', 'attendee_name'),
+    ('Email', 'attendee_email'),
+    ('Event', 'event__title'),
+    ('Ticket Tier', 'tier__name'),
+    ('Order ID', 'order_id'),
+    ('Status', 'status'),
+    ('Purchased At', 'created_at'),
+)
+TRIGRAM_MIN_LENGTH = 3 # pg_trgm cannot use its index for shorter patterns
+EXACT_COUNT_LIMIT = 1000
+
+
+def organizer_attendees(organizer_id, event_id=None, search=None, status=None, indexed_search=True):
+    """
+    Tickets for the organizer's events, optionally narrowed to one event, a
+    ticket status, and a name/email search. Ordered by ticket id.
+    With `indexed_search`, searches shorter than TRIGRAM_MIN_LENGTH only
+    match the start of names and emails.
+    """
+    tickets = Ticket.objects.filter(organizer_id=organizer_id)
+    if event_id is not None:
+        tickets = tickets.filter(event_id=event_id)
+    if status:
+        tickets = tickets.filter(status=status)
+    if search:
+        lookup = 'istartswith' if indexed_search and len(search) < TRIGRAM_MIN_LENGTH else 'icontains'
+        tickets = tickets.filter(Q(**{f'attendee_name__{lookup}': search})
+                                 | Q(**{f'attendee_email__{lookup}': search}))
+    return tickets.order_by('id')
+
+
+def attendee_list_rows(tickets):
+    """
+    `tickets` as the attendee list API's row dicts.
+    """
+    return tickets.values('id', 'attendee_name', 'attendee_email', 'event_id', 'status', 'created_at',
+                          event_title=F('event__title'), tier_name=F('tier__name'))
+
+
+def count_attendees(tickets, exact_limit=EXACT_COUNT_LIMIT):
+    """
+    Returns (count, is_estimate). Counts exactly up to `exact_limit` matches;
+    above that, PostgreSQL's row estimate is returned instead (at least
+    `exact_limit + 1`). Other databases always count exactly.
+    """
+    tickets = tickets.order_by()
+    count = tickets[:exact_limit + 1].count() # Stops scanning after exact_limit + 1 rows
+    if count <= exact_limit:
+        return count, False
+    if connections[tickets.db].vendor != 'postgresql':
+        return tickets.count(), False
+    return max(_estimated_rows(tickets), exact_limit + 1), True
+
+
+def _estimated_rows(queryset):
+    sql, params = queryset.values('pk').query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str): # psycopg2 without the json typecaster
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,99 @@
+# api/authentication.py
+"""
+JWT authentication that does not load the user row on every request.
+
+`JWTAuthentication` fetches `CustomUser` by id for each authenticated request
+just so the permission classes can read `request.user.role`. Tokens issued by
+`get_tokens_for_user` carry the role and the account's `token_version`, and
+this class checks them against a short-lived cached copy of the account state
+(is_active, role, token_version). The cache entry is rewritten whenever the
+user is saved, and expires after settings.AUTH_STATE_CACHE_TTL seconds, so a
+deactivated user or a revoked token is cut off within that window even when
+the cache is local to each worker.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import CustomUser
+
+ROLE_CLAIM = 'role'
+VERSION_CLAIM = 'ver'
+
+
+def add_account_claims(token, user):
+    """
+    Embed the claims StatelessJWTAuthentication relies on.
+    Claims set on a refresh token are copied into its access tokens.
+    """
+    token[ROLE_CLAIM] = user.role
+    token[VERSION_CLAIM] = user.token_version
+    return token
+
+
+def _state_key(user_id):
+    return f'auth_state_{user_id}'
+
+
+def cache_account_state(user):
+    """
+    Store the fields authentication depends on. Called whenever a user is saved.
+    """
+    state = {'is_active': user.is_active, 'role': user.role, 'token_version': user.token_version}
+    cache.set(_state_key(user.pk), state, timeout=settings.AUTH_STATE_CACHE_TTL)
+    return state
+
+
+def forget_account_state(user_id):
+    cache.delete(_state_key(user_id))
+
+
+def get_account_state(user_id):
+    """
+    Cached account state, loaded from the database at most once per TTL per cache.
+    Returns None if the user does not exist.
+    """
+    key = _state_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        row = CustomUser.objects.filter(pk=user_id).values('is_active', 'role', 'token_version').first()
+        state = row or {'is_active': False, 'role': None, 'token_version': None, 'missing': True}
+        cache.set(key, state, timeout=settings.AUTH_STATE_CACHE_TTL)
+    return None if state.get('missing') else state
+
+
+class AccountTokenUser(TokenUser):
+    """
+    Token-backed user with the account's current role.
+    Views that need to write to the user must load the `CustomUser` row themselves.
+    """
+    def __init__(self, token, role):
+        super().__init__(token)
+        self.role = role
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    Validates the token signature and the cached account state; never queries
+    the user table while the state is cached.
+    """
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        state = get_account_state(user_id)
+        if state is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if not state['is_active']:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        # Tokens issued before version stamping carry no claim; they match version 0.
+        if validated_token.get(VERSION_CLAIM, 0) != state['token_version']:
+            raise AuthenticationFailed('Token has been revoked.', code='token_revoked')
+
+        return AccountTokenUser(validated_token, role=state['role'])
@@ -0,0 +1,392 @@
+# api/bulk_mail.py
+"""
+Event announcements: one organizer email to every attendee, sent through SES.
+
+`create_announcement()` fixes the recipient list (the event's valid ticket
+holders, one row per address) and returns. `python manage.py
+send_announcements` then sends it:
+
+* The email layout is registered once as an SES template, built from
+  api/templates/api/emails/event_announcement.{html,txt} with SES
+  placeholders where the announcement's text goes. Its name includes a hash
+  of the content, so editing the layout registers a new template instead
+  of changing the one in-flight sends use.
+* Each SendBulkTemplatedEmail call covers up to
+  BULK_EMAIL['DESTINATIONS_PER_CALL'] recipients of one announcement (50 is
+  the SES limit). The announcement's text is the call's default template
+  data; each recipient only adds their name.
+* `SendPacer` keeps the worker under the account's maximum send rate, read
+  from SES at start-up unless BULK_EMAIL['MAX_SEND_RATE'] is set. The rate
+  is per worker process, so run one worker per SES account.
+
+Recipient rows are the checkpoint. A batch is leased ('sending') in its own
+transaction before the SES call and settled from the per-destination
+results after it, so a restarted worker carries on with the rows still
+pending. A batch whose outcome is unknown (the worker stopped mid-call, or
+the connection dropped after the request went out) is marked 'unknown'
+rather than sent again: SES has no idempotency key, so a resend could
+deliver twice. `requeue_unknown()` sends those again when that is wanted.
+"""
+import hashlib
+import json
+import random
+import time
+from datetime import timedelta
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import (BotoCoreError, ClientError, ConnectionClosedError, ReadTimeoutError,
+                                 ResponseStreamingError)
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Lower
+from django.template import Context
+from django.utils import timezone
+from django.utils.html import escape
+
+from .email_templates import email_templates
+from .mail_queue import PERMANENT_SES_ERRORS
+from .models import Announcement, AnnouncementRecipient, Ticket
+
+TEMPLATE_NAME = 'api/emails/event_announcement.html'
+# SES statuses worth another attempt; other failures are final
+RETRYABLE_STATUSES = {'AccountDailyQuotaExceeded', 'TransientFailure', 'Failed', 'TemplateDoesNotExist'}
+# Refused for the send rate, per destination or (Throttling) for the whole call: retried shortly, as a free attempt
+THROTTLED_STATUSES = {'AccountThrottled', 'Throttling'}
+# Errors raised after the request may have reached SES
+UNCERTAIN_ERRORS = (ReadTimeoutError, ConnectionClosedError, ResponseStreamingError)
+# Announcement paragraphs are inserted at send time, after the layout's CSS was inlined
+PARAGRAPH_STYLE = 'font-size: 16px; line-height: 1.6; margin: 0 0 20px;'
+
+
+def bulk_settings():
+    return settings.BULK_EMAIL
+
+
+class SendPacer:
+    """
+    Token bucket that holds sends to `rate` messages per second, with bursts of up to `burst`.
+    `clock` and `sleep` can be replaced in tests.
+    """
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = max(1, burst or rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = 0 # A restarted worker cannot know what it sent in the last second
+        self.updated_at = self.clock()
+
+    def acquire(self, count):
+        """
+        Spend `count` tokens, first waiting for any that are missing.
+        """
+        self._refill()
+        self.tokens -= count
+        if self.tokens < 0:
+            self.sleep(-self.tokens / self.rate)
+
+    def throttled(self):
+        """
+        SES refused a send for the rate: wait a full burst before the next one.
+        """
+        self._refill()
+        self.tokens = min(self.tokens, 0)
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+
+def ses_client(endpoint_url=None):
+    """
+    An SES client for bulk sends, pointed at BULK_EMAIL['SES_ENDPOINT_URL'] if set.
+    botocore's own retries are off: a retried call whose first attempt timed out
+    after reaching SES would send the batch twice.
+    """
+    return boto3.client(
+        'ses',
+        region_name=settings.AWS_SES_REGION_NAME,
+        aws_access_key_id=settings.AWS_SES_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SES_SECRET_ACCESS_KEY,
+        endpoint_url=endpoint_url or bulk_settings()['SES_ENDPOINT_URL'],
+        config=Config(retries={'total_max_attempts': 1}, connect_timeout=5, read_timeout=30),
+    )
+
+
+def make_pacer(client):
+    """
+    A SendPacer for the configured rate, or the account's (from GetSendQuota) scaled by RATE_HEADROOM.
+    Bursts are one call's worth of recipients.
+    """
+    config = bulk_settings()
+    rate = config['MAX_SEND_RATE'] or client.get_send_quota()['MaxSendRate'] * config['RATE_HEADROOM']
+    return SendPacer(rate, burst=destinations_per_call(rate))
+
+
+def destinations_per_call(rate):
+    # A call never needs more than a second's worth of sends, so the rate holds within each second too
+    return max(1, min(bulk_settings()['DESTINATIONS_PER_CALL'], int(rate)))
+
+
+# --- SES template ---
+_registered_templates = set()
+
+
+def ses_template():
+    """
+    The SES template for announcements: {TemplateName, SubjectPart, HtmlPart, TextPart}.
+    Announcement text is HTML-escaped here before it is sent, so it goes into
+    triple-brace (unescaped) placeholders; the recipient's name is escaped by SES.
+    """
+    html_template, text_template = email_templates(TEMPLATE_NAME)
+    html_part = html_template.render(Context({
+        'subject': '{{subject}}', 'event_title': '{{event_title}}', 'name': '{{name}}', 'body_html': '{{{body_html}}}',
+    }, autoescape=False))
+    text_part = text_template.render(Context({
+        'event_title': '{{{event_title}}}', 'name': '{{{name}}}', 'body': '{{{body}}}',
+    }, autoescape=False))
+    digest = hashlib.sha256(f'{html_part}\0{text_part}'.encode()).hexdigest()[:12]
+    return {
+        'TemplateName': f"{bulk_settings()['TEMPLATE_PREFIX']}-{digest}",
+        'SubjectPart': '{{{subject}}}',
+        'HtmlPart': html_part,
+        'TextPart': text_part,
+    }
+
+
+def register_template(client):
+    """
+    Make sure the current announcement template exists in SES. Returns its name.
+    Checked once per worker process.
+    """
+    template = ses_template()
+    name = template['TemplateName']
+    if name in _registered_templates:
+        return name
+    try:
+        client.get_template(TemplateName=name)
+    except ClientError as e:
+        if _error_code(e) != 'TemplateDoesNotExist':
+            raise
+        try:
+            client.create_template(Template=template)
+        except ClientError as e:
+            if _error_code(e) != 'AlreadyExists': # Another worker registered it first
+                raise
+    _registered_templates.add(name)
+    return name
+
+
+def template_data(announcement):
+    paragraphs = [paragraph.strip() for paragraph in announcement.body.replace('\r\n', '\n').split('\n\n')]
+    body_html = ''.join(f'<p style="{PARAGRAPH_STYLE}">{escape(paragraph).replace(chr(10), "<br>")}</p>'
+                        for paragraph in paragraphs if paragraph)
+    return {
+        'subject': announcement.subject,
+        'event_title': announcement.event.title,
+        'body': announcement.body,
+        'body_html': body_html,
+    }
+
+
+# --- Announcements ---
+def create_announcement(event, subject, body, sender_id=None):
+    """
+    Create an announcement to the event's valid ticket holders, one recipient per
+    address (compared case-insensitively), and return it. `sender_id` is the
+    organizer's user id, which is all a token-authenticated request carries.
+    """
+    holders = {}
+    for email, name in (Ticket.objects.filter(event=event, status='valid').order_by('id')
+                        .values_list(Lower('attendee_email'), 'attendee_name').iterator(chunk_size=5000)):
+        holders.setdefault(email, name) # The address's first ticket names it
+    with transaction.atomic():
+        announcement = Announcement.objects.create(event=event, sender_id=sender_id, subject=subject, body=body,
+                                                   recipient_count=len(holders))
+        AnnouncementRecipient.objects.bulk_create(
+            (AnnouncementRecipient(announcement=announcement, email=email, name=name)
+             for email, name in holders.items()),
+            batch_size=5000,
+        )
+    return announcement
+
+
+def announcement_progress(announcement_ids):
+    """
+    {announcement id: {status: recipients}} for the given announcements, in one query.
+    """
+    progress = {pk: {status: 0 for status, _ in AnnouncementRecipient.STATUS_CHOICES} for pk in announcement_ids}
+    for announcement_id, status, total in (AnnouncementRecipient.objects
+                                           .filter(announcement_id__in=announcement_ids)
+                                           .values_list('announcement_id', 'status')
+                                           .annotate(total=Count('id')).order_by()):
+        progress[announcement_id][status] = total
+    return progress
+
+
+# --- Worker ---
+def claim_recipients(limit):
+    """
+    Lease up to `limit` due recipients of one announcement to this worker. Rows
+    left 'sending' by a worker that stopped are marked 'unknown' on the way.
+    """
+    config = bulk_settings()
+    now = timezone.now()
+    with transaction.atomic():
+        stranded = dict(
+            AnnouncementRecipient.objects.select_for_update(skip_locked=True)
+            .filter(status='sending', next_attempt_at__lte=now).values_list('pk', 'announcement_id')
+        )
+        if stranded:
+            AnnouncementRecipient.objects.filter(pk__in=stranded).update(
+                status='unknown', last_error='The worker stopped during the send; not resent to avoid duplicates.')
+            for announcement_id in set(stranded.values()):
+                _complete_if_settled(announcement_id, now) # It may have been the last batch
+        due = list(
+            AnnouncementRecipient.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('announcement_id', 'id')[:limit]
+        )
+        batch = [recipient for recipient in due if recipient.announcement_id == due[0].announcement_id] if due else []
+        if batch:
+            AnnouncementRecipient.objects.filter(pk__in=[recipient.pk for recipient in batch]).update(
+                status='sending',
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + timedelta(seconds=config['LEASE_SECONDS']),
+            )
+            Announcement.objects.filter(pk=due[0].announcement_id, status='queued').update(status='sending')
+            for recipient in batch:
+                recipient.attempts += 1
+    return batch
+
+
+def send_due(client, pacer):
+    """
+    Claim and send one batch. Returns the number of recipients sent, retried, failed and
+    left unknown, or None when nothing is due.
+    """
+    batch = claim_recipients(destinations_per_call(pacer.rate))
+    if not batch:
+        return None
+    announcement = Announcement.objects.select_related('event').get(pk=batch[0].announcement_id)
+    pacer.acquire(len(batch))
+    for _ in range(2):
+        try:
+            template_name = register_template(client)
+        except (BotoCoreError, ClientError) as e:
+            statuses = [{'Status': 'TransientFailure', 'Error': f'Template registration failed: {e}'}] * len(batch)
+            break
+        statuses = _send(client, template_name, announcement, batch)
+        if statuses[0]['Status'] != 'TemplateDoesNotExist':
+            break
+        # Deleted from SES since this worker registered it; nothing was sent, so register it again and resend
+    if any(status['Status'] in THROTTLED_STATUSES for status in statuses):
+        pacer.throttled()
+    return _record(announcement, batch, statuses)
+
+
+def requeue_unknown(announcement_id=None):
+    """
+    Queue 'unknown' recipients again, accepting that some may get the announcement twice.
+    """
+    recipients = AnnouncementRecipient.objects.filter(status='unknown')
+    if announcement_id is not None:
+        recipients = recipients.filter(announcement_id=announcement_id)
+    requeued = recipients.update(status='pending', next_attempt_at=timezone.now(), last_error='')
+    Announcement.objects.filter(recipients__status='pending', status='sent').update(status='sending',
+                                                                                    completed_at=None)
+    return requeued
+
+
+def _send(client, template_name, announcement, batch):
+    """
+    One SendBulkTemplatedEmail call. Returns an SES-style {'Status', 'Error', 'MessageId'} per recipient.
+    """
+    try:
+        response = client.send_bulk_templated_email(
+            Source=settings.DEFAULT_FROM_EMAIL,
+            Template=template_name,
+            DefaultTemplateData=json.dumps(template_data(announcement)),
+            Destinations=[{
+                'Destination': {'ToAddresses': [recipient.email]},
+                'ReplacementTemplateData': json.dumps({'name': recipient.name.split(' ')[0] or 'there'}),
+            } for recipient in batch],
+        )
+    except ClientError as e:
+        code = _error_code(e)
+        if code == 'TemplateDoesNotExist':
+            _registered_templates.discard(template_name)
+        known = code in PERMANENT_SES_ERRORS or code in THROTTLED_STATUSES or code == 'TemplateDoesNotExist'
+        status = code if known else 'TransientFailure'
+        return [{'Status': status, 'Error': str(e)}] * len(batch)
+    except UNCERTAIN_ERRORS as e:
+        return [{'Status': 'Unknown', 'Error': f'{type(e).__name__}: {e}'}] * len(batch)
+    except BotoCoreError as e: # Could not connect: nothing was sent
+        return [{'Status': 'TransientFailure', 'Error': f'{type(e).__name__}: {e}'}] * len(batch)
+    return response['Status']
+
+
+def _record(announcement, batch, statuses):
+    """
+    Settle a sent batch from its SES statuses. Recipients with the same outcome are
+    updated together, so a batch takes a few UPDATEs rather than one per row.
+    """
+    config = bulk_settings()
+    now = timezone.now()
+    outcome = {'sent': 0, 'retried': 0, 'failed': 0, 'unknown': 0}
+    groups, sent, delays = {}, [], {}
+    for recipient, result in zip(batch, statuses):
+        status = result['Status']
+        error, delay = ('' if status == 'Success' else f"{status}: {result.get('Error', '')}"), None
+        if status == 'Success':
+            kind = 'sent'
+            recipient.message_id = result.get('MessageId', '')
+            sent.append(recipient)
+        elif status == 'Unknown':
+            kind = 'unknown'
+        elif status in THROTTLED_STATUSES:
+            kind = 'throttled'
+        elif status in RETRYABLE_STATUSES and recipient.attempts < config['MAX_ATTEMPTS']:
+            kind, delay = 'retried', delays.setdefault(recipient.attempts, _backoff(recipient.attempts))
+        else:
+            kind = 'failed'
+        outcome['retried' if kind == 'throttled' else kind] += 1
+        groups.setdefault((kind, error, delay), []).append(recipient.pk)
+
+    with transaction.atomic():
+        for (kind, error, delay), pks in groups.items():
+            if kind == 'sent':
+                fields = {'status': 'sent', 'sent_at': now}
+            elif kind == 'throttled': # Not counted as an attempt
+                fields = {'status': 'pending', 'attempts': F('attempts') - 1,
+                          'next_attempt_at': now + timedelta(seconds=1)}
+            elif kind == 'retried':
+                fields = {'status': 'pending', 'next_attempt_at': now + timedelta(seconds=delay)}
+            else:
+                fields = {'status': kind}
+            AnnouncementRecipient.objects.filter(pk__in=pks).update(last_error=error, **fields)
+        AnnouncementRecipient.objects.bulk_update(sent, ['message_id'])
+        _complete_if_settled(announcement.pk, now)
+    return outcome
+
+
+def _complete_if_settled(announcement_id, now):
+    """
+    Mark the announcement sent once none of its recipients are pending or being sent.
+    """
+    if not AnnouncementRecipient.objects.filter(announcement_id=announcement_id,
+                                                status__in=('pending', 'sending')).exists():
+        Announcement.objects.filter(pk=announcement_id).exclude(status='sent').update(status='sent',
+                                                                                       completed_at=now)
+
+
+def _backoff(attempts):
+    ceiling = bulk_settings()['BACKOFF_SECONDS'] * 2 ** max(attempts - 1, 0)
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def _error_code(error):
+    return error.response.get('Error', {}).get('Code', '')
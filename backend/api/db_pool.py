@@ -0,0 +1,61 @@
+# api/db_pool.py
+"""
+Database connection pool statistics for this worker process.
+
+Pooling itself is Django's: settings.DB_POOL turns into the PostgreSQL
+backend's OPTIONS['pool'] (a psycopg_pool.ConnectionPool per process and
+database alias), and connections are returned to the pool when a request
+finishes. Each gunicorn worker has its own pool, so the server sees up to
+workers x DB_POOL['MAX_SIZE'] connections, and these figures describe only
+the worker that answers.
+"""
+import os
+
+from django.conf import settings
+from django.db import connections
+
+# psycopg_pool counters, renamed for the stats endpoint
+POOL_STATS = {
+    'pool_min': 'min_size',
+    'pool_max': 'max_size',
+    'pool_size': 'size', # Open connections, in use or idle
+    'pool_available': 'idle',
+    'requests_waiting': 'waiting', # Requests waiting for a connection right now
+    'requests_num': 'checkouts',
+    'requests_queued': 'checkouts_queued', # ... that had to wait
+    'requests_wait_ms': 'wait_ms_total',
+    'requests_errors': 'checkout_errors', # Timed out waiting
+    'returns_bad': 'discarded_broken', # Failed the check before a checkout, or broken when returned
+    'connections_num': 'connections_opened',
+    'connections_ms': 'connect_ms_total',
+    'connections_errors': 'connect_errors',
+    'connections_lost': 'connections_lost', # Found broken while idle
+}
+
+
+def pool_stats(alias='default'):
+    """
+    The alias's pool counters since this process started, or None when it is not pooled.
+    """
+    connection = connections[alias]
+    if connection.vendor != 'postgresql' or connection.pool is None:
+        return None
+    stats = connection.pool.get_stats()
+    return {name: stats.get(key, 0) for key, name in POOL_STATS.items()}
+
+
+def all_pool_stats():
+    """
+    Connection settings and pool counters of every configured database, for this worker process.
+    """
+    databases = []
+    for alias in connections:
+        connection = connections[alias]
+        databases.append({
+            'alias': alias,
+            'vendor': connection.vendor,
+            'pooled': pool_stats(alias) is not None,
+            'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'pool': pool_stats(alias),
+        })
+    return {'pid': os.getpid(), 'pool_enabled': settings.DB_POOL['ENABLED'], 'databases': databases}
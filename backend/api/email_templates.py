@@ -0,0 +1,263 @@
+# api/email_templates.py
+"""
+Email template rendering for the mail queue.
+
+Email templates under api/templates/ are compiled by their own template
+engines, each behind a cached loader, so a worker parses a template once
+and then only renders it:
+
+* The HTML engine inlines the template's <style> rules into style=""
+  attributes as it loads the source, before compiling, so the CSS work is
+  done once per process rather than per message. Rules that cannot be
+  inlined (@import, @media, pseudo-classes) stay in a <style> block, with
+  @media declarations marked !important so they still beat the inlined
+  styles on clients that support them.
+* The plain-text part is a template of its own: `<name>.txt` next to
+  `<name>.html`. Where there is none, one is derived from the HTML source
+  when it is first loaded, instead of running strip_tags() on every
+  rendered message.
+
+With settings.DEBUG the loaders are not cached, so edited templates show up
+without restarting runserver.
+"""
+import html
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.template import Context, Engine, TemplateDoesNotExist
+from django.template.backends.django import get_installed_libraries
+from django.template.loaders.filesystem import Loader as FilesystemLoader
+from django.utils.html import strip_tags
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / 'templates'
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'wbr'}
+
+STYLE_BLOCK = re.compile(r'<style[^>]*>(.*?)</style>', re.S | re.I)
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+CSS_IMPORT = re.compile(r'''@import\s+(?:url\([^)]*\)|"[^"]*"|'[^']*')[^;]*;''', re.I)
+# Start and end tags, with quoted attribute values that may contain ">"
+TAG = re.compile(r'''<(/?)([a-zA-Z][a-zA-Z0-9]*)((?:[^>"']|"[^"]*"|'[^']*')*)>''')
+CLASS_ATTR = re.compile(r'''\sclass\s*=\s*"([^"]*)"''', re.I)
+STYLE_ATTR = re.compile(r'''\sstyle\s*=\s*"([^"]*)"''', re.I)
+# Selectors the inliner understands: "tag", ".class", "tag.class", and descendants of those
+SIMPLE_SELECTOR = re.compile(r'^([a-z][a-z0-9]*)?((?:\.[\w-]+)*)$', re.I)
+
+
+def inline_css(source):
+    """
+    Move the <style> rules of an HTML template source into style attributes.
+    """
+    blocks = STYLE_BLOCK.findall(source)
+    if not blocks:
+        return source
+    rules, kept = [], []
+    for block in blocks:
+        block_rules, block_kept = _parse_stylesheet(CSS_COMMENT.sub('', block), len(rules))
+        rules += block_rules
+        kept += block_kept
+    residual = f"<style>\n{chr(10).join(kept)}\n</style>" if kept else ''
+    # The first block is replaced by what could not be inlined and the others dropped
+    replacements = iter([residual])
+    source = STYLE_BLOCK.sub(lambda match: next(replacements, ''), source)
+
+    output, position, ancestry = [], 0, []
+    for match in TAG.finditer(source):
+        closing, tag, attributes = match.group(1), match.group(2).lower(), match.group(3)
+        if closing:
+            # Tolerates unclosed elements by unwinding to the nearest matching one
+            for index in range(len(ancestry) - 1, -1, -1):
+                if ancestry[index][0] == tag:
+                    del ancestry[index:]
+                    break
+            continue
+        class_match = CLASS_ATTR.search(attributes)
+        classes = frozenset(class_match.group(1).split()) if class_match else frozenset()
+        element = (tag, classes)
+        self_closing = attributes.rstrip().endswith('/')
+        if '{' not in (class_match.group(1) if class_match else ''): # Classes set by template tags are unknown here
+            styled = _apply_rules(rules, ancestry + [element], attributes, self_closing)
+            if styled != attributes:
+                output.append(source[position:match.start(3)])
+                output.append(styled)
+                position = match.end(3)
+        if tag not in VOID_ELEMENTS and not self_closing:
+            ancestry.append(element)
+    output.append(source[position:])
+    return ''.join(output)
+
+
+def text_from_html(source):
+    """
+    A plain-text template derived from an HTML template source: its <body> text,
+    with entities decoded and blank runs collapsed. Template tags pass through.
+    """
+    body = re.sub(r'<head\b.*?</head>', '', source, flags=re.S | re.I)
+    lines, blank = [], False
+    for line in html.unescape(strip_tags(body)).splitlines():
+        line = ' '.join(line.split())
+        if line or not blank:
+            lines.append(line)
+        blank = not line
+    return '\n'.join(lines).strip() + '\n'
+
+
+class InlineCSSLoader(FilesystemLoader):
+    """
+    Filesystem loader that inlines the CSS of .html templates as they are read.
+    """
+    def get_contents(self, origin):
+        contents = super().get_contents(origin)
+        return inline_css(contents) if origin.name.endswith('.html') else contents
+
+
+class TextLoader(FilesystemLoader):
+    """
+    Filesystem loader for the plain-text parts. A missing `<name>.txt` is derived from `<name>.html`.
+    """
+    def get_contents(self, origin):
+        try:
+            return super().get_contents(origin)
+        except TemplateDoesNotExist:
+            if not origin.name.endswith('.txt'):
+                raise
+            try:
+                with open(origin.name[:-len('.txt')] + '.html', encoding=self.engine.file_charset) as fp:
+                    return text_from_html(fp.read())
+            except FileNotFoundError:
+                raise TemplateDoesNotExist(origin)
+
+
+@lru_cache(maxsize=None)
+def _engine(loader):
+    if not settings.DEBUG:
+        loader = ('django.template.loaders.cached.Loader', [loader])
+    return Engine(dirs=[TEMPLATE_DIR], loaders=[loader], libraries=get_installed_libraries())
+
+
+def email_templates(template_name):
+    """
+    The compiled (html, text) templates for `template_name`, e.g. 'api/emails/otp_verification.html'.
+    """
+    html_template = _engine('api.email_templates.InlineCSSLoader').get_template(template_name)
+    text_name = template_name.rsplit('.', 1)[0] + '.txt'
+    return html_template, _engine('api.email_templates.TextLoader').get_template(text_name)
+
+
+def render_email_template(template_name, context):
+    """
+    Render `template_name` with `context` into (html_body, text_body).
+    """
+    return render_many(template_name, [context])[0]
+
+
+def render_many(template_name, contexts):
+    """
+    Render `template_name` once per context, looking the templates up once. Returns (html_body, text_body) pairs.
+    """
+    html_template, text_template = email_templates(template_name)
+    return [
+        (html_template.render(Context(context)), text_template.render(Context(context, autoescape=False)))
+        for context in contexts
+    ]
+
+
+def _parse_stylesheet(css, first_order):
+    """
+    Split a stylesheet into inlinable rules, as (specificity, order, selector parts, declarations),
+    and the text of the rules that have to stay in a <style> block.
+    """
+    rules, kept = [], []
+    imports = CSS_IMPORT.findall(css)
+    kept += imports
+    css = CSS_IMPORT.sub('', css)
+    for prelude, body in _split_blocks(css):
+        if prelude.startswith('@'):
+            # Responsive overrides have to win over the inlined styles
+            inner = ' '.join(f'{selector} {{ {_important(declarations)} }}'
+                             for selector, declarations in _split_blocks(body))
+            kept.append(f'{prelude} {{ {inner} }}')
+            continue
+        declarations = _parse_declarations(body)
+        for selector in prelude.split(','):
+            parts = [SIMPLE_SELECTOR.match(part) for part in selector.split()]
+            if not parts or not all(parts):
+                kept.append(f'{selector.strip()} {{ {body.strip()} }}')
+                continue
+            parts = [((part.group(1) or '').lower() or None, frozenset(filter(None, part.group(2).split('.'))))
+                     for part in parts]
+            specificity = (sum(len(classes) for _, classes in parts), sum(1 for tag, _ in parts if tag))
+            rules.append((specificity, first_order + len(rules), parts, declarations))
+    return rules, kept
+
+
+def _split_blocks(css):
+    """
+    (prelude, body) for each top-level `prelude { body }` in `css`, with nested braces kept in the body.
+    """
+    blocks, position = [], 0
+    while True:
+        start = css.find('{', position)
+        if start == -1:
+            return blocks
+        depth, end = 1, start + 1
+        while depth and end < len(css):
+            depth += {'{': 1, '}': -1}.get(css[end], 0)
+            end += 1
+        blocks.append((css[position:start].strip(), css[start + 1:end - 1]))
+        position = end
+
+
+def _parse_declarations(body):
+    declarations = []
+    for declaration in body.split(';'):
+        name, _, value = declaration.partition(':')
+        if name.strip() and value.strip():
+            declarations.append((name.strip().lower(), value.strip()))
+    return declarations
+
+
+def _important(body):
+    return ' '.join(f'{name}: {value if value.endswith("!important") else value + " !important"};'
+                    for name, value in _parse_declarations(body))
+
+
+def _apply_rules(rules, ancestry, attributes, self_closing):
+    matched = sorted((rule for rule in rules if _matches(rule[2], ancestry)), key=lambda rule: rule[:2])
+    if not matched:
+        return attributes
+    styles = {}
+    for *_, declarations in matched:
+        for name, value in declarations:
+            styles.pop(name, None) # Re-inserted so later rules also come later in the attribute
+            styles[name] = value
+    style_match = STYLE_ATTR.search(attributes)
+    if style_match: # Styles written on the element win, as they would in the browser
+        for name, value in _parse_declarations(style_match.group(1)):
+            styles.pop(name, None)
+            styles[name] = value
+    style = '; '.join(f'{name}: {value}' for name, value in styles.items()).replace('"', "'")
+    if style_match:
+        return f'{attributes[:style_match.start(1)]}{style};{attributes[style_match.end(1):]}'
+    if self_closing:
+        return f'{attributes.rstrip()[:-1].rstrip()} style="{style};" /'
+    return f'{attributes} style="{style};"'
+
+
+def _matches(parts, ancestry):
+    if not _matches_element(parts[-1], ancestry[-1]):
+        return False
+    index = len(ancestry) - 1
+    for part in reversed(parts[:-1]):
+        index -= 1
+        while index >= 0 and not _matches_element(part, ancestry[index]):
+            index -= 1
+        if index < 0:
+            return False
+    return True
+
+
+def _matches_element(part, element):
+    tag, classes = part
+    return (tag is None or tag == element[0]) and classes <= element[1]
@@ -0,0 +1,81 @@
+# api/event_status.py
+"""
+Event status tabs of the admin dashboard (All / Ongoing / Upcoming / Canceled).
+
+A tab is a filter on (status, start_date, end_date), the columns of
+`event_status_dates_idx`: the four tab counts come from one aggregate query
+(an index-only scan on PostgreSQL) and each tab page is one keyset query.
+
+The admin view caches counts and pages for settings.ADMIN_DASHBOARD['CACHE_SECONDS'].
+Cache keys embed a version that `invalidate_event_tabs()` bumps whenever an
+event is saved or deleted (api/signals.py), so edits show up on the next
+request; the short TTL bounds how long an event can sit in the wrong tab
+after its start or end time passes, which no save marks. With the default
+per-process cache the bump only reaches the worker that made the change.
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Event, Ticket
+
+TABS = ('all', 'ongoing', 'upcoming', 'canceled')
+VERSION_KEY = 'event-tabs:version'
+
+
+def tab_filter(tab, now):
+    if tab == 'ongoing':
+        return Q(status='published', start_date__lte=now, end_date__gt=now)
+    if tab == 'upcoming':
+        return Q(status='published', start_date__gt=now)
+    if tab == 'canceled':
+        return Q(status='canceled')
+    return Q()
+
+
+def tab_counts(now):
+    """
+    {tab: number of events} for every tab, in one query.
+    """
+    counts = {tab: Count('id', filter=tab_filter(tab, now)) for tab in TABS if tab != 'all'}
+    return Event.objects.aggregate(all=Count('id'), **counts)
+
+
+def tab_events(tab, now):
+    """
+    Events in `tab`, with the organizer joined and `attendee_count` (valid tickets) annotated.
+    """
+    attendees = (Ticket.objects.filter(event=OuterRef('pk'), status='valid')
+                 .order_by().values('event').annotate(count=Count('id')).values('count'))
+    return (Event.objects.filter(tab_filter(tab, now))
+            .select_related('organizer')
+            .annotate(attendee_count=Coalesce(Subquery(attendees, output_field=IntegerField()), 0)))
+
+
+def event_state(event, now):
+    """
+    The badge shown for an event: its status, or ongoing/upcoming/ended for published events.
+    """
+    if event.status != 'published':
+        return event.status
+    if event.start_date > now:
+        return 'upcoming'
+    return 'ongoing' if event.end_date > now else 'ended'
+
+
+def tab_cache_key(*parts):
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Missing or evicted: start from a value no earlier key can have used
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return ':'.join(['event-tabs', str(version), *map(str, parts)])
+
+
+def invalidate_event_tabs():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        pass # No version yet, so nothing has been cached under one
@@ -0,0 +1,196 @@
+# api/google_auth.py
+"""
+Google ID token verification with a process-wide signing-certificate cache.
+
+`id_token.verify_oauth2_token(token, google_requests.Request(), ...)` downloads
+Google's certificates on every call. Here the certificates are kept for as long
+as Google's Cache-Control max-age allows, refreshed in the background shortly
+before they expire, fetched over a pooled HTTP session, and a stale copy is
+used if Google cannot be reached. One thread fetches at a time, and after a
+failed fetch the next one waits an exponentially growing backoff, so an
+outage costs one request to Google per backoff instead of one per login.
+"""
+import re
+import threading
+import time
+
+import requests
+from django.conf import settings
+from google.auth import jwt
+from requests.adapters import HTTPAdapter
+
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class CertificateFetchError(Exception):
+    pass
+
+
+class GoogleCertificateCache:
+    """
+    Thread-safe cache of Google's public signing certificates ({key id: PEM}).
+
+    - Fresh certificates are served from memory.
+    - Within `refresh_margin` seconds of expiry a background refresh is started
+      while callers keep using the current set.
+    - Expired certificates trigger a synchronous fetch; if that fails the stale
+      set is returned for up to `stale_grace` seconds.
+    - Callers that need a fetch while another thread is fetching wait for its
+      result instead of fetching again.
+    - After a failed fetch, no fetch is tried for `backoff` seconds, doubling
+      per consecutive failure up to `max_backoff`; the stale set is served
+      meanwhile.
+    """
+    def __init__(self, certs_url, session=None, refresh_margin=300, default_max_age=3600,
+                 stale_grace=86400, min_refetch_interval=30, timeout=5, backoff=1, max_backoff=60):
+        self.certs_url = certs_url
+        self.session = session or _build_session()
+        self.refresh_margin = refresh_margin
+        self.default_max_age = default_max_age
+        self.stale_grace = stale_grace
+        self.min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock() # Held for the duration of a fetch
+        self._certs = None
+        self._expires_at = 0.0
+        self._last_fetch_at = 0.0
+        self._last_attempt_at = 0.0
+        self._last_error = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._refreshing = False
+        self.fetch_count = 0
+
+    def get_certs(self, unknown_key_id=None):
+        """
+        Return the current certificate mapping.
+        Pass `unknown_key_id` when a token is signed with a key that is not in
+        the cached set (Google rotated its keys) to force an early refetch.
+        """
+        now = time.time()
+        with self._lock:
+            certs, expires_at = self._certs, self._expires_at
+            rotated = (unknown_key_id is not None and certs is not None and unknown_key_id not in certs
+                       and now - self._last_fetch_at >= self.min_refetch_interval)
+            backing_off = now < self._retry_at
+            if certs is not None and now < expires_at and not rotated:
+                if expires_at - now <= self.refresh_margin and not self._refreshing and not backing_off:
+                    self._refreshing = True
+                    threading.Thread(target=self._background_refresh, daemon=True).start()
+                return certs
+            if backing_off:
+                return self._stale(certs, expires_at, now, self._last_error)
+
+        with self._fetch_lock:
+            with self._lock:
+                # Another thread fetched while this one waited: use its result
+                attempted, fetched = self._last_attempt_at >= now, self._last_fetch_at >= now
+                certs, expires_at, error = self._certs, self._expires_at, self._last_error
+            if fetched:
+                return certs
+            if not attempted:
+                try:
+                    return self.refresh()
+                except CertificateFetchError as e:
+                    error = e
+        certs = self._stale(certs, expires_at, now, error)
+        print(f"GOOGLE CERTS: refresh failed ({error}); using cached certificates.")
+        return certs
+
+    def _stale(self, certs, expires_at, now, error):
+        if certs is not None and now < expires_at + self.stale_grace:
+            return certs
+        raise CertificateFetchError(f'No usable certificates; the last fetch failed: {error}')
+
+    def refresh(self):
+        """
+        Fetch the certificates now and store them. Raises CertificateFetchError on failure
+        and backs off further fetches by get_certs().
+        """
+        try:
+            response = self.session.get(self.certs_url, timeout=self.timeout)
+            response.raise_for_status()
+            certs = response.json()
+        except (requests.RequestException, ValueError) as e:
+            error = CertificateFetchError(str(e))
+            with self._lock:
+                self._last_attempt_at = time.time()
+                self._last_error = error
+                self._failures += 1
+                self._retry_at = time.time() + min(self.backoff * 2 ** (self._failures - 1), self.max_backoff)
+            raise error from e
+
+        max_age = self._max_age(response.headers)
+        with self._lock:
+            self._certs = certs
+            self._expires_at = time.time() + max_age
+            self._last_fetch_at = self._last_attempt_at = time.time()
+            self._failures = 0
+            self._retry_at = 0.0
+            self.fetch_count += 1
+        return certs
+
+    def _background_refresh(self):
+        try:
+            if self._fetch_lock.acquire(blocking=False): # Otherwise a caller is already fetching
+                try:
+                    self.refresh()
+                finally:
+                    self._fetch_lock.release()
+        except CertificateFetchError as e:
+            print(f"GOOGLE CERTS: background refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _max_age(self, headers):
+        match = MAX_AGE_RE.search(headers.get('Cache-Control', ''))
+        if not match:
+            return self.default_max_age
+        age = headers.get('Age', '0')
+        return max(int(match.group(1)) - (int(age) if age.isdigit() else 0), 0)
+
+
+def _build_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=10, max_retries=1)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_certificate_cache = None
+_certificate_cache_lock = threading.Lock()
+
+
+def get_certificate_cache():
+    """
+    The process-wide certificate cache for settings.GOOGLE_CERTS_URL.
+    """
+    global _certificate_cache
+    with _certificate_cache_lock:
+        if _certificate_cache is None or _certificate_cache.certs_url != settings.GOOGLE_CERTS_URL:
+            _certificate_cache = GoogleCertificateCache(settings.GOOGLE_CERTS_URL)
+        return _certificate_cache
+
+
+def verify_google_id_token(token, audience, clock_skew_in_seconds=10):
+    """
+    Verify a Google ID token's signature, expiry, audience and issuer using
+    the cached certificates. Raises ValueError if the token is invalid.
+    """
+    certificate_cache = get_certificate_cache()
+    key_id = jwt.decode_header(token).get('kid')
+    certs = certificate_cache.get_certs()
+    if key_id and key_id not in certs:
+        certs = certificate_cache.get_certs(unknown_key_id=key_id)
+
+    idinfo = jwt.decode(token, certs=certs, audience=audience, clock_skew_in_seconds=clock_skew_in_seconds)
+    if idinfo.get('iss') not in GOOGLE_ISSUERS:
+        raise ValueError('Wrong issuer.')
+    return idinfo
@@ -0,0 +1,212 @@
+# api/hash_pool.py
+"""
+Bounded worker pools for CPU-bound password hashing.
+
+The async register/login views (api/async_views.py) await hashing on these
+pools instead of running it on the event loop. Each pool accepts at most
+WORKERS + MAX_QUEUE jobs; beyond that `submit` raises `PoolSaturated` and
+the view answers 503 with a Retry-After header, so a signup spike queues in
+front of the pool instead of stalling every other request. A process pool
+whose worker died (killed for memory, say) is broken for good: its jobs
+raise `PoolBroken`, answered the same way, and the next job starts a new
+executor.
+
+Pools are per process and configured by settings.AUTH_HASH_POOLS.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+
+RESTART_RETRY_AFTER = 2 # Seconds for a new process pool to start its workers
+
+
+class PoolUnavailable(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PoolSaturated(PoolUnavailable):
+    def __init__(self, pool_name, retry_after):
+        super().__init__(f"Hash pool '{pool_name}' is saturated.", retry_after)
+
+
+class PoolBroken(PoolUnavailable):
+    def __init__(self, pool_name):
+        super().__init__(f"Hash pool '{pool_name}' lost a worker and is restarting.", RESTART_RETRY_AFTER)
+
+
+# --- Jobs (run inside the pool's workers) ---
+def _init_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+
+
+def hash_password(raw_password):
+    return make_password(raw_password)
+
+
+def verify_password(raw_password, encoded):
+    """
+    Returns (is_valid, new_encoded). `new_encoded` is set when the stored hash
+    should be upgraded to the preferred hasher (see api/hashing.py).
+    """
+    upgraded = []
+    is_valid = check_password(raw_password, encoded, setter=lambda raw: upgraded.append(make_password(raw)))
+    return is_valid, (upgraded[0] if upgraded else None)
+
+
+# --- Pool ---
+class HashPool:
+    def __init__(self, name, workers, max_queue, executor='process'):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor_type = executor
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._submitted = 0
+        self._completed = 0
+        self._rejected = 0
+        self._restarts = 0
+        self._avg_job_seconds = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.executor_type == 'thread':
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f'hash-{self.name}')
+            else:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=get_context('spawn'), initializer=_init_worker,
+                )
+        return self._executor
+
+    def _discard_broken(self, executor):
+        # Its processes are already gone; the next submit starts a new executor
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self._restarts += 1
+
+    def submit(self, func, *args):
+        """
+        Schedule `func(*args)` and return a concurrent.futures.Future.
+        Raises PoolSaturated when WORKERS + MAX_QUEUE jobs are already in flight,
+        and PoolBroken when the executor has lost a worker.
+        """
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self._rejected += 1
+                raise PoolSaturated(self.name, self._retry_after())
+            self._in_flight += 1
+            self._submitted += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+            executor = self._get_executor()
+
+        started = time.monotonic()
+
+        def done(future):
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+                # Moving average of submit-to-result time, used for Retry-After
+                self._avg_job_seconds = elapsed if self._completed == 1 else 0.9 * self._avg_job_seconds + 0.1 * elapsed
+            if not future.cancelled() and isinstance(future.exception(), BrokenExecutor):
+                self._discard_broken(executor)
+
+        try:
+            future = executor.submit(func, *args)
+        except BaseException as e:
+            with self._lock:
+                self._in_flight -= 1
+            if isinstance(e, BrokenExecutor):
+                self._discard_broken(executor)
+                raise PoolBroken(self.name) from e
+            raise
+        future.add_done_callback(done)
+        return future
+
+    async def run(self, func, *args):
+        try:
+            return await asyncio.wrap_future(self.submit(func, *args))
+        except BrokenExecutor as e:
+            raise PoolBroken(self.name) from e
+
+    def _retry_after(self):
+        # Time for the current backlog to drain, rounded up to whole seconds.
+        per_job = self._avg_job_seconds or 0.5
+        return max(1, math.ceil(self._in_flight / self.workers * per_job))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'executor': self.executor_type,
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'queue_depth': max(self._in_flight - self.workers, 0),
+                'peak_in_flight': self._peak_in_flight,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'restarts': self._restarts,
+                'avg_job_ms': round(self._avg_job_seconds * 1000, 2),
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_hash_pool(name):
+    """
+    The process-wide pool called `name` ('login' or 'register'), created on first use.
+    Registration and login have separate pools so a signup spike cannot starve logins.
+    """
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            config = settings.AUTH_HASH_POOLS[name]
+            pool = _pools[name] = HashPool(
+                name,
+                workers=config['WORKERS'],
+                max_queue=config['MAX_QUEUE'],
+                executor=config.get('EXECUTOR', 'process'),
+            )
+        return pool
+
+
+def all_pool_stats():
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
+
+
+def reset_hash_pools():
+    """
+    Shut down every pool; the next `get_hash_pool` call rebuilds it from settings.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown()
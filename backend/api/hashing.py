@@ -0,0 +1,89 @@
+# api/hashing.py
+"""
+Password hashing policy.
+
+settings.PASSWORD_HASHING['TIER'] picks the preferred hasher ('argon2', 'bcrypt'
+or 'pbkdf2', mapped to the classes below by settings.PASSWORD_HASHER_TIERS) and
+the work factors are read from the same setting. Hashes made with any other
+listed hasher (or an older work factor) still verify and are transparently
+re-hashed with the preferred one on the next successful login.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    BCryptSHA256PasswordHasher,
+    PBKDF2PasswordHasher,
+    check_password,
+    get_hasher,
+    identify_hasher,
+    make_password,
+)
+from django.utils.crypto import get_random_string
+
+
+# --- Hashers with configurable work factors ---
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_HASHING['ARGON2_TIME_COST']
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_HASHING['ARGON2_MEMORY_COST']
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_HASHING['ARGON2_PARALLELISM']
+
+
+class TunedBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    @property
+    def rounds(self):
+        return settings.PASSWORD_HASHING['BCRYPT_ROUNDS']
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASHING['PBKDF2_ITERATIONS']
+
+
+# --- Timing-equalised login ---
+_dummy_hash = None
+
+
+def dummy_password_hash():
+    """
+    A hash of a random password made with the preferred hasher and work factor.
+    Checking a password against it costs the same as checking a real user's.
+    """
+    global _dummy_hash
+    hasher = get_hasher('default')
+    if (_dummy_hash is None or identify_hasher(_dummy_hash).algorithm != hasher.algorithm
+            or hasher.must_update(_dummy_hash)):
+        _dummy_hash = make_password(get_random_string(32))
+    return _dummy_hash
+
+
+class HashingPolicyBackend(ModelBackend):
+    """
+    ModelBackend that, for unknown emails, verifies the password against a
+    precomputed dummy hash (the same work as a real login) instead of
+    hashing it with a fresh salt.
+    """
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            check_password(password, dummy_password_hash())
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,305 @@
+# api/images.py
+"""
+Event banner and profile picture uploads.
+
+Uploads are streamed to a temporary file by `LimitedUploadHandler`, which
+stops reading once settings.IMAGE_UPLOADS['MAX_BYTES'] is passed. Pillow
+checks the header, and the file is moved into the default storage as
+uploaded, so no request holds a whole file in memory.
+
+Resizing happens in `python manage.py process_images`. It claims pending
+images like the mail queue does, with a lease so a crashed worker's images
+are picked up again, and renders them in a process pool. Each image gets
+every configured width up to its own, in each of IMAGE_UPLOADS['FORMATS'],
+under `images/<key>/`. These names are never reused, so a CDN in front of
+MEDIA_URL can cache the files forever.
+
+The variant list is stored on the image row, so listings that join the
+image can choose the narrowest variant covering the display width
+(`image_payload`) without touching storage. A banner or profile picture
+that a new upload replaces is deleted with its files (`discard_images`).
+"""
+import io
+import math
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import ExifTags, Image, ImageOps, UnidentifiedImageError
+
+from .event_status import invalidate_event_tabs
+from .models import CustomUser, Event, UploadedImage
+
+# Formats accepted for upload, with the extension the original is stored under
+UPLOAD_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'AVIF': 'avif'}
+RETRY_BASE_SECONDS = 30
+CARD_IMAGE_WIDTH = 640 # Default display width (CSS px x pixel ratio) for event cards
+PAGE_IMAGE_WIDTH = 1280 # ... and for the event page banner
+# Orientations that swap width and height (EXIF tag 0x0112)
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+class InvalidImage(Exception):
+    pass
+
+
+class ImageTooLarge(InvalidImage):
+    pass
+
+
+def image_settings():
+    return settings.IMAGE_UPLOADS
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams an uploaded file to a temporary file, and skips the rest of it once it passes `max_bytes`.
+    """
+    def __init__(self, request=None, max_bytes=None):
+        super().__init__(request)
+        self.max_bytes = max_bytes or image_settings()['MAX_BYTES']
+        self.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_bytes:
+            self.too_large = True
+            self.file.close() # Deletes the partial temporary file
+            raise SkipFile()
+        return super().receive_data_chunk(raw_data, start)
+
+
+def receive_upload(request, kind, field='file'):
+    """
+    Store the request's multipart `field` as a pending UploadedImage of `kind` owned by the user.
+    Call before anything reads the request body. Raises ImageTooLarge or InvalidImage.
+    """
+    max_bytes = image_settings()['MAX_BYTES']
+    if int(request.META.get('CONTENT_LENGTH') or 0) > max_bytes + 64 * 1024: # Room for the multipart framing
+        raise ImageTooLarge(f'Images can be at most {max_bytes // (1024 * 1024)} MB.')
+    handler = LimitedUploadHandler(request, max_bytes)
+    getattr(request, '_request', request).upload_handlers = [handler]
+    upload = request.FILES.get(field)
+    if handler.too_large:
+        raise ImageTooLarge(f'Images can be at most {max_bytes // (1024 * 1024)} MB.')
+    if upload is None:
+        raise InvalidImage('No file was submitted.')
+    return store_upload(request.user.id, kind, upload)
+
+
+def store_upload(owner_id, kind, upload):
+    """
+    Check `upload` (a Django File) from its header and save it as a pending UploadedImage.
+    """
+    try:
+        with Image.open(upload) as image:
+            image_format, (width, height) = image.format, image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        image_format = None
+    if image_format not in UPLOAD_FORMATS:
+        raise InvalidImage('Upload a JPEG, PNG, WebP or AVIF image.')
+    max_pixels = image_settings()['MAX_PIXELS']
+    if width * height > max_pixels:
+        raise InvalidImage(f'Images can be at most {max_pixels // 1_000_000} megapixels.')
+
+    upload.seek(0)
+    image = UploadedImage(owner_id=owner_id, kind=kind, width=width, height=height, size=upload.size)
+    # Temporary uploads are moved into file system storage rather than copied
+    image.original.save(f'images/{image.key}/original.{UPLOAD_FORMATS[image_format]}', upload, save=False)
+    image.save()
+    return image
+
+
+def claim_images(batch_size=None):
+    """
+    Lease up to `batch_size` due images to this worker.
+    Rows whose lease has expired (a worker died mid-render) are claimed again.
+    """
+    config = image_settings()
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            UploadedImage.objects
+            .select_for_update(skip_locked=True)
+            .filter(status__in=('pending', 'processing'), next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size or config['BATCH_SIZE']]
+        )
+        if batch:
+            UploadedImage.objects.filter(pk__in=[image.pk for image in batch]).update(
+                status='processing',
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + timedelta(seconds=config['LEASE_SECONDS']),
+            )
+            for image in batch:
+                image.attempts += 1
+    return batch
+
+
+def process_images(batch, executor=None):
+    """
+    Render a claimed batch, in `executor`'s worker processes or inline, and record
+    the outcome of every image. Returns the number of ready, retried and failed images.
+    """
+    config = image_settings()
+    outcome = {'ready': 0, 'retried': 0, 'failed': 0}
+    if executor is not None:
+        results = [(image, executor.submit(render_variants, image.original.name, image.kind)) for image in batch]
+    else:
+        results = [(image, None) for image in batch]
+
+    for image, future in results:
+        try:
+            variants = future.result() if future else render_variants(image.original.name, image.kind)
+        except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+            _mark_failed(image, f'Unreadable image: {e}')
+            outcome['failed'] += 1
+        except Exception as e:
+            if image.attempts >= config['MAX_ATTEMPTS']:
+                _mark_failed(image, f'{type(e).__name__}: {e}')
+                outcome['failed'] += 1
+            else:
+                UploadedImage.objects.filter(pk=image.pk).update(
+                    status='pending', last_error=f'{type(e).__name__}: {e}',
+                    next_attempt_at=timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** image.attempts),
+                )
+                outcome['retried'] += 1
+        else:
+            _mark_ready(image, variants)
+            outcome['ready'] += 1
+    return outcome
+
+
+def render_variants(original_name, kind):
+    """
+    Resize the stored original into every variant and save them next to it.
+    Runs in the worker's process pool, so it reads only storage, never the database.
+    """
+    config = image_settings()
+    widths = config['WIDTHS'][kind]
+    directory = os.path.dirname(original_name)
+    with default_storage.open(original_name) as source_file, Image.open(source_file) as source:
+        transposed = source.getexif().get(ExifTags.Base.Orientation) in TRANSPOSED_ORIENTATIONS
+        width, height = (source.height, source.width) if transposed else source.size
+        # Profile pictures are square crops, so their short side sets the scale
+        scale_side = min(width, height) if kind == 'profile_picture' else width
+        scale = min(1.0, max(widths) / scale_side)
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 size, far faster than decoding in full and resizing
+        draft = (math.ceil(source.width * scale), math.ceil(source.height * scale))
+        source.draft('RGB', draft)
+        image = ImageOps.exif_transpose(source)
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    if kind == 'profile_picture':
+        side = min(image.size)
+        image = ImageOps.fit(image, (side, side))
+
+    variants = []
+    for target in sorted({min(width, image.width) for width in widths}, reverse=True):
+        if target != image.width:
+            # Each size is reduced from the previous, larger one rather than from the original
+            image = image.resize((target, max(1, round(image.height * target / image.width))),
+                                 Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for variant_format, options in config['FORMATS'].items():
+            buffer = io.BytesIO()
+            image.save(buffer, format=variant_format.upper(), **options)
+            name = f'{directory}/{target}w.{variant_format}'
+            if default_storage.exists(name): # Left by an earlier, interrupted attempt
+                default_storage.delete(name)
+            variants.append({
+                'format': variant_format,
+                'width': image.width,
+                'height': image.height,
+                'name': default_storage.save(name, ContentFile(buffer.getvalue())),
+                'size': buffer.tell(),
+            })
+    preference = list(config['FORMATS'])
+    return sorted(variants, key=lambda variant: (variant['width'], preference.index(variant['format'])))
+
+
+def pick_variant(variants, width, variant_format='webp'):
+    """
+    The narrowest variant in `variant_format` at least `width` pixels wide, or the widest one.
+    """
+    candidates = [variant for variant in variants if variant['format'] == variant_format] or variants
+    for variant in candidates:
+        if variant['width'] >= width:
+            return variant
+    return candidates[-1] if candidates else None
+
+
+def variant_url(variant):
+    return default_storage.url(variant['name'])
+
+
+def image_payload(image, width):
+    """
+    What API responses show for an image at `width` CSS pixels (times the device pixel ratio):
+    the best WebP variant as `url`, and `srcset` strings per format for <picture> sources.
+    None until the image is ready.
+    """
+    if image is None or image.status != 'ready' or not image.variants:
+        return None
+    best = pick_variant(image.variants, width)
+    srcset = {}
+    for variant in image.variants:
+        srcset.setdefault(variant['format'], []).append(f"{variant_url(variant)} {variant['width']}w")
+    return {
+        'url': variant_url(best),
+        'width': best['width'],
+        'height': best['height'],
+        'srcset': {variant_format: ', '.join(entries) for variant_format, entries in srcset.items()},
+    }
+
+
+def discard_images(image_ids):
+    """
+    Delete the superseded UploadedImages `image_ids` (None is skipped) and every file under their
+    `images/<key>/`, once the current transaction commits.
+    """
+    image_ids = [pk for pk in image_ids if pk is not None]
+    if image_ids:
+        transaction.on_commit(lambda: _delete_images(image_ids))
+
+
+def _delete_images(image_ids):
+    directories = [os.path.dirname(name) for name in
+                   UploadedImage.objects.filter(pk__in=image_ids).values_list('original', flat=True)]
+    UploadedImage.objects.filter(pk__in=image_ids).delete()
+    for directory in directories:
+        _delete_directory(directory)
+
+
+def _delete_directory(directory):
+    try:
+        names = default_storage.listdir(directory)[1]
+    except FileNotFoundError:
+        return
+    for name in names:
+        default_storage.delete(f'{directory}/{name}')
+
+
+def _mark_ready(image, variants):
+    now = timezone.now()
+    with transaction.atomic():
+        updated = UploadedImage.objects.filter(pk=image.pk).update(status='ready', variants=variants,
+                                                                  processed_at=now, last_error='')
+        if not updated:
+            # Replaced and discarded while it was rendering; drop what this render saved
+            _delete_directory(os.path.dirname(image.original.name))
+        elif image.kind == 'event_banner':
+            # Listings send Last-Modified from updated_at
+            Event.objects.filter(image=image).update(updated_at=now)
+            invalidate_event_tabs() # The admin tabs show the banner's variants
+        else:
+            widest = pick_variant(variants, math.inf)
+            CustomUser.objects.filter(profile_image=image).update(profile_picture=variant_url(widest))
+
+
+def _mark_failed(image, error):
+    UploadedImage.objects.filter(pk=image.pk).update(status='failed', last_error=error)
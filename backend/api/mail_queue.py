@@ -0,0 +1,331 @@
+# api/mail_queue.py
+"""
+Durable outbound email queue.
+
+Views call `enqueue_email()` which only inserts an `OutboundEmail` row.
+The `process_email_queue` management command drains the queue in batches,
+retries failed sends with exponential backoff and dead-letters messages that
+keep failing. The transport is picked from settings.EMAIL_QUEUE['TRANSPORT']
+so the whole pipeline can be exercised offline with the file or SMTP-sink transports.
+
+A row's template context is cleared once it is sent, and also once it is
+dead-lettered for templates in EMAIL_QUEUE['SECRET_TEMPLATES'] (verification
+codes), so delivered codes do not sit in the table. `purge_sent_emails()`
+deletes sent and dead rows after EMAIL_QUEUE['RETENTION_DAYS'].
+"""
+import os
+import random
+import smtplib
+import time
+from datetime import timedelta
+
+import boto3
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .email_templates import render_email_template
+from .models import OutboundEmail
+
+# SES error codes that will never succeed on retry.
+PERMANENT_SES_ERRORS = {
+    'MessageRejected',
+    'MailFromDomainNotVerifiedException',
+    'ConfigurationSetDoesNotExistException',
+}
+
+
+class PermanentSendError(Exception):
+    """
+    Raised by a transport when a message can never be delivered, so the
+    worker dead-letters it instead of scheduling another attempt.
+    """
+    pass
+
+
+def queue_settings():
+    return settings.EMAIL_QUEUE
+
+
+def enqueue_email(template_name, subject, recipient, context=None):
+    """
+    Queue an email for background delivery and return the `OutboundEmail` row.
+    `context` must be JSON serializable; the template is rendered by the worker.
+    """
+    return OutboundEmail.objects.create(
+        template_name=template_name,
+        subject=subject,
+        recipient=recipient,
+        context=context or {},
+    )
+
+
+def render_email(email):
+    """
+    Render an `OutboundEmail` row into (html_body, text_body).
+    """
+    return render_email_template(email.template_name, email.context)
+
+
+# --- Transports ---
+class BaseTransport:
+    """
+    A transport delivers a list of rendered messages.
+    `send_batch` returns one entry per message: None on success or the exception raised.
+    """
+    def send(self, email, html_body, text_body):
+        raise NotImplementedError
+
+    def send_batch(self, messages):
+        results = []
+        for email, html_body, text_body in messages:
+            try:
+                self.send(email, html_body, text_body)
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def close(self):
+        pass
+
+
+class SESTransport(BaseTransport):
+    """
+    Sends through AWS SES. One client (and its pooled HTTPS connection) is
+    reused for the whole lifetime of the worker.
+    """
+    def __init__(self):
+        self.client = boto3.client(
+            'ses',
+            region_name=settings.AWS_SES_REGION_NAME,
+            aws_access_key_id=settings.AWS_SES_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SES_SECRET_ACCESS_KEY,
+        )
+
+    def send(self, email, html_body, text_body):
+        try:
+            self.client.send_email(
+                Source=settings.DEFAULT_FROM_EMAIL,
+                Destination={'ToAddresses': [email.recipient]},
+                Message={
+                    'Subject': {'Data': email.subject},
+                    'Body': {
+                        'Html': {'Data': html_body},
+                        'Text': {'Data': text_body},
+                    },
+                },
+            )
+        except ClientError as e:
+            error = e.response.get('Error', {})
+            if error.get('Code') in PERMANENT_SES_ERRORS:
+                raise PermanentSendError(error.get('Message', str(e))) from e
+            raise
+
+
+class FileTransport(BaseTransport):
+    """
+    Writes each message as an .eml file. Used for local development and offline load tests.
+    """
+    def __init__(self):
+        self.path = queue_settings()['FILE_PATH']
+        os.makedirs(self.path, exist_ok=True)
+
+    def send(self, email, html_body, text_body):
+        message = _build_message(email, html_body, text_body)
+        filename = os.path.join(self.path, f'{email.pk}-{int(time.time() * 1000)}.eml')
+        with open(filename, 'wb') as fh:
+            fh.write(message.message().as_bytes())
+
+
+class SMTPTransport(BaseTransport):
+    """
+    Sends to an SMTP server, typically a local sink such as `python -m aiosmtpd -n`.
+    A single SMTP session is kept open for the whole batch.
+    """
+    def __init__(self):
+        self.connection = None
+
+    def _connect(self):
+        if self.connection is None:
+            config = queue_settings()
+            self.connection = smtplib.SMTP(config['SMTP_HOST'], config['SMTP_PORT'], timeout=10)
+        return self.connection
+
+    def send(self, email, html_body, text_body):
+        message = _build_message(email, html_body, text_body).message()
+        try:
+            self._connect().sendmail(settings.DEFAULT_FROM_EMAIL, [email.recipient], message.as_bytes())
+        except smtplib.SMTPRecipientsRefused as e:
+            raise PermanentSendError(str(e)) from e
+        except smtplib.SMTPServerDisconnected:
+            self.connection = None
+            raise
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except smtplib.SMTPException:
+                pass
+            self.connection = None
+
+
+TRANSPORTS = {
+    'ses': SESTransport,
+    'file': FileTransport,
+    'smtp': SMTPTransport,
+}
+
+
+def get_transport(name=None):
+    name = name or queue_settings()['TRANSPORT']
+    try:
+        return TRANSPORTS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown email transport '{name}'. Choose one of: {', '.join(TRANSPORTS)}")
+
+
+def _build_message(email, html_body, text_body):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=text_body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email.recipient],
+    )
+    message.attach_alternative(html_body, 'text/html')
+    return message
+
+
+# --- Worker ---
+def backoff_delay(attempts):
+    """
+    Seconds to wait before the next attempt: exponential with full jitter, capped.
+    """
+    config = queue_settings()
+    ceiling = min(config['BACKOFF_SECONDS'] * (2 ** max(attempts - 1, 0)), config['MAX_BACKOFF_SECONDS'])
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def claim_batch(batch_size=None):
+    """
+    Lease up to `batch_size` due messages to this worker.
+    Rows whose lease has expired (a worker died mid-send) are claimed again.
+    """
+    config = queue_settings()
+    batch_size = batch_size or config['BATCH_SIZE']
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(status__in=('pending', 'sending'), next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if batch:
+            OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                status='sending',
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + timedelta(seconds=config['LEASE_SECONDS']),
+            )
+            for email in batch:
+                email.attempts += 1
+    return batch
+
+
+def deliver_batch(batch, transport):
+    """
+    Render and send a claimed batch, then record the outcome of every message.
+    Returns a dict with the number of sent, retried and dead-lettered messages.
+    """
+    config = queue_settings()
+    outcome = {'sent': 0, 'retried': 0, 'dead': 0}
+    errors = {}
+    rendered = []
+    for email in batch:
+        try:
+            html_body, text_body = render_email(email)
+        except Exception as e:
+            # A template that cannot render will not fix itself on retry.
+            errors[email.pk] = PermanentSendError(f'Template error: {e}')
+            continue
+        rendered.append((email, html_body, text_body))
+
+    for (email, _, _), error in zip(rendered, transport.send_batch(rendered)):
+        errors[email.pk] = error
+
+    now = timezone.now()
+    for email in batch:
+        error = errors.get(email.pk)
+        if error is None:
+            OutboundEmail.objects.filter(pk=email.pk).update(status='sent', sent_at=now, last_error='', context={})
+            outcome['sent'] += 1
+        elif isinstance(error, PermanentSendError) or email.attempts >= config['MAX_ATTEMPTS']:
+            # Other dead rows keep their context so requeue_dead() can render them again
+            cleared = {'context': {}} if email.template_name in config['SECRET_TEMPLATES'] else {}
+            OutboundEmail.objects.filter(pk=email.pk).update(status='dead', last_error=str(error), **cleared)
+            outcome['dead'] += 1
+        else:
+            OutboundEmail.objects.filter(pk=email.pk).update(
+                status='pending',
+                last_error=str(error),
+                next_attempt_at=now + timedelta(seconds=backoff_delay(email.attempts)),
+            )
+            outcome['retried'] += 1
+    return outcome
+
+
+def requeue_dead():
+    """
+    Move dead-lettered messages back to the queue with a fresh attempt budget. Secret
+    templates are left out: their context is gone and their codes have expired.
+    """
+    return OutboundEmail.objects.filter(status='dead').exclude(
+        template_name__in=queue_settings()['SECRET_TEMPLATES'],
+    ).update(status='pending', attempts=0, next_attempt_at=timezone.now())
+
+
+def purge_sent_emails(now=None):
+    """
+    Delete sent and dead-lettered messages older than EMAIL_QUEUE['RETENTION_DAYS']. Returns the number deleted.
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=queue_settings()['RETENTION_DAYS'])
+    deleted, _ = OutboundEmail.objects.filter(status__in=('sent', 'dead'), created_at__lt=cutoff).delete()
+    return deleted
+
+
+# --- Metrics ---
+def queue_metrics(latency_sample_size=500):
+    """
+    Queue depth per status, age of the oldest due message and end-to-end
+    send latency (enqueue -> delivered) over the most recently sent messages.
+    """
+    now = timezone.now()
+    depth = {status: 0 for status, _ in OutboundEmail.STATUS_CHOICES}
+    for row in OutboundEmail.objects.values('status').annotate(total=Count('id')):
+        depth[row['status']] = row['total']
+
+    oldest = OutboundEmail.objects.filter(status='pending').aggregate(oldest=Min('created_at'))['oldest']
+    recent = OutboundEmail.objects.filter(status='sent').order_by('-sent_at').values_list('created_at', 'sent_at')
+    latencies = sorted((sent_at - created_at).total_seconds() for created_at, sent_at in recent[:latency_sample_size])
+
+    return {
+        'depth': depth,
+        'oldest_pending_age_seconds': (now - oldest).total_seconds() if oldest else 0.0,
+        'send_latency_seconds': {
+            'samples': len(latencies),
+            'p50': _percentile(latencies, 50),
+            'p95': _percentile(latencies, 95),
+            'max': latencies[-1] if latencies else None,
+        },
+    }
+
+
+def _percentile(sorted_values, percentile):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
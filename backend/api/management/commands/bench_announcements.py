@@ -0,0 +1,96 @@
+# api/management/commands/bench_announcements.py
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.bulk_mail import (announcement_progress, claim_recipients, create_announcement, destinations_per_call,
+                           make_pacer, send_due, ses_client)
+from api.models import Announcement, AnnouncementRecipient, CustomUser, Event, Order, Ticket, TicketCategory, TicketTier
+from api.testing import FakeSESServer, load_synthetic_attendees
+
+
+class Command(BaseCommand):
+    help = (
+        'Send an announcement to RECIPIENTS synthetic attendees through a local fake SES endpoint '
+        'limited to RATE messages/sec. The worker is "killed" after CRASH_AFTER calls and restarted; '
+        'checks that nobody gets the announcement twice and reports throughput against the rate.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=2000)
+        parser.add_argument('--rate', type=float, default=200.0, help='The fake account\'s maximum send rate.')
+        parser.add_argument('--latency', type=float, default=0.05, help='Seconds per fake SES response.')
+        parser.add_argument('--crash-after', type=int, default=5,
+                            help='SES calls before the simulated crash; 0 to run without one.')
+
+    def handle(self, *args, **options):
+        run_id = uuid.uuid4().hex[:8]
+        organizer = CustomUser.objects.create_user(email=f'bench-announce-{run_id}@example.com', role='client')
+        start = timezone.now() + timedelta(days=7)
+        event = Event.objects.create(organizer=organizer, title=f'Announcement bench {run_id}', location='Bench',
+                                     start_date=start, end_date=start + timedelta(hours=3), status='published')
+        category = TicketCategory.objects.create(event=event, name='General Admission')
+        tier = TicketTier.objects.create(event=event, category=category, name='Bench', price=100,
+                                         capacity=options['recipients'])
+        order = Order.objects.create(event=event, email='bench@example.com', status='paid')
+        try:
+            load_synthetic_attendees(order, tier, options['recipients'])
+            with FakeSESServer(max_send_rate=options['rate'], latency=options['latency']) as server:
+                self._run(event, organizer, server, options)
+        finally:
+            Announcement.objects.filter(event=event).delete()
+            Ticket.objects.filter(event=event).delete()
+            Order.objects.filter(event=event).delete()
+            event.delete()
+            organizer.delete()
+
+    def _run(self, event, organizer, server, options):
+        started = time.perf_counter()
+        announcement = create_announcement(event, 'Gates open at 6 PM',
+                                           'Doors open an hour early.\n\nBring your QR code & a valid ID.',
+                                           sender_id=organizer.pk)
+        self.stdout.write(f'Recipient list of {announcement.recipient_count} created in '
+                          f'{(time.perf_counter() - started) * 1000:.0f}ms')
+
+        client = ses_client(server.url)
+        pacer = make_pacer(client)
+        totals = {'sent': 0, 'retried': 0, 'failed': 0, 'unknown': 0}
+        started = time.perf_counter()
+        calls, crashed = 0, False
+        while True:
+            if options['crash_after'] and calls == options['crash_after'] and not crashed:
+                # The worker dies holding a claimed batch; its lease then runs out
+                abandoned = claim_recipients(destinations_per_call(pacer.rate))
+                AnnouncementRecipient.objects.filter(pk__in=[recipient.pk for recipient in abandoned]).update(
+                    next_attempt_at=timezone.now() - timedelta(seconds=1))
+                crashed = True
+                self.stdout.write(f'Crashed after {calls} calls holding {len(abandoned)} recipients; restarting')
+                client = ses_client(server.url)
+                pacer = make_pacer(client)
+            outcome = send_due(client, pacer)
+            if outcome is None:
+                if totals['retried'] and announcement_progress([announcement.pk])[announcement.pk]['pending']:
+                    time.sleep(0.5) # Throttled rows wait out their backoff
+                    continue
+                break
+            calls += 1
+            for key, value in outcome.items():
+                totals[key] += value
+        elapsed = time.perf_counter() - started
+
+        progress = announcement_progress([announcement.pk])[announcement.pk]
+        received = server.recipients()
+        self.stdout.write(f"Fake SES at {options['rate']:g}/s, paced at {pacer.rate:g}/s: {calls} calls "
+                          f'({server.throttled_calls} throttled), {len(server.messages)} messages in {elapsed:.1f}s '
+                          f'({len(server.messages) / elapsed:.0f}/s)')
+        self.stdout.write('Recipients: ' + ' '.join(f'{status}={count}' for status, count in progress.items()))
+        duplicates = sum(1 for count in received.values() if count > 1)
+        if duplicates or progress['sent'] != len(server.messages) or progress['pending'] or progress['sending']:
+            self.stdout.write(self.style.ERROR(f'FAIL: {duplicates} addresses received it more than once, or the '
+                                               'recorded progress does not match what SES received'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"OK: no duplicates; {progress['unknown']} recipients left "
+                                                 'unknown by the crash'))
@@ -0,0 +1,100 @@
+# api/management/commands/bench_attendee_export.py
+import multiprocessing
+import os
+import queue
+import resource
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+from django.utils.text import compress_sequence
+
+
+def _export_in_child(organizer_id, file_format, gzipped, results):
+    """
+    Run one export in a fresh process and report how much its peak RSS grew.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+    from api.attendees import ATTENDEE_COLUMNS, organizer_attendees
+    from api.exports import CHUNK_SIZE, stream_csv, stream_xlsx
+
+    writer = {'csv': stream_csv, 'xlsx': stream_xlsx}[file_format]
+    rows = (organizer_attendees(organizer_id).values_list(*[field for _, field in ATTENDEE_COLUMNS])
+            .iterator(chunk_size=CHUNK_SIZE))
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    chunks = writer([header for header, _ in ATTENDEE_COLUMNS], rows)
+    size = sum(len(chunk) for chunk in (compress_sequence(chunks) if gzipped else chunks))
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((size, elapsed, (peak - baseline) / 1024)) # ru_maxrss is in KiB on Linux
+
+
+class Command(BaseCommand):
+    help = (
+        'Export N attendees (default 1M) as CSV, gzipped CSV and XLSX, each in a fresh process, '
+        'and check that peak RSS grows by less than a fixed budget.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attendees', type=int, default=1_000_000)
+        parser.add_argument('--rss-budget-mb', type=float, default=64.0)
+
+    def handle(self, *args, **options):
+        # Imported here: the spawned child imports this module before Django is set up
+        from api.models import CustomUser, Event, Order, Ticket, TicketCategory, TicketTier
+
+        run_id = uuid.uuid4().hex[:8]
+        organizer = CustomUser.objects.create_user(email=f'bench-export-{run_id}@example.com', role='client')
+        start = timezone.now() + timedelta(days=30)
+        event = Event.objects.create(organizer=organizer, title='Export bench', location='Bench',
+                                     start_date=start, end_date=start + timedelta(hours=3), status='published')
+        category = TicketCategory.objects.create(event=event, name='General Admission')
+        tier = TicketTier.objects.create(event=event, category=category, name='Bench', price=100,
+                                         capacity=options['attendees'])
+        order = Order.objects.create(event=event, email='bench@example.com', status='paid')
+        try:
+            started = time.perf_counter()
+            for offset in range(0, options['attendees'], 10000):
+                Ticket.objects.bulk_create([
+                    Ticket(order=order, event=event, organizer=organizer, tier=tier, attendee_name=f'Attendee {i}',
+                           attendee_email=f'attendee{i}@example.com')
+                    for i in range(offset, min(offset + 10000, options['attendees']))
+                ])
+            self.stdout.write(f"Loaded {options['attendees']} attendees in {time.perf_counter() - started:.1f}s")
+
+            connections.close_all()
+            context = multiprocessing.get_context('spawn')
+            failed = False
+            for file_format, gzipped in (('csv', False), ('csv', True), ('xlsx', False)):
+                results = context.Queue()
+                child = context.Process(target=_export_in_child, args=(organizer.pk, file_format, gzipped, results))
+                child.start()
+                while True:
+                    try:
+                        size, elapsed, rss_mb = results.get(timeout=1)
+                        break
+                    except queue.Empty:
+                        if not child.is_alive():
+                            raise RuntimeError(f'{file_format} export process exited with code {child.exitcode}')
+                child.join()
+                label = f"{file_format}{'+gzip' if gzipped else ''}"
+                over = rss_mb > options['rss_budget_mb']
+                failed |= over
+                self.stdout.write(f'{label:<9} {size / 1024 / 1024:8.1f} MB in {elapsed:6.1f}s '
+                                  f'({options["attendees"] / elapsed:8.0f} rows/s), peak RSS +{rss_mb:.1f} MB'
+                                  + (' OVER BUDGET' if over else ''))
+            if failed:
+                self.stdout.write(self.style.ERROR(f"FAIL: RSS grew by more than {options['rss_budget_mb']} MB"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK: every export stayed within +{options['rss_budget_mb']} MB RSS"))
+        finally:
+            Ticket.objects.filter(order=order).delete()
+            order.delete()
+            event.delete()
+            organizer.delete()
@@ -0,0 +1,99 @@
+# api/management/commands/bench_attendee_search.py
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from api.attendees import attendee_list_rows, count_attendees, organizer_attendees
+from api.models import CustomUser, Event, Order, Ticket, TicketCategory, TicketTier
+from api.pagination import paginate_by_id
+from api.testing import SYNTHETIC_FIRST_NAMES, SYNTHETIC_LAST_NAMES, delete_synthetic_rows, load_synthetic_attendees
+
+
+class Command(BaseCommand):
+    help = (
+        'Load an organizer with N attendees (default 200k) next to other organizers\' tickets, then time '
+        'attendee list requests (page + count, as the API runs them) and check p95 against a budget.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attendees', type=int, default=200_000)
+        parser.add_argument('--other-attendees', type=int, default=200_000,
+                            help="Tickets of another organizer, which every query must skip.")
+        parser.add_argument('--events', type=int, default=5)
+        parser.add_argument('--queries', type=int, default=300)
+        parser.add_argument('--budget-ms', type=float, default=50.0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING(
+                'Not a PostgreSQL database: the search indexes and count estimates are not in use.'))
+        run_id = uuid.uuid4().hex[:8]
+        organizer = CustomUser.objects.create_user(email=f'bench-attendees-{run_id}@example.com', role='client')
+        other = CustomUser.objects.create_user(email=f'bench-attendees-other-{run_id}@example.com', role='client')
+        try:
+            started = time.perf_counter()
+            per_event = options['attendees'] // options['events']
+            for i in range(options['events']):
+                self._load(organizer, f'Bench event {i}', per_event, seed=i)
+            self._load(other, 'Other organizer', options['other_attendees'], seed=99)
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Ticket._meta.db_table}')
+            self.stdout.write(f"Loaded {per_event * options['events']} + {options['other_attendees']} attendees "
+                              f'in {time.perf_counter() - started:.1f}s')
+            self._measure(organizer.pk, options['queries'], options['budget_ms'])
+        finally:
+            for user in (organizer, other):
+                delete_synthetic_rows(Ticket, organizer_id=user.pk)
+                Order.objects.filter(event__organizer=user).delete()
+                user.delete()
+
+    def _load(self, organizer, title, count, seed):
+        start = timezone.now() + timedelta(days=30)
+        event = Event.objects.create(organizer=organizer, title=title, location='Bench', start_date=start,
+                                     end_date=start + timedelta(hours=3), status='published')
+        category = TicketCategory.objects.create(event=event, name='General Admission')
+        tier = TicketTier.objects.create(event=event, category=category, name='Bench', price=100,
+                                         capacity=max(count, 1))
+        order = Order.objects.create(event=event, email='bench@example.com', status='paid')
+        load_synthetic_attendees(order, tier, count, seed=seed)
+
+    def _measure(self, organizer_id, count, budget_ms):
+        rng = random.Random(1)
+        middle_cursor = paginate_by_id(organizer_attendees(organizer_id), limit=count * 10)[1]
+        kinds = {
+            'browse': lambda: {},
+            'deep page': lambda: {'cursor': middle_cursor},
+            'prefix': lambda: {'search': rng.choice(SYNTHETIC_FIRST_NAMES)[:2]},
+            'name': lambda: {'search': rng.choice(SYNTHETIC_LAST_NAMES).lower()},
+            'email': lambda: {'search': f'{rng.randrange(10_000, 99_999)}@'},
+            'miss': lambda: {'search': 'zzqx'},
+        }
+        latencies = {kind: [] for kind in kinds}
+        for i in range(count * len(kinds)):
+            kind = list(kinds)[i % len(kinds)]
+            params = kinds[kind]()
+            started = time.perf_counter()
+            tickets = organizer_attendees(organizer_id, search=params.get('search'))
+            paginate_by_id(attendee_list_rows(tickets), params.get('cursor'), 50)
+            count_attendees(tickets)
+            latencies[kind].append(time.perf_counter() - started)
+
+        failed = False
+        self.stdout.write(f"{'query':>10} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for kind, values in latencies.items():
+            values.sort()
+            p50 = statistics.median(values)
+            p95 = values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))]
+            failed |= p95 * 1000 > budget_ms
+            self.stdout.write(f'{kind:>10} {len(values):>6} {p50 * 1000:>8.1f} {p95 * 1000:>8.1f} '
+                              f'{values[-1] * 1000:>8.1f}')
+        if failed:
+            self.stdout.write(self.style.ERROR(f'FAIL: p95 above {budget_ms} ms'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'OK: every p95 within {budget_ms} ms'))
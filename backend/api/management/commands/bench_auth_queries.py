@@ -0,0 +1,61 @@
+# api/management/commands/bench_auth_queries.py
+import time
+import uuid
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from api.authentication import StatelessJWTAuthentication
+from api.models import CustomUser
+from api.permissions import IsClient
+from api.views import get_tokens_for_user
+
+
+def protected_view(authentication_class):
+    class ProtectedView(APIView):
+        authentication_classes = [authentication_class]
+        permission_classes = [IsClient]
+
+        def get(self, request):
+            return Response({'role': request.user.role})
+
+    return ProtectedView.as_view()
+
+
+class Command(BaseCommand):
+    help = 'Queries and latency per authenticated request: row-loading JWTAuthentication vs StatelessJWTAuthentication.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        with transaction.atomic():
+            user = CustomUser.objects.create_user(email=f'bench-auth-{uuid.uuid4().hex[:8]}@example.com', role='client')
+            token = get_tokens_for_user(user)['access']
+            cache.delete(f'auth_state_{user.pk}') # Start cold: the first request fills the cache
+
+            for label, authentication_class in (
+                ('JWTAuthentication', JWTAuthentication),
+                ('StatelessJWTAuthentication', StatelessJWTAuthentication),
+            ):
+                view = protected_view(authentication_class)
+                queries = 0
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    request = factory.get('/bench/', HTTP_AUTHORIZATION=f'Bearer {token}')
+                    with CaptureQueriesContext(connection) as captured:
+                        response = view(request)
+                    assert response.status_code == 200, response.data
+                    queries += len(captured)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{label:<28} {queries / options["requests"]:.3f} queries/request, '
+                                  f'{elapsed / options["requests"] * 1000:.3f} ms/request '
+                                  f'({queries} queries over {options["requests"]} requests)')
+            transaction.set_rollback(True)
@@ -0,0 +1,151 @@
+# api/management/commands/bench_check_ins.py
+import random
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.utils import timezone
+
+from api.models import CheckIn, CustomUser, Event, Order, Ticket, TicketCategory, TicketTier
+from api.testing import delete_synthetic_rows, load_synthetic_attendees
+from api.ticket_codes import record_check_ins, ticket_code, valid_tickets, verification_bundle
+
+
+def _percentile(sorted_values, percentile):
+    index = min(len(sorted_values) - 1, int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate doors opening: GATES devices each scan RATE tickets per second and upload them in a batch '
+        'every FLUSH seconds, with some rescans. Reports batch latency and checks every ticket is admitted once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=50_000)
+        parser.add_argument('--gates', type=int, default=20)
+        parser.add_argument('--rate', type=float, default=5.0, help='Scans per second per gate.')
+        parser.add_argument('--seconds', type=float, default=30.0)
+        parser.add_argument('--flush', type=float, default=1.0, help='Seconds between a gate\'s uploads.')
+        parser.add_argument('--rescan-rate', type=float, default=0.05,
+                            help='Share of scans that repeat a ticket already scanned, at any gate.')
+        parser.add_argument('--backlog', type=int, default=500,
+                            help='Scans uploaded in one batch at the end, as by a gate coming back online.')
+        parser.add_argument('--budget-ms', type=float, default=100.0)
+
+    def handle(self, *args, **options):
+        run_id = uuid.uuid4().hex[:8]
+        organizer = CustomUser.objects.create_user(email=f'bench-checkin-{run_id}@example.com', role='client')
+        start = timezone.now()
+        event = Event.objects.create(organizer=organizer, title=f'Check-in bench {run_id}', location='Bench',
+                                     start_date=start, end_date=start + timedelta(hours=3), status='published')
+        category = TicketCategory.objects.create(event=event, name='General Admission')
+        tier = TicketTier.objects.create(event=event, category=category, name='Bench', price=100,
+                                         capacity=options['tickets'])
+        order = Order.objects.create(event=event, email='bench@example.com', status='paid')
+        try:
+            load_synthetic_attendees(order, tier, options['tickets'])
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(f'ANALYZE {Ticket._meta.db_table}')
+            self._run(event.pk, options)
+        finally:
+            CheckIn.objects.filter(event=event).delete()
+            delete_synthetic_rows(Ticket, event_id=event.pk)
+            Order.objects.filter(event=event).delete()
+            event.delete()
+            organizer.delete()
+
+    def _run(self, event_id, options):
+        per_batch = max(1, round(options['rate'] * options['flush']))
+        batches_per_gate = max(1, int(options['seconds'] / options['flush']))
+        needed = options['gates'] * per_batch * batches_per_gate + options['backlog']
+        ticket_ids = list(Ticket.objects.filter(event_id=event_id).order_by('id').values_list('id', flat=True))
+        if needed > len(ticket_ids):
+            self.stdout.write(self.style.WARNING(f'Only {len(ticket_ids)} tickets for {needed} first scans; '
+                                                 'the rest will be reported as duplicates.'))
+        codes = [ticket_code(ticket_id, event_id) for ticket_id in ticket_ids[:needed]]
+        unscanned = iter(codes)
+        scanned = []
+        lock = threading.Lock()
+        latencies, statuses, errors = [], Counter(), []
+
+        def next_scan(rng):
+            with lock:
+                if scanned and rng.random() < options['rescan_rate']:
+                    return rng.choice(scanned)
+                code = next(unscanned, None) or rng.choice(scanned)
+                scanned.append(code)
+                return code
+
+        def upload(scans, device_id):
+            started = time.perf_counter()
+            results = record_check_ins(event_id, scans, device_id)
+            elapsed = time.perf_counter() - started
+            with lock:
+                statuses.update(result['status'] for result in results)
+            return elapsed
+
+        def gate(index, opened_at):
+            rng = random.Random(index)
+            try:
+                for batch in range(batches_per_gate):
+                    # Each gate uploads on its own schedule, offset so uploads are spread over the interval
+                    due = opened_at + (batch + 1 + index / options['gates']) * options['flush']
+                    time.sleep(max(0.0, due - time.perf_counter()))
+                    latency = upload([(next_scan(rng), timezone.now()) for _ in range(per_batch)], f'gate-{index}')
+                    with lock:
+                        latencies.append(latency)
+            except Exception as e:
+                errors.append(f'{type(e).__name__}: {e}')
+            finally:
+                connections.close_all()
+
+        # Gates download the verification bundle before doors open, which also loads the valid ticket set
+        started = time.perf_counter()
+        verification_bundle(event_id)
+        valid_tickets(event_id)
+        self.stdout.write(f'Bundle and valid ticket set loaded in {(time.perf_counter() - started) * 1000:.0f}ms')
+
+        opened_at = time.perf_counter()
+        threads = [threading.Thread(target=gate, args=(i, opened_at)) for i in range(options['gates'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - opened_at
+        scans = sum(statuses.values())
+        backlog = upload([(next_scan(random.Random(-1)), timezone.now()) for _ in range(options['backlog'])],
+                         'offline-gate') if options['backlog'] else None
+
+        latencies.sort()
+        unique_scanned = len(set(scanned))
+        recorded = CheckIn.objects.filter(event_id=event_id).count()
+        self.stdout.write(f"{options['gates']} gates x {options['rate']:g} scans/s, batches of {per_batch} every "
+                          f"{options['flush']:g}s, for {elapsed:.1f}s: {scans} scans "
+                          f'({scans / elapsed:.0f}/s) against {len(ticket_ids)} tickets')
+        self.stdout.write('Results, including the backlog:')
+        for status, count in sorted(statuses.items()):
+            self.stdout.write(f'  {status}: {count}')
+        if latencies:
+            self.stdout.write(f'Batch latency: p50={statistics.median(latencies) * 1000:.1f}ms '
+                              f'p95={_percentile(latencies, 95) * 1000:.1f}ms max={latencies[-1] * 1000:.1f}ms')
+        if backlog is not None:
+            self.stdout.write(f"Offline backlog of {options['backlog']} scans: {backlog * 1000:.1f}ms")
+        self.stdout.write(f'Tickets scanned: {unique_scanned}, check-ins recorded: {recorded}')
+        for error in errors:
+            self.stdout.write(self.style.ERROR(f'  {error}'))
+
+        failed = errors or recorded != unique_scanned or statuses['admitted'] != recorded
+        if failed:
+            self.stdout.write(self.style.ERROR('FAIL: check-ins do not match the tickets scanned'))
+        elif _percentile(latencies, 95) * 1000 > options['budget_ms']:
+            self.stdout.write(self.style.ERROR(f"FAIL: p95 above {options['budget_ms']} ms"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"OK: each ticket admitted once, p95 within {options['budget_ms']} ms"))
@@ -0,0 +1,145 @@
+# api/management/commands/bench_db_pool.py
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from api.db_pool import pool_stats
+from api.models import CustomUser
+
+PASSWORD = 'Bench-pool-password-1'
+# Environment of each mode's server process; settings.DB_POOL is read from it at startup
+MODES = {
+    'per-request': {'DB_POOL_ENABLED': 'False', 'DB_CONN_MAX_AGE': '0'},
+    'pool': {'DB_POOL_ENABLED': 'True', 'DB_CONN_MAX_AGE': '0'},
+}
+
+
+class QuietHandler(WSGIRequestHandler):
+    def setup(self):
+        super().setup()
+        # As gunicorn does; otherwise the split header and body writes stall on delayed ACKs
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare email-check and login throughput on PostgreSQL with a new connection per request '
+        'against the pooled connections of settings.DB_POOL. Each mode serves the full WSGI stack '
+        'from its own process on localhost and is driven by CONCURRENCY keep-alive clients.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0, help='Measured duration per endpoint.')
+        parser.add_argument('--serve', choices=list(MODES), help='Internal: measure one mode in this process.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('bench_db_pool needs DATABASE_URL to point at PostgreSQL.')
+        if options['serve']:
+            return self._serve(options)
+
+        results = {}
+        for mode in options['modes']:
+            env = {**os.environ, **MODES[mode]}
+            process = subprocess.run(
+                [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'bench_db_pool', '--serve', mode,
+                 '--concurrency', str(options['concurrency']), '--seconds', str(options['seconds'])],
+                env=env, capture_output=True, text=True,
+            )
+            lines = [line for line in process.stdout.splitlines() if line.startswith('{')]
+            if process.returncode or not lines:
+                raise CommandError(f'{mode} run failed:\n{process.stderr[-2000:]}')
+            results[mode] = json.loads(lines[-1])
+
+        self.stdout.write(f"{options['concurrency']} clients, {options['seconds']:g}s per endpoint, "
+                          f'{settings.PASSWORD_HASHING["TIER"]} password hashing')
+        baselines = {}
+        for mode, endpoints in results.items():
+            for name, result in endpoints.items():
+                baselines.setdefault(name, result['rate'])
+                self.stdout.write(
+                    f"  {name:<12} {mode:<12} {result['rate']:8.0f} req/s ({result['rate'] / baselines[name]:.2f}x)"
+                    f"  p50 {result['p50_ms']:6.1f}ms  p95 {result['p95_ms']:6.1f}ms"
+                    f"  {result['connections']:5d} connections opened, {result['errors']} errors")
+
+    def _serve(self, options):
+        opened = []
+        connection_created.connect(lambda sender, connection, **kwargs: opened.append(1), weak=False)
+        email = f'bench-pool-{uuid.uuid4().hex[:8]}@example.com'
+        CustomUser.objects.create_user(email=email, password=PASSWORD, role='client')
+        connection.close() # The server's threads open their own
+
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler, allow_reuse_address=False)
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_address[1]}/api/auth'
+        endpoints = {
+            'email-check': (f'{base_url}/email-check/', {'email': email}),
+            'login': (f'{base_url}/login/', {'email': email, 'password': PASSWORD}),
+        }
+        results = {}
+        try:
+            for name, (url, payload) in endpoints.items():
+                self._drive(url, payload, options['concurrency'], 0.5) # Warm-up
+                before = self._connections_opened(opened)
+                latencies, errors, elapsed = self._drive(url, payload, options['concurrency'], options['seconds'])
+                latencies.sort()
+                results[name] = {
+                    'rate': len(latencies) / elapsed,
+                    'p50_ms': statistics.median(latencies) * 1000 if latencies else 0,
+                    'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+                    'connections': self._connections_opened(opened) - before,
+                    'errors': errors,
+                }
+        finally:
+            server.shutdown()
+            server.server_close()
+            CustomUser.objects.filter(email=email).delete()
+        self.stdout.write(json.dumps(results))
+
+    def _connections_opened(self, opened):
+        # Pooled checkouts also send connection_created, so count what the pool really opened
+        stats = pool_stats()
+        return stats['connections_opened'] if stats is not None else len(opened)
+
+    def _drive(self, url, payload, concurrency, seconds):
+        latencies, errors, lock = [], [0], threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def client():
+            with requests.Session() as session:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    response = session.post(url, json=payload)
+                    with lock:
+                        if response.status_code == 200:
+                            latencies.append(time.perf_counter() - started)
+                        else:
+                            errors[0] += 1
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, errors[0], time.perf_counter() - started
@@ -0,0 +1,54 @@
+# api/management/commands/bench_email_render.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+
+from api.email_templates import render_email_template, render_many
+
+SAMPLE_CONTEXTS = {
+    'api/emails/otp_verification.html': lambda i: {'otp': f'{i % 1_000_000:06d}'},
+    'api/emails/account_confirmation.html': lambda i: {'first_name': f'Guest {i}'},
+    'api/emails/ticket_summary.html': lambda i: {'orders': [{
+        'order_id': i * 10 + n, 'event_title': f'Event {n}', 'location': 'Manila',
+        'starts': 'Sat, Nov 7, 2026 07:00 PM', 'ticket_count': n + 1, 'total_amount': '1500.00',
+    } for n in range(3)]},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Report emails rendered per second for each email template: render_to_string() plus strip_tags(), '
+        'as the mail queue used to, against api.email_templates one at a time and with render_many().'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=2000, help='Emails rendered per template and method.')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        methods = {
+            'render_to_string+strip_tags': lambda name, contexts: [
+                (html_body, strip_tags(html_body))
+                for html_body in (render_to_string(name, context) for context in contexts)
+            ],
+            'render_email_template': lambda name, contexts: [
+                render_email_template(name, context) for context in contexts
+            ],
+            'render_many': render_many,
+        }
+        for name, make_context in SAMPLE_CONTEXTS.items():
+            contexts = [make_context(i) for i in range(count)]
+            self.stdout.write(name)
+            baseline = None
+            for method, render in methods.items():
+                render(name, contexts[:10]) # Loads and compiles the templates
+                started = time.perf_counter()
+                rendered = render(name, contexts)
+                elapsed = time.perf_counter() - started
+                assert len(rendered) == count
+                rate = count / elapsed
+                baseline = baseline or rate
+                self.stdout.write(f'  {method:<28} {rate:9.0f} renders/sec ({rate / baseline:.1f}x) '
+                                  f'{len(rendered[0][0]) / 1024:.1f} KiB html, {len(rendered[0][1])} chars text')
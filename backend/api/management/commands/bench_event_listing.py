@@ -0,0 +1,62 @@
+# api/management/commands/bench_event_listing.py
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from api.models import CustomUser, Event
+from api.pagination import encode_cursor, paginate_by_start_date
+from api.testing import delete_synthetic_rows, load_synthetic_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Load a synthetic catalogue of published events and compare the cost of fetching a page '
+        'at increasing depths with keyset cursors (what /api/events/ uses) versus OFFSET.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=1_000_000)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed fetches per depth (median is reported).')
+        parser.add_argument('--keep', action='store_true', help='Keep the synthetic events for the next run.')
+
+    def handle(self, *args, **options):
+        run_id = uuid.uuid4().hex[:8]
+        organizer = CustomUser.objects.create_user(email=f'bench-events-{run_id}@example.com', role='client')
+        try:
+            self._load(organizer, options['events'])
+            self._measure(options['events'], options['page_size'], options['repeat'])
+        finally:
+            if not options['keep']:
+                delete_synthetic_rows(Event, organizer_id=organizer.pk) # The synthetic events have no dependents
+                organizer.delete()
+
+    def _load(self, organizer, count):
+        started = time.perf_counter()
+        load_synthetic_events(organizer, count)
+        self.stdout.write(f'Loaded {count} events in {time.perf_counter() - started:.1f}s')
+
+    def _measure(self, count, page_size, repeat):
+        events = Event.objects.published().upcoming()
+        ordered = events.order_by('start_date', 'id')
+        self.stdout.write(f"{'depth':>10} {'keyset ms':>10} {'offset ms':>10}")
+        for depth in (0, count // 100, count // 10, count // 2, count - page_size * 2):
+            depth = max(depth, 0)
+            cursor = None
+            if depth:
+                row = ordered.values('start_date', 'id')[depth - 1]
+                cursor = encode_cursor(row['start_date'], row['id'])
+
+            keyset = statistics.median(self._time(lambda: paginate_by_start_date(events, cursor, page_size))
+                                       for _ in range(repeat))
+            offset = statistics.median(self._time(lambda: list(ordered[depth:depth + page_size]))
+                                       for _ in range(repeat))
+            self.stdout.write(f'{depth:>10} {keyset * 1000:>10.2f} {offset * 1000:>10.2f}')
+
+    @staticmethod
+    def _time(fetch):
+        started = time.perf_counter()
+        fetch()
+        return time.perf_counter() - started
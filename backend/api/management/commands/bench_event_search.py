@@ -0,0 +1,76 @@
+# api/management/commands/bench_event_search.py
+import random
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from api.models import CustomUser, Event
+from api.search import rebuild_search_index, search_events, use_postgres_search
+from api.testing import (SYNTHETIC_LOCATIONS, SYNTHETIC_NOUNS, SYNTHETIC_TOPICS, delete_synthetic_rows,
+                         load_synthetic_events)
+
+
+def _typo(word, rng):
+    # Drop one letter, e.g. "concert" -> "concrt"
+    if len(word) < 5:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1:]
+
+
+class Command(BaseCommand):
+    help = (
+        'Load a synthetic event catalogue (default 500k events), then run a mix of exact, multi-word '
+        'and misspelled searches through api.search and report latency percentiles.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=500_000)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--keep', action='store_true', help='Keep the synthetic events for the next run.')
+
+    def handle(self, *args, **options):
+        if not use_postgres_search():
+            self.stdout.write(self.style.WARNING(
+                'Not a PostgreSQL database: measuring the substring fallback, not the full-text index.'))
+        run_id = uuid.uuid4().hex[:8]
+        organizer = CustomUser.objects.create_user(email=f'bench-search-{run_id}@example.com', role='client')
+        try:
+            started = time.perf_counter()
+            load_synthetic_events(organizer, options['events'])
+            indexed = rebuild_search_index()
+            self.stdout.write(f"Loaded {options['events']} events (indexed {indexed}) "
+                              f'in {time.perf_counter() - started:.1f}s')
+            self._measure(options['queries'])
+        finally:
+            if not options['keep']:
+                delete_synthetic_rows(Event, organizer_id=organizer.pk) # The synthetic events have no dependents
+                organizer.delete()
+
+    def _measure(self, count):
+        rng = random.Random(1)
+        kinds = {
+            'word': lambda: rng.choice(SYNTHETIC_NOUNS),
+            'phrase': lambda: f'{rng.choice(SYNTHETIC_TOPICS)} {rng.choice(SYNTHETIC_LOCATIONS)}',
+            'typo': lambda: _typo(rng.choice(SYNTHETIC_NOUNS).lower(), rng),
+        }
+        search_events('warm up')
+        latencies = {kind: [] for kind in kinds}
+        hits = {kind: 0 for kind in kinds}
+        for i in range(count):
+            kind = list(kinds)[i % len(kinds)]
+            query = kinds[kind]()
+            started = time.perf_counter()
+            results = search_events(query)
+            latencies[kind].append(time.perf_counter() - started)
+            hits[kind] += bool(results)
+
+        self.stdout.write(f"{'query':>8} {'count':>6} {'hit %':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for kind, values in latencies.items():
+            values.sort()
+            p50 = statistics.median(values)
+            p95 = values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))]
+            self.stdout.write(f'{kind:>8} {len(values):>6} {hits[kind] / len(values) * 100:>6.0f} '
+                              f'{p50 * 1000:>8.1f} {p95 * 1000:>8.1f} {values[-1] * 1000:>8.1f}')
@@ -0,0 +1,64 @@
+# api/management/commands/bench_google_login.py
+import contextlib
+import io
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from google.auth.transport import requests as google_requests
+from google.oauth2 import id_token
+
+from api.google_auth import get_certificate_cache
+from api.serializers import GoogleLoginSerializer
+from api.testing import FakeGoogleCertsServer
+
+AUDIENCE = 'bench-client-id.apps.googleusercontent.com'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare Google login token verification latency: a fresh certificate download per '
+        'request (the old path) versus the warm process-wide certificate cache. '
+        'Runs entirely against a local fake certificate server.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--latency-ms', type=float, default=60.0,
+                            help='Simulated round trip to the certificate endpoint.')
+
+    def handle(self, *args, **options):
+        with FakeGoogleCertsServer(latency=options['latency_ms'] / 1000) as server, \
+                override_settings(GOOGLE_CERTS_URL=server.url, GOOGLE_CLIENT_ID=AUDIENCE):
+            token = server.make_id_token(email='bench@example.com', audience=AUDIENCE)
+
+            def uncached():
+                id_token.verify_token(token, google_requests.Request(), AUDIENCE,
+                                      certs_url=server.url, clock_skew_in_seconds=10)
+
+            def cached():
+                serializer = GoogleLoginSerializer(data={'token': token})
+                assert serializer.is_valid(), serializer.errors
+
+            get_certificate_cache().get_certs() # Warm the cache once, as the first login would
+            downloads_before = server.requests_served
+            self._report('Per-request certificate download', self._time(uncached, options['requests']))
+            with contextlib.redirect_stdout(io.StringIO()): # Silence the serializer's debug prints
+                warm = self._time(cached, options['requests'])
+            self._report('Warm certificate cache', warm)
+            self.stdout.write(f'Certificate downloads: {server.requests_served - downloads_before} '
+                              f"(uncached path makes one per request)")
+
+    def _time(self, func, count):
+        samples = []
+        for _ in range(count):
+            started = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - started) * 1000)
+        return sorted(samples)
+
+    def _report(self, label, samples):
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        self.stdout.write(f'{label}: mean {statistics.mean(samples):.2f} ms, '
+                          f'p50 {statistics.median(samples):.2f} ms, p95 {p95:.2f} ms')
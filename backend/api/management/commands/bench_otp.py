@@ -0,0 +1,84 @@
+# api/management/commands/bench_otp.py
+import multiprocessing
+import os
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.models import OTPCode
+from api.otp_store import get_otp_store
+
+_store = None
+
+
+def _init_worker(backend):
+    global _store
+    connections.close_all() # Never share the parent's database connection
+    _store = get_otp_store(backend)
+
+
+def _issue(item):
+    email, code = item
+    _store.issue(email, code)
+    return email, os.getpid()
+
+
+def _verify(item):
+    email, code = item
+    return email, os.getpid(), _store.verify(email, code)
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammer OTP send/verify from several processes (like several gunicorn workers) '
+        'and report false negatives and double consumption.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--codes', type=int, default=2000, help='Number of emails to issue codes for.')
+        parser.add_argument('--backend', help='Dotted path overriding settings.OTP_STORE["BACKEND"].')
+
+    def handle(self, *args, **options):
+        run_id = uuid.uuid4().hex[:8]
+        items = [(f'bench-otp-{run_id}-{i}@example.com', f'{random.randint(0, 999999):06d}')
+                 for i in range(options['codes'])]
+
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(options['processes'], initializer=_init_worker, initargs=(options['backend'],)) as pool:
+            started = time.perf_counter()
+            issued_by = dict(pool.map(_issue, items, chunksize=1))
+            issue_seconds = time.perf_counter() - started
+
+            # Every code is verified twice at the same time; exactly one must succeed.
+            verify_items = items + items
+            random.shuffle(verify_items)
+            started = time.perf_counter()
+            results = pool.map(_verify, verify_items, chunksize=1)
+            verify_seconds = time.perf_counter() - started
+
+        successes = {email: 0 for email, _ in items}
+        cross_process = 0
+        for email, pid, accepted in results:
+            successes[email] += int(accepted)
+            if accepted and pid != issued_by[email]:
+                cross_process += 1
+
+        false_negatives = sum(1 for count in successes.values() if count == 0)
+        double_consumed = sum(1 for count in successes.values() if count > 1)
+        OTPCode.objects.filter(email__startswith=f'bench-otp-{run_id}-').delete()
+
+        self.stdout.write(f"Backend: {options['backend'] or 'settings.OTP_STORE'} with {options['processes']} processes")
+        self.stdout.write(f"Issued {len(items)} codes at {len(items) / issue_seconds:.0f}/s")
+        self.stdout.write(f"Verified {len(verify_items)} times at {len(verify_items) / verify_seconds:.0f}/s "
+                          f"({cross_process} accepted codes were issued by a different process)")
+        self.stdout.write(f"False negatives: {false_negatives}")
+        self.stdout.write(f"Double-consumed codes: {double_consumed}")
+        if false_negatives or double_consumed:
+            self.stdout.write(self.style.ERROR('FAIL'))
+        else:
+            self.stdout.write(self.style.SUCCESS('OK: every code was accepted exactly once'))
@@ -0,0 +1,42 @@
+# api/management/commands/bench_password_hashers.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+
+class Command(BaseCommand):
+    help = (
+        'Report password verifications (i.e. logins) per second per core for each hashing tier '
+        'in settings.PASSWORD_HASHER_TIERS, using the work factors in settings.PASSWORD_HASHING.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=3.0, help='Time spent per tier.')
+        parser.add_argument('--tier', action='append', help='Only benchmark these tiers (repeatable).')
+
+    def handle(self, *args, **options):
+        password = 'correct horse battery staple'
+        self.stdout.write(f"Preferred tier: {settings.PASSWORD_HASHING['TIER']}")
+        for tier, path in settings.PASSWORD_HASHER_TIERS.items():
+            if options['tier'] and tier not in options['tier']:
+                continue
+            hasher = import_string(path)()
+            try:
+                encoded = hasher.encode(password, hasher.salt())
+            except ValueError as e: # Missing optional library (e.g. argon2-cffi)
+                self.stdout.write(self.style.WARNING(f'{tier:<7} skipped: {e}'))
+                continue
+
+            logins = 0
+            started = time.perf_counter()
+            while time.perf_counter() - started < options['seconds']:
+                assert hasher.verify(password, encoded)
+                logins += 1
+            elapsed = time.perf_counter() - started
+
+            summary = ', '.join(f'{key}={value}' for key, value in hasher.safe_summary(encoded).items()
+                                if key not in ('algorithm', 'salt', 'hash', 'checksum'))
+            self.stdout.write(f'{tier:<7} {logins / elapsed:9.1f} logins/sec/core '
+                              f'({elapsed / logins * 1000:.1f} ms each; {summary})')
@@ -0,0 +1,115 @@
+# api/management/commands/bench_reservations.py
+import multiprocessing
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Sum
+from django.utils import timezone
+
+from api.models import CustomUser, Event, Order, Ticket, TicketCategory, TicketHold, TicketTier
+from api.reservations import SoldOut, checkout, reserve
+
+
+def _init_worker():
+    connections.close_all() # Never share the parent's database connection
+
+
+def _buy(item):
+    """
+    One buyer: reserve a ticket and, if successful, check out (retrying once
+    with the same Idempotency-Key, as a client would after a timeout).
+    """
+    tier_id, email, quantity = item
+    started = time.perf_counter()
+    try:
+        hold = reserve(tier_id, quantity, email)
+    except SoldOut:
+        return 'sold_out', time.perf_counter() - started, 0
+    except Exception as e:
+        return f'error: {type(e).__name__}: {e}', time.perf_counter() - started, 0
+    latency = time.perf_counter() - started
+
+    key = uuid.uuid4().hex
+    try:
+        first, created = checkout(hold.hold_key, key)
+        retry, created_again = checkout(hold.hold_key, key)
+    except Exception as e:
+        return f'reserved, checkout error: {type(e).__name__}: {e}', latency, 0
+    duplicated = int(first.pk != retry.pk or created_again)
+    return 'reserved', latency, duplicated
+
+
+def _percentile(sorted_values, percentile):
+    index = min(len(sorted_values) - 1, int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Race many concurrent buyers (from several processes, like several gunicorn workers) '
+        'for one small tier and check that it is never oversold. Reports reservation latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=16)
+        parser.add_argument('--buyers', type=int, default=3000)
+        parser.add_argument('--capacity', type=int, default=100)
+        parser.add_argument('--quantity', type=int, default=1, help='Tickets per buyer.')
+
+    def handle(self, *args, **options):
+        run_id = uuid.uuid4().hex[:8]
+        organizer = CustomUser.objects.create_user(email=f'bench-res-{run_id}@example.com', role='client')
+        start = timezone.now() + timedelta(days=30)
+        event = Event.objects.create(organizer=organizer, title=f'Reservation bench {run_id}', location='Bench',
+                                     start_date=start, end_date=start + timedelta(hours=3), status='published')
+        category = TicketCategory.objects.create(event=event, name='General Admission')
+        tier = TicketTier.objects.create(event=event, category=category, name='Bench', price=100,
+                                         capacity=options['capacity'])
+        items = [(tier.pk, f'bench-res-{run_id}-{i}@example.com', options['quantity'])
+                 for i in range(options['buyers'])]
+
+        try:
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(options['processes'], initializer=_init_worker) as pool:
+                started = time.perf_counter()
+                results = pool.map(_buy, items, chunksize=1)
+                elapsed = time.perf_counter() - started
+
+            outcomes = {}
+            for outcome, _, _ in results:
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            reserved = sorted(latency for outcome, latency, _ in results if outcome.startswith('reserved'))
+            duplicated = sum(dup for _, _, dup in results)
+
+            tier.refresh_from_db()
+            holds = TicketHold.objects.filter(tier=tier)
+            held = holds.exclude(status='released').aggregate(n=Sum('quantity'))['n'] or 0
+            converted = holds.filter(status='converted').aggregate(n=Sum('quantity'))['n'] or 0
+            tickets = Ticket.objects.filter(tier=tier).count()
+            oversold = max(held - tier.capacity, 0)
+            consistent = held == tier.capacity - tier.remaining_capacity and tickets == converted
+
+            self.stdout.write(f"{options['buyers']} buyers x {options['quantity']} ticket(s) for {tier.capacity} seats "
+                              f"from {options['processes']} processes in {elapsed:.2f}s")
+            for outcome, count in sorted(outcomes.items()):
+                self.stdout.write(f'  {outcome}: {count}')
+            if reserved:
+                self.stdout.write(f'Reservation latency: p50={_percentile(reserved, 50) * 1000:.1f}ms '
+                                  f'p99={_percentile(reserved, 99) * 1000:.1f}ms max={reserved[-1] * 1000:.1f}ms')
+            self.stdout.write(f'Seats held or sold: {held}, tickets issued: {tickets}, '
+                              f'remaining: {tier.remaining_capacity}, oversold: {oversold}')
+            self.stdout.write(f'Duplicate orders from checkout retries: {duplicated}')
+            if oversold or duplicated or not consistent:
+                self.stdout.write(self.style.ERROR('FAIL: inventory does not add up'))
+            else:
+                self.stdout.write(self.style.SUCCESS('OK: no oversell, one order per idempotency key'))
+        finally:
+            Ticket.objects.filter(event=event).delete()
+            TicketHold.objects.filter(tier=tier).delete()
+            Order.objects.filter(event=event).delete()
+            event.delete()
+            organizer.delete()
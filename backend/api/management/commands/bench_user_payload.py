@@ -0,0 +1,92 @@
+# api/management/commands/bench_user_payload.py
+import datetime
+import timeit
+
+from django.core.management.base import BaseCommand
+from rest_framework import serializers
+
+from api.models import CustomUser
+from api.serializers import UserPayload
+
+
+class StockUserSerializer(serializers.ModelSerializer):
+    """
+    What a plain DRF ModelSerializer for the same payload would look like.
+    """
+    needs_profile_completion = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CustomUser
+        fields = UserPayload.FIELDS + ('needs_profile_completion',)
+
+    def get_needs_profile_completion(self, user):
+        return user.role == 'client' and not all(getattr(user, name) for name in UserPayload.PROFILE_FIELDS)
+
+
+def hand_built_dict(user):
+    """
+    The dict every auth view used to build inline (plus get_tokens_for_user's copy).
+    """
+    needs_profile_completion = user.role == 'client' and (
+        not user.phone_number or
+        not user.birthday or
+        not user.gender or
+        not user.company_name or
+        not user.company_website
+    )
+    data = {
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'profile_picture': user.profile_picture,
+        'role': user.role,
+        'phone_number': user.phone_number,
+        'birthday': user.birthday.isoformat() if user.birthday else None,
+        'gender': user.gender,
+        'company_name': user.company_name,
+        'company_website': user.company_website,
+        'needs_profile_completion': needs_profile_completion,
+    }
+    claims = {
+        'role': user.role,
+        'phone_number': user.phone_number,
+        'birthday': user.birthday.isoformat() if user.birthday else None,
+        'gender': user.gender,
+        'company_name': user.company_name,
+        'company_website': user.company_website,
+    }
+    return data, claims
+
+
+def user_payload(user):
+    payload = UserPayload(user)
+    return payload.data, payload.token_claims()
+
+
+def stock_serializer(user):
+    data = StockUserSerializer(user).data
+    return data, {name: data[name] for name in UserPayload.TOKEN_FIELDS}
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark the per-response cost of building the auth `user` payload.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=2000, help='Payloads built per repeat.')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        user = CustomUser(
+            email='bench@example.com', first_name='Bench', last_name='User', role='client',
+            phone_number='09171234567', birthday=datetime.date(1990, 1, 1), gender='female',
+            company_name='Sari-Sari Events', company_website='https://example.com',
+        )
+        assert hand_built_dict(user) == user_payload(user)
+
+        for label, func in (
+            ('Hand-built dicts', hand_built_dict),
+            ('UserPayload', user_payload),
+            ('DRF ModelSerializer', stock_serializer),
+        ):
+            best = min(timeit.repeat(lambda: func(user), number=options['number'], repeat=options['repeat']))
+            self.stdout.write(f'{label:<22} {best / options["number"] * 1e6:8.2f} us/response')
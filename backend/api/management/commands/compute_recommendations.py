@@ -0,0 +1,21 @@
+# api/management/commands/compute_recommendations.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.recommendations import compute_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recompute every recommended-events list from the ticket history. Schedule it (e.g. hourly).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--list-size', type=int, default=None,
+                            help="Cards per list (default settings.RECOMMENDATIONS['LIST_SIZE']).")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stats = compute_recommendations(list_size=options['list_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {stats['lists']} lists for {stats['users']} users over {stats['candidates']} candidate events "
+            f'in {time.perf_counter() - started:.1f}s.'))
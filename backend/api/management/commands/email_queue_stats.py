@@ -0,0 +1,13 @@
+# api/management/commands/email_queue_stats.py
+import json
+
+from django.core.management.base import BaseCommand
+
+from api.mail_queue import queue_metrics
+
+
+class Command(BaseCommand):
+    help = 'Print outbound email queue depth and send latency as JSON.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(queue_metrics(), indent=2))
@@ -0,0 +1,53 @@
+# api/management/commands/process_email_queue.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.mail_queue import claim_batch, deliver_batch, get_transport, requeue_dead
+
+
+class Command(BaseCommand):
+    help = 'Drain the outbound email queue: send in batches, retry with backoff and dead-letter failures.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transport', choices=['ses', 'file', 'smtp'],
+                            help='Override settings.EMAIL_QUEUE["TRANSPORT"].')
+        parser.add_argument('--batch-size', type=int, help='Messages claimed per batch.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue has no due messages.')
+        parser.add_argument('--idle-sleep', type=float, default=1.0,
+                            help='Seconds to sleep when there is nothing to send.')
+        parser.add_argument('--requeue-dead', action='store_true',
+                            help='Move dead-lettered messages back to the queue before starting.')
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            self.stdout.write(f'Requeued {requeue_dead()} dead-lettered messages.')
+
+        transport = get_transport(options['transport'])
+        totals = {'sent': 0, 'retried': 0, 'dead': 0}
+        try:
+            while True:
+                batch = claim_batch(options['batch_size'])
+                if not batch:
+                    if options['once']:
+                        break
+                    time.sleep(options['idle_sleep'])
+                    continue
+
+                started = time.monotonic()
+                outcome = deliver_batch(batch, transport)
+                elapsed_ms = (time.monotonic() - started) * 1000
+                for key, value in outcome.items():
+                    totals[key] += value
+                self.stdout.write(
+                    f"Batch of {len(batch)}: sent={outcome['sent']} retried={outcome['retried']} "
+                    f"dead={outcome['dead']} in {elapsed_ms:.1f} ms ({elapsed_ms / len(batch):.1f} ms/message)"
+                )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            transport.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. sent={totals['sent']} retried={totals['retried']} dead={totals['dead']}"
+        ))
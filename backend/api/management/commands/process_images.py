@@ -0,0 +1,56 @@
+# api/management/commands/process_images.py
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.images import claim_images, process_images
+
+
+class Command(BaseCommand):
+    help = 'Create the WebP/AVIF variants of uploaded images in a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Override settings.IMAGE_UPLOADS["WORKERS"].')
+        parser.add_argument('--batch-size', type=int, help='Images claimed per batch.')
+        parser.add_argument('--once', action='store_true', help='Exit once no images are due.')
+        parser.add_argument('--idle-sleep', type=float, default=1.0,
+                            help='Seconds to sleep when there is nothing to process.')
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or settings.IMAGE_UPLOADS['WORKERS'] or multiprocessing.cpu_count()
+        batch_size = options['batch_size'] or max(settings.IMAGE_UPLOADS['BATCH_SIZE'], workers)
+        totals = {'ready': 0, 'retried': 0, 'failed': 0}
+        # A forked pool starts all its processes on the first submit. Do that before this process
+        # opens a database connection, so no renderer inherits (and on exit, closes) it.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(workers, mp_context=context) as executor:
+            executor.submit(int).result()
+            try:
+                while True:
+                    batch = claim_images(batch_size)
+                    if not batch:
+                        if options['once']:
+                            break
+                        time.sleep(options['idle_sleep'])
+                        continue
+
+                    started = time.monotonic()
+                    outcome = process_images(batch, executor)
+                    elapsed_ms = (time.monotonic() - started) * 1000
+                    for key, value in outcome.items():
+                        totals[key] += value
+                    self.stdout.write(
+                        f"Batch of {len(batch)}: ready={outcome['ready']} retried={outcome['retried']} "
+                        f"failed={outcome['failed']} in {elapsed_ms:.0f} ms on {workers} processes"
+                    )
+            except KeyboardInterrupt:
+                pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. ready={totals['ready']} retried={totals['retried']} failed={totals['failed']}"
+        ))
@@ -0,0 +1,12 @@
+# api/management/commands/purge_email_queue.py
+from django.core.management.base import BaseCommand
+
+from api.mail_queue import purge_sent_emails
+
+
+class Command(BaseCommand):
+    help = 'Delete sent and dead-lettered emails older than EMAIL_QUEUE["RETENTION_DAYS"]. Schedule it daily.'
+
+    def handle(self, *args, **options):
+        removed = purge_sent_emails()
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} old outbound emails.'))
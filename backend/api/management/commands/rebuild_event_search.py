@@ -0,0 +1,15 @@
+# api/management/commands/rebuild_event_search.py
+from django.core.management.base import BaseCommand
+
+from api.search import rebuild_search_index, use_postgres_search
+
+
+class Command(BaseCommand):
+    help = 'Recompute every event\'s full-text search document (e.g. after a bulk import). PostgreSQL only.'
+
+    def handle(self, *args, **options):
+        if not use_postgres_search():
+            self.stdout.write(self.style.WARNING('Not a PostgreSQL database: search uses substring matching, nothing to rebuild.'))
+            return
+        updated = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the search document of {updated} events.'))
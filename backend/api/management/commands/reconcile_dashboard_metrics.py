@@ -0,0 +1,12 @@
+# api/management/commands/reconcile_dashboard_metrics.py
+from django.core.management.base import BaseCommand
+
+from api.metrics import reconcile_organizer_metrics
+
+
+class Command(BaseCommand):
+    help = 'Recompute organizer dashboard totals from orders, tickets and events. Schedule it (e.g. nightly).'
+
+    def handle(self, *args, **options):
+        corrected = reconcile_organizer_metrics()
+        self.stdout.write(self.style.SUCCESS(f'Corrected {corrected} organizer metric rows.'))
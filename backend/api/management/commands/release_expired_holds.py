@@ -0,0 +1,12 @@
+# api/management/commands/release_expired_holds.py
+from django.core.management.base import BaseCommand
+
+from api.reservations import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Return the tickets of expired reservations to their tiers. Schedule it every minute.'
+
+    def handle(self, *args, **options):
+        released = release_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired ticket holds.'))
@@ -0,0 +1,47 @@
+# api/management/commands/send_announcements.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.bulk_mail import make_pacer, requeue_unknown, send_due, ses_client
+
+
+class Command(BaseCommand):
+    help = (
+        'Send queued event announcements through SES in SendBulkTemplatedEmail batches, '
+        'paced to the account send rate. Safe to stop and restart at any point.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint-url', help='Override settings.BULK_EMAIL["SES_ENDPOINT_URL"].')
+        parser.add_argument('--once', action='store_true', help='Exit once no recipients are due.')
+        parser.add_argument('--idle-sleep', type=float, default=5.0,
+                            help='Seconds to sleep when there is nothing to send.')
+        parser.add_argument('--requeue-unknown', action='store_true',
+                            help='Send again to recipients whose delivery is unknown. Some may get it twice.')
+
+    def handle(self, *args, **options):
+        if options['requeue_unknown']:
+            self.stdout.write(f'Requeued {requeue_unknown()} recipients with unknown delivery.')
+
+        client = ses_client(options['endpoint_url'])
+        pacer = make_pacer(client)
+        self.stdout.write(f'Sending at up to {pacer.rate:g} messages/sec.')
+        totals = {'sent': 0, 'retried': 0, 'failed': 0, 'unknown': 0}
+        try:
+            while True:
+                started = time.monotonic()
+                outcome = send_due(client, pacer)
+                if outcome is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['idle_sleep'])
+                    continue
+                for key, value in outcome.items():
+                    totals[key] += value
+                self.stdout.write(' '.join(f'{key}={value}' for key, value in outcome.items())
+                                  + f' in {(time.monotonic() - started) * 1000:.0f} ms')
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS('Done. ' + ' '.join(f'{key}={value}' for key, value in totals.items())))
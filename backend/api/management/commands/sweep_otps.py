@@ -0,0 +1,12 @@
+# api/management/commands/sweep_otps.py
+from django.core.management.base import BaseCommand
+
+from api.otp_store import get_otp_store
+
+
+class Command(BaseCommand):
+    help = 'Delete expired email verification codes. Schedule it (e.g. every 10 minutes) for the database backend.'
+
+    def handle(self, *args, **options):
+        removed = get_otp_store().sweep()
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} expired verification codes.'))
@@ -0,0 +1,114 @@
+# api/metrics.py
+"""
+Organizer dashboard metrics.
+
+`OrganizerMetrics` holds one row of running totals per organizer (revenue,
+attendees, events created). Writers apply deltas with a single
+`UPDATE ... SET total = total + delta`, so the dashboard reads one row instead
+of aggregating every order and ticket the organizer has ever sold:
+
+- events: post_save/post_delete signals on Event (api/signals.py)
+- orders: `record_order` from checkout (api/reservations.py), applied after
+  the order's transaction commits so the hot row is locked only briefly
+
+`reconcile_organizer_metrics` (`python manage.py reconcile_dashboard_metrics`)
+recomputes every row from the source tables and corrects any drift, e.g.
+from orders edited in the admin or a worker that died before its delta ran.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Event, Order, OrganizerMetrics, Ticket
+
+
+def apply_metrics_delta(organizer_id, revenue=0, attendees=0, events=0, create=True):
+    """
+    Add the deltas to the organizer's row, creating it on first use unless `create` is False.
+    Counts never go below zero, even when a delete races the row's creation or a reconcile.
+    """
+    changes = {
+        'total_revenue': F('total_revenue') + revenue,
+        'total_attendees': Greatest(F('total_attendees') + attendees, 0),
+        'total_events': Greatest(F('total_events') + events, 0),
+        'updated_at': timezone.now(),
+    }
+    if OrganizerMetrics.objects.filter(pk=organizer_id).update(**changes) or not create:
+        return
+    try:
+        with transaction.atomic():
+            OrganizerMetrics.objects.create(organizer_id=organizer_id)
+    except IntegrityError:
+        pass # Created concurrently by another writer
+    OrganizerMetrics.objects.filter(pk=organizer_id).update(**changes)
+
+
+def record_order(event_id, revenue, attendees):
+    """
+    Count a paid order (or, with negative values, a refund) once the current transaction commits.
+    """
+    def apply():
+        organizer_id = Event.objects.filter(pk=event_id).values_list('organizer_id', flat=True).first()
+        if organizer_id is not None:
+            apply_metrics_delta(organizer_id, revenue=revenue, attendees=attendees)
+
+    transaction.on_commit(apply)
+
+
+def dashboard_metrics(organizer_id):
+    """
+    The dashboard cards in one query: the rollup row plus an indexed count of upcoming events,
+    as Event.objects.upcoming() defines them (not yet ended), so the card matches the public listing.
+    """
+    upcoming = (Event.objects.published().upcoming().filter(organizer_id=OuterRef('pk'))
+                .order_by().values('organizer_id').annotate(count=Count('id')).values('count'))
+    row = (OrganizerMetrics.objects.filter(pk=organizer_id)
+           .annotate(upcoming_events=Coalesce(Subquery(upcoming), 0))
+           .values('total_revenue', 'total_attendees', 'total_events', 'upcoming_events', 'updated_at')
+           .first())
+    # No row yet: the organizer has never created an event
+    return row or {'total_revenue': 0, 'total_attendees': 0, 'total_events': 0, 'upcoming_events': 0,
+                   'updated_at': None}
+
+
+def reconcile_organizer_metrics(batch_size=500):
+    """
+    Recompute every organizer's totals from orders, tickets and events and fix rows that drifted.
+    Returns the number of rows corrected (including rows created).
+
+    A delta applied between the aggregate queries and the write can be
+    counted twice or not at all; the next run corrects it.
+    """
+    revenue = dict(Order.objects.filter(status='paid').order_by().values('event__organizer_id')
+                   .annotate(total=Sum('total_amount')).values_list('event__organizer_id', 'total'))
+    attendees = dict(Ticket.objects.filter(status='valid', order__status='paid').order_by()
+                     .values('event__organizer_id').annotate(total=Count('id'))
+                     .values_list('event__organizer_id', 'total'))
+    events = dict(Event.objects.order_by().values('organizer_id').annotate(total=Count('id'))
+                  .values_list('organizer_id', 'total'))
+
+    now = timezone.now()
+    existing = OrganizerMetrics.objects.in_bulk()
+    to_create, to_update = [], []
+    for organizer_id in set(revenue) | set(attendees) | set(events) | set(existing):
+        expected = {
+            'total_revenue': revenue.get(organizer_id) or 0,
+            'total_attendees': attendees.get(organizer_id, 0),
+            'total_events': events.get(organizer_id, 0),
+        }
+        row = existing.get(organizer_id)
+        if row is None:
+            to_create.append(OrganizerMetrics(organizer_id=organizer_id, reconciled_at=now, **expected))
+            continue
+        if any(getattr(row, field) != value for field, value in expected.items()):
+            for field, value in expected.items():
+                setattr(row, field, value)
+            to_update.append(row)
+
+    OrganizerMetrics.objects.bulk_create(to_create, batch_size=batch_size, ignore_conflicts=True)
+    OrganizerMetrics.objects.bulk_update(
+        to_update, ['total_revenue', 'total_attendees', 'total_events'], batch_size=batch_size,
+    )
+    OrganizerMetrics.objects.update(reconciled_at=now)
+    return len(to_create) + len(to_update)
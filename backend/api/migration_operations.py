@@ -0,0 +1,58 @@
+# api/migration_operations.py
+"""
+Custom migration operations shared by api/migrations.
+"""
+from django.contrib.postgres.indexes import OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import DatabaseError, migrations, transaction
+
+
+def trigram_extension_installed(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def uses_trigrams(index):
+    opclasses = list(index.opclasses) + [expression.extra['name'] for expression in index.expressions
+                                         if isinstance(expression, OpClass)]
+    return 'gin_trgm_ops' in opclasses
+
+
+class OptionalTrigramExtension(TrigramExtension):
+    """
+    Installs pg_trgm when the migrating role is allowed to: on PostgreSQL 13+
+    that takes the CREATE privilege on the database (pg_trgm is a trusted
+    extension), on older servers a superuser. Otherwise the migration carries
+    on without it: trigram indexes are skipped and event search matches full
+    text only. Have an administrator run `CREATE EXTENSION pg_trgm` before
+    migrating to get typo-tolerant search.
+    """
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                super().database_forwards(app_label, schema_editor, from_state, to_state)
+        except DatabaseError as e:
+            print(f'MIGRATIONS: pg_trgm could not be installed ({str(e).splitlines()[0]}); '
+                  'trigram indexes and typo-tolerant search are disabled.')
+
+
+class PostgresOnlyAddIndex(migrations.AddIndex):
+    """
+    An index using PostgreSQL-only access methods or operator classes (GIN,
+    pg_trgm, text_pattern_ops). Elsewhere (SQLite for local development and
+    tests), and for trigram indexes when pg_trgm is not installed, the index
+    is recorded in the migration state but not created.
+    """
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if self._creates_index(schema_editor.connection):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if self._creates_index(schema_editor.connection):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def _creates_index(self, connection):
+        if connection.vendor != 'postgresql':
+            return False
+        return not uses_trigrams(self.index) or trigram_extension_installed(connection)
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_ticket_holds'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('status', 'published')), fields=['location', 'start_date', 'id'], name='event_published_location_idx'),
+        ),
+    ]
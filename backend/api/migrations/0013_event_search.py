@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:58
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+from api.migration_operations import OptionalTrigramExtension, PostgresOnlyAddIndex
+
+
+def backfill_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Event = apps.get_model('api', 'Event')
+    config = settings.EVENT_SEARCH['CONFIG'] # As api.search.event_document() builds it
+    Event.objects.update(search_vector=(
+        SearchVector('title', weight='A', config=config)
+        + SearchVector('category', weight='B', config=config)
+        + SearchVector('location', weight='C', config=config)
+        + SearchVector('description', weight='D', config=config)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_event_location_index'),
+    ]
+
+    operations = [
+        OptionalTrigramExtension(), # No-op outside PostgreSQL; see api/migration_operations.py
+        migrations.AddField(
+            model_name='event',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        PostgresOnlyAddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='event_search_vector_idx'),
+        ),
+        PostgresOnlyAddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='event_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_metrics(apps, schema_editor):
+    Event = apps.get_model('api', 'Event')
+    Order = apps.get_model('api', 'Order')
+    Ticket = apps.get_model('api', 'Ticket')
+    OrganizerMetrics = apps.get_model('api', 'OrganizerMetrics')
+    revenue = dict(Order.objects.filter(status='paid').values('event__organizer_id')
+                   .annotate(total=Sum('total_amount')).values_list('event__organizer_id', 'total'))
+    attendees = dict(Ticket.objects.filter(status='valid', order__status='paid').values('event__organizer_id')
+                     .annotate(total=Count('id')).values_list('event__organizer_id', 'total'))
+    events = dict(Event.objects.values('organizer_id').annotate(total=Count('id')).values_list('organizer_id', 'total'))
+    OrganizerMetrics.objects.bulk_create([
+        OrganizerMetrics(organizer_id=organizer_id, total_revenue=revenue.get(organizer_id) or 0,
+                         total_attendees=attendees.get(organizer_id, 0), total_events=events.get(organizer_id, 0))
+        for organizer_id in set(revenue) | set(attendees) | set(events)
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_event_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizerMetrics',
+            fields=[
+                ('organizer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='metrics', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_attendees', models.PositiveIntegerField(default=0)),
+                ('total_events', models.PositiveIntegerField(default=0)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'organizer metrics',
+            },
+        ),
+        migrations.RunPython(backfill_metrics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:27
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+from api.migration_operations import PostgresOnlyAddIndex
+
+
+def backfill_ticket_organizers(apps, schema_editor):
+    Event = apps.get_model('api', 'Event')
+    Ticket = apps.get_model('api', 'Ticket')
+    Ticket.objects.update(organizer_id=Subquery(Event.objects.filter(pk=OuterRef('event_id')).values('organizer_id')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_organizer_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='organizer',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attendee_tickets', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_ticket_organizers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ticket',
+            name='organizer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendee_tickets', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['organizer', 'id'], name='ticket_organizer_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['event', 'id'], name='ticket_event_id_idx'),
+        ),
+        PostgresOnlyAddIndex(
+            model_name='ticket',
+            index=models.Index(models.F('organizer'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('attendee_name'), name='text_pattern_ops'), name='ticket_name_prefix_idx'),
+        ),
+        PostgresOnlyAddIndex(
+            model_name='ticket',
+            index=models.Index(models.F('organizer'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('attendee_email'), name='text_pattern_ops'), name='ticket_email_prefix_idx'),
+        ),
+        PostgresOnlyAddIndex(
+            model_name='ticket',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('attendee_name'), name='gin_trgm_ops'), name='ticket_name_trgm_idx'),
+        ),
+        PostgresOnlyAddIndex(
+            model_name='ticket',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('attendee_email'), name='gin_trgm_ops'), name='ticket_email_trgm_idx'),
+        ),
+    ]
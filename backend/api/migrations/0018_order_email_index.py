@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:39
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_recommendation_lists'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='order_email_lower_idx'),
+        ),
+    ]
@@ -1,5 +1,11 @@
 # api/models.py
+import uuid
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Coalesce, Lower, Upper
+from django.contrib.auth.hashers import acheck_password, check_password
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
 
@@ -12,6 +18,8 @@ class CustomUserManager(BaseUserManager):
         if not email:
             raise ValueError('The Email field must be set')
         email = self.normalize_email(email)
+        # An already-hashed password (e.g. hashed off the event loop by api/hash_pool.py)
+        encoded_password = extra_fields.pop('encoded_password', None)
         
         # --- DEBUG PRINT: See what extra_fields are passed ---
         print(f"DEBUG: create_user extra_fields: {extra_fields}")
@@ -19,7 +27,9 @@ class CustomUserManager(BaseUserManager):
 
         user = self.model(email=email, **extra_fields)
         # Only set password if provided (for manual signup)
-        if password:
+        if encoded_password:
+            user.password = encoded_password
+        elif password:
             user.set_password(password)
         else: # For Google signup, set an unusable password
             user.set_unusable_password()
@@ -58,6 +68,9 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     first_name = models.CharField(max_length=150, blank=True) # Updated max_length
     last_name = models.CharField(max_length=150, blank=True) # Updated max_length
     profile_picture = models.URLField(max_length=500, blank=True, null=True, default='https://ik.imagekit.io/cafedejur/sari-sari-events/default-profile.jpg?updatedAt=1753685867575')
+    # The latest uploaded picture; `profile_picture` is pointed at its variant once processed (api/images.py)
+    profile_image = models.ForeignKey('UploadedImage', on_delete=models.SET_NULL, blank=True, null=True,
+                                      related_name='+')
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='guest') # Updated max_length and default
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
@@ -71,6 +84,9 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     gender = models.CharField(max_length=10, blank=True, null=True)
     # --- END ADDED NEW FIELDS ---
 
+    # Embedded in issued JWTs as the 'ver' claim; bumping it revokes every outstanding token.
+    token_version = models.PositiveIntegerField(default=0)
+
     objects = CustomUserManager()
 
     USERNAME_FIELD = 'email' # Use email for login
@@ -79,6 +95,36 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    def set_password(self, raw_password):
+        """
+        Changing the password also revokes every JWT issued before the change.
+        """
+        super().set_password(raw_password)
+        self.token_version += 1
+
+    def _rehash_password(self, raw_password):
+        # Same password, stronger hash: outstanding tokens stay valid, so skip set_password's revocation.
+        super().set_password(raw_password)
+        self._password = None
+
+    def check_password(self, raw_password):
+        """
+        Verify the password and, if it was hashed with a hasher or work factor
+        other than the preferred one (see api/hashing.py), re-hash it in place.
+        """
+        def setter(raw_password):
+            self._rehash_password(raw_password)
+            self.save(update_fields=['password'])
+
+        return check_password(raw_password, self.password, setter)
+
+    async def acheck_password(self, raw_password):
+        async def setter(raw_password):
+            self._rehash_password(raw_password)
+            await self.asave(update_fields=['password'])
+
+        return await acheck_password(raw_password, self.password, setter)
+
     def get_full_name(self):
         """
         Returns the first_name plus the last_name, with a space in between.
@@ -91,3 +137,462 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         Returns the short name for the user.
         """
         return self.first_name
+
+
+class OutboundEmail(models.Model):
+    """
+    A transactional email waiting to be delivered.
+    Views enqueue a row and return immediately; the `process_email_queue`
+    worker renders the template and hands the message to the configured transport.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead-lettered'),
+    )
+
+    template_name = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255)
+    recipient = models.EmailField()
+    context = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # For 'pending' rows this is when the next attempt may run; for 'sending'
+    # rows it is when the worker's lease runs out and the row can be reclaimed.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.template_name} -> {self.recipient} ({self.status})'
+
+
+class OTPCode(models.Model):
+    """
+    One outstanding verification code per email, used by `DatabaseOTPStore`.
+    Only an HMAC of the code is stored.
+    """
+    email = models.EmailField(unique=True)
+    code_hash = models.CharField(max_length=64)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True) # Used by the TTL sweep
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'OTP for {self.email}'
+
+
+# --- Events and ticketing ---
+class EventQuerySet(models.QuerySet):
+    def published(self):
+        return self.filter(status='published')
+
+    def upcoming(self):
+        return self.filter(end_date__gte=timezone.now())
+
+    def with_ticket_summary(self):
+        """
+        Annotate the cheapest price and remaining tickets across all tiers,
+        so listings show price and sold-out status without a query per event.
+        """
+        return self.annotate(
+            min_price=models.Min('ticket_tiers__price'),
+            tickets_remaining=Coalesce(models.Sum('ticket_tiers__remaining_capacity'), 0),
+            tier_count=models.Count('ticket_tiers'),
+        )
+
+
+class Event(models.Model):
+    """
+    An event created by an organizer (a 'client' user).
+    Listing traffic dwarfs writes, so the indexes follow the public query paths:
+    category pages ordered by start date, the organizer dashboard by status,
+    and a partial index covering only published events for the public listing.
+    """
+    CATEGORY_CHOICES = (
+        ('music', 'Music'),
+        ('arts', 'Arts & Culture'),
+        ('business', 'Business'),
+        ('food', 'Food & Drink'),
+        ('sports', 'Sports'),
+        ('technology', 'Technology'),
+        ('community', 'Community'),
+        ('other', 'Other'),
+    )
+    STATUS_CHOICES = (
+        ('draft', 'Draft'),
+        ('published', 'Published'),
+        ('canceled', 'Canceled'),
+        ('completed', 'Completed'),
+    )
+
+    organizer = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='events')
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='other')
+    location = models.CharField(max_length=255)
+    start_date = models.DateTimeField()
+    end_date = models.DateTimeField()
+    check_in_time = models.DateTimeField(blank=True, null=True) # When doors open for check-in
+    image_url = models.URLField(max_length=500, blank=True)
+    image = models.ForeignKey('UploadedImage', on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Weighted title/category/location/description document, maintained by api/search.py (PostgreSQL only)
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
+
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'start_date'], name='event_category_start_idx'),
+            models.Index(fields=['organizer', 'status'], name='event_organizer_status_idx'),
+            # Admin dashboard tabs: counts are index-only scans, tab pages are range scans by status
+            # (or, for the All tab, a walk of every event by start date)
+            models.Index(fields=['status', 'start_date', 'end_date'], name='event_status_dates_idx'),
+            models.Index(fields=['start_date', 'id'], name='event_start_idx'),
+            # Public listing: only published events, ordered by (start_date, id)
+            models.Index(fields=['start_date', 'id'], name='event_published_start_idx',
+                         condition=models.Q(status='published')),
+            models.Index(fields=['location', 'start_date', 'id'], name='event_published_location_idx',
+                         condition=models.Q(status='published')),
+            # Full-text and typo-tolerant search (created on PostgreSQL only, see migration 0013)
+            GinIndex(fields=['search_vector'], name='event_search_vector_idx'),
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='event_title_trgm_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class TicketCategory(models.Model):
+    """
+    A group of ticket tiers for an event, e.g. 'VIP' or 'General Admission'.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='ticket_categories')
+    name = models.CharField(max_length=100)
+    description = models.TextField(blank=True)
+    sort_order = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ('sort_order', 'id')
+        verbose_name_plural = 'ticket categories'
+
+    def __str__(self):
+        return f'{self.event} - {self.name}'
+
+
+class TicketTier(models.Model):
+    """
+    A purchasable ticket type with its own price and capacity, e.g. 'Early Bird'.
+    `remaining_capacity` is a denormalised counter so listings can show
+    sold-out status without counting tickets.
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='ticket_tiers')
+    category = models.ForeignKey(TicketCategory, on_delete=models.CASCADE, related_name='tiers')
+    name = models.CharField(max_length=100)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    capacity = models.PositiveIntegerField()
+    remaining_capacity = models.PositiveIntegerField(blank=True)
+    sales_start = models.DateTimeField(blank=True, null=True)
+    sales_end = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ('price', 'id')
+        constraints = [
+            models.CheckConstraint(condition=models.Q(remaining_capacity__lte=models.F('capacity')),
+                                   name='tier_remaining_lte_capacity'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.remaining_capacity is None:
+            self.remaining_capacity = self.capacity
+        super().save(*args, **kwargs)
+
+    @property
+    def is_sold_out(self):
+        return self.remaining_capacity == 0
+
+    def __str__(self):
+        return f'{self.event} - {self.name}'
+
+
+class Order(models.Model):
+    """
+    A purchase of one or more tickets. `buyer` is empty for guest checkouts.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('paid', 'Paid'),
+        ('canceled', 'Canceled'),
+        ('refunded', 'Refunded'),
+    )
+
+    event = models.ForeignKey(Event, on_delete=models.PROTECT, related_name='orders')
+    buyer = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, blank=True, null=True, related_name='orders')
+    email = models.EmailField()
+    full_name = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Client-supplied Idempotency-Key of the checkout request that created this order
+    idempotency_key = models.CharField(max_length=64, unique=True, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['event', 'status'], name='order_event_status_idx'),
+            # "Find my ticket": orders by normalised email, including guest checkouts (see api/ticket_lookup.py)
+            models.Index(Lower('email'), name='order_email_lower_idx'),
+        ]
+
+    def __str__(self):
+        return f'Order {self.pk} ({self.email})'
+
+
+class Ticket(models.Model):
+    """
+    One admission. `event` is denormalised from the tier and `organizer`
+    from the event, so per-event and per-organizer attendee queries do not
+    need to join through orders or events.
+    """
+    STATUS_CHOICES = (
+        ('valid', 'Valid'),
+        ('canceled', 'Canceled'),
+    )
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='tickets')
+    event = models.ForeignKey(Event, on_delete=models.PROTECT, related_name='tickets')
+    organizer = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='attendee_tickets')
+    tier = models.ForeignKey(TicketTier, on_delete=models.PROTECT, related_name='tickets')
+    attendee_name = models.CharField(max_length=255, blank=True)
+    attendee_email = models.EmailField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='valid')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['event', 'status'], name='ticket_event_status_idx'),
+            # Organizer attendee list: keyset pages by id, for the organizer or one of their events
+            models.Index(fields=['organizer', 'id'], name='ticket_organizer_id_idx'),
+            models.Index(fields=['event', 'id'], name='ticket_event_id_idx'),
+            # Attendee search (PostgreSQL only, see migration 0015). Django's istartswith/icontains
+            # compare UPPER(column), so the indexes are on the same expression: per-organizer
+            # text_pattern_ops indexes serve short prefix queries, trigrams serve substrings of 3+ characters.
+            models.Index(models.F('organizer'), OpClass(Upper('attendee_name'), name='text_pattern_ops'),
+                         name='ticket_name_prefix_idx'),
+            models.Index(models.F('organizer'), OpClass(Upper('attendee_email'), name='text_pattern_ops'),
+                         name='ticket_email_prefix_idx'),
+            GinIndex(OpClass(Upper('attendee_name'), name='gin_trgm_ops'), name='ticket_name_trgm_idx'),
+            GinIndex(OpClass(Upper('attendee_email'), name='gin_trgm_ops'), name='ticket_email_trgm_idx'),
+        ]
+
+    def __str__(self):
+        return f'Ticket {self.pk} for {self.event}'
+
+
+class CheckIn(models.Model):
+    """
+    A ticket's admission at the door. One row per ticket: the first scan
+    recorded wins and later scans of the same ticket are reported as
+    duplicates (see api/ticket_codes.py).
+    """
+    ticket = models.OneToOneField(Ticket, on_delete=models.CASCADE, related_name='check_in')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='check_ins')
+    device_id = models.CharField(max_length=64, blank=True) # The door device that scanned it
+    scanned_at = models.DateTimeField() # On the device, which may have been offline
+    recorded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['event', 'scanned_at'], name='checkin_event_scanned_idx'),
+        ]
+
+    def __str__(self):
+        return f'Check-in of ticket {self.ticket_id}'
+
+
+class TicketHold(models.Model):
+    """
+    Tickets taken out of a tier's `remaining_capacity` while the buyer checks out.
+    An active hold either becomes an order or, once `expires_at` passes,
+    is released and its quantity returned to the tier (see api/reservations.py).
+    """
+    STATUS_CHOICES = (
+        ('active', 'Active'),
+        ('converted', 'Converted'),
+        ('released', 'Released'),
+    )
+
+    hold_key = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    tier = models.ForeignKey(TicketTier, on_delete=models.CASCADE, related_name='holds')
+    quantity = models.PositiveSmallIntegerField()
+    email = models.EmailField()
+    buyer = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, blank=True, null=True, related_name='ticket_holds')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField()
+    order = models.OneToOneField(Order, on_delete=models.SET_NULL, blank=True, null=True, related_name='hold')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Sweeper: active holds past their expiry
+            models.Index(fields=['expires_at'], name='ticket_hold_active_expiry_idx',
+                         condition=models.Q(status='active')),
+        ]
+
+    def __str__(self):
+        return f'Hold {self.hold_key} ({self.quantity} x {self.tier_id})'
+
+
+class OrganizerMetrics(models.Model):
+    """
+    Per-organizer dashboard totals, kept up to date incrementally by api/metrics.py
+    so the dashboard never scans orders or tickets.
+    `reconcile_dashboard_metrics` recomputes them from the source tables.
+    """
+    organizer = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='metrics')
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_attendees = models.PositiveIntegerField(default=0)
+    total_events = models.PositiveIntegerField(default=0)
+    reconciled_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'organizer metrics'
+
+    def __str__(self):
+        return f'Metrics for {self.organizer_id}'
+
+
+class RecommendationList(models.Model):
+    """
+    A precomputed list of recommended event cards, written by
+    `python manage.py compute_recommendations` (api/recommendations.py) and
+    read by primary key. Keys are 'user:<id>' for users with ticket history
+    and 'popular:<category>' / 'popular:all' for everyone else.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    # [{id, title, category, location, start_date, image_url, score}, ...], best first
+    events = models.JSONField(default=list)
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.key
+
+
+class UploadedImage(models.Model):
+    """
+    An uploaded event banner or profile picture. The original is stored as
+    uploaded; the `process_images` worker resizes it into the WebP/AVIF
+    variants listed in `variants` (see api/images.py).
+    """
+    KIND_CHOICES = (
+        ('event_banner', 'Event banner'),
+        ('profile_picture', 'Profile picture'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    )
+
+    key = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='uploaded_images')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    original = models.FileField(max_length=255)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    size = models.PositiveIntegerField() # Bytes
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # For 'pending' rows this is when processing may start; for 'processing'
+    # rows it is when the worker's lease runs out and the row can be reclaimed.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    # [{format, width, height, name, size}, ...], narrowest first; `name` is the storage name
+    variants = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='image_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.key}'
+
+
+class Announcement(models.Model):
+    """
+    An organizer's email to every attendee of an event. The recipients are
+    fixed when it is created; `python manage.py send_announcements` sends
+    to them through SES in batches (see api/bulk_mail.py).
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+    )
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='announcements')
+    sender = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, blank=True, null=True,
+                               related_name='announcements')
+    subject = models.CharField(max_length=200)
+    body = models.TextField() # Plain text; paragraphs are separated by blank lines
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    recipient_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f'{self.subject} ({self.event_id})'
+
+
+class AnnouncementRecipient(models.Model):
+    """
+    One address an announcement goes to, and the checkpoint of its delivery.
+    'unknown' rows were handed to SES by a worker that stopped before it
+    recorded the result; they are not resent automatically, since they may
+    already have been delivered.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('unknown', 'Unknown'),
+    )
+
+    announcement = models.ForeignKey(Announcement, on_delete=models.CASCADE, related_name='recipients')
+    email = models.EmailField()
+    name = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # For 'pending' rows this is when the next attempt may run; for 'sending'
+    # rows it is when the worker's lease runs out.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    message_id = models.CharField(max_length=100, blank=True) # SES MessageId
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['announcement', 'email'], name='announcement_recipient_unique'),
+        ]
+        indexes = [
+            # Workers claim due recipients one announcement at a time, in id order
+            models.Index(fields=['status', 'announcement', 'id'], name='announcement_queue_idx'),
+        ]
+
+    def __str__(self):
+        return self.email
@@ -0,0 +1,179 @@
+# api/otp_store.py
+"""
+Pluggable storage for email verification codes.
+
+The default cache is per-process (LocMemCache), so a code written by one
+gunicorn worker could not be read by another. These backends are shared by
+every worker and consume codes atomically, so a correct code is accepted
+exactly once no matter which worker serves the verify request.
+
+Configure with settings.OTP_STORE; views call `get_otp_store()`.
+"""
+import hashlib
+import hmac
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OTPCode
+
+
+def hash_code(email, code):
+    """
+    HMAC of the code bound to the email, so stored values are useless on their own.
+    """
+    message = f'{email.lower()}:{code}'.encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+class BaseOTPStore:
+    """
+    Interface for OTP backends.
+    `issue` replaces any outstanding code for the email; `verify` returns True
+    at most once per issued code and burns the code after `max_attempts` wrong guesses.
+    """
+    def __init__(self, ttl_seconds=300, max_attempts=5, **options):
+        self.ttl_seconds = ttl_seconds
+        self.max_attempts = max_attempts
+
+    def issue(self, email, code):
+        raise NotImplementedError
+
+    def verify(self, email, code):
+        raise NotImplementedError
+
+    def sweep(self):
+        """
+        Delete expired codes. Returns the number removed.
+        """
+        return 0
+
+
+class DatabaseOTPStore(BaseOTPStore):
+    """
+    Stores codes in the `OTPCode` table.
+    Verification is a single conditional DELETE, so concurrent requests
+    cannot both consume the same code.
+    """
+    def issue(self, email, code):
+        now = timezone.now()
+        # Single-statement upsert: concurrent sends for one email never hit the unique constraint.
+        OTPCode.objects.bulk_create(
+            [OTPCode(
+                email=email.lower(),
+                code_hash=hash_code(email, code),
+                attempts=0,
+                expires_at=now + timedelta(seconds=self.ttl_seconds),
+                created_at=now,
+            )],
+            update_conflicts=True,
+            unique_fields=['email'],
+            update_fields=['code_hash', 'attempts', 'expires_at', 'created_at'],
+        )
+
+    def verify(self, email, code):
+        now = timezone.now()
+        live = OTPCode.objects.filter(email=email.lower(), expires_at__gt=now, attempts__lt=self.max_attempts)
+        consumed, _ = live.filter(code_hash=hash_code(email, code)).delete()
+        if consumed:
+            return True
+        live.update(attempts=F('attempts') + 1)
+        return False
+
+    def sweep(self):
+        deleted, _ = OTPCode.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+class RedisOTPStore(BaseOTPStore):
+    """
+    Stores codes in any server speaking the Redis protocol (Redis, Valkey,
+    a local stand-in). Expiry is handled by the server's key TTL and
+    verification runs as a Lua script, so it is atomic.
+    """
+    VERIFY_SCRIPT = """
+local stored = redis.call('HGET', KEYS[1], 'code')
+if not stored then
+    return 0
+end
+if stored == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+if redis.call('HINCRBY', KEYS[1], 'attempts', 1) >= tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+    def __init__(self, url='redis://localhost:6379/0', client=None, **options):
+        super().__init__(**options)
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImproperlyConfigured("RedisOTPStore requires the 'redis' package.")
+            client = _redis_clients.get(url)
+            if client is None:
+                client = _redis_clients[url] = redis.Redis.from_url(url)
+        self.client = client
+        self._verify = client.register_script(self.VERIFY_SCRIPT)
+
+    def _key(self, email):
+        return f'otp:{email.lower()}'
+
+    def issue(self, email, code):
+        key = self._key(email)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.hset(key, mapping={'code': hash_code(email, code), 'attempts': 0})
+        pipe.expire(key, self.ttl_seconds)
+        pipe.execute()
+
+    def verify(self, email, code):
+        return bool(self._verify(keys=[self._key(email)], args=[hash_code(email, code), self.max_attempts]))
+
+
+class CacheOTPStore(BaseOTPStore):
+    """
+    Stores codes in the Django cache, as the views originally did.
+    Only safe when the cache is shared by every worker; kept for comparison
+    benchmarks and single-process development.
+    """
+    def issue(self, email, code):
+        cache.set(self._key(email), hash_code(email, code), timeout=self.ttl_seconds)
+
+    def verify(self, email, code):
+        key = self._key(email)
+        if cache.get(key) == hash_code(email, code):
+            cache.delete(key)
+            return True
+        return False
+
+    def _key(self, email):
+        return f'otp_{email.lower()}'
+
+
+# One Redis connection pool per URL for the lifetime of the process.
+_redis_clients = {}
+
+
+def get_otp_store(backend=None):
+    """
+    Build the backend configured in settings.OTP_STORE.
+    `backend` (a dotted path) overrides the configured class, e.g. for benchmarks.
+    """
+    config = settings.OTP_STORE
+    options = {
+        'ttl_seconds': config['TTL_SECONDS'],
+        'max_attempts': config['MAX_ATTEMPTS'],
+    }
+    backend = import_string(backend or config['BACKEND'])
+    if issubclass(backend, RedisOTPStore):
+        options['url'] = config['REDIS_URL']
+    return backend(**options)
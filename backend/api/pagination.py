@@ -0,0 +1,93 @@
+# api/pagination.py
+"""
+Keyset (cursor) pagination.
+
+OFFSET pagination makes the database walk and discard every earlier row, so
+page 5,000 costs 5,000 pages of work. A keyset cursor remembers the sort key
+of the last row served and the next page starts from there:
+
+    WHERE start_date >= :d AND (start_date > :d OR id > :id)
+    ORDER BY start_date, id LIMIT :n
+
+which is an index range scan of `n` rows however deep the page is. (The
+leading `start_date >= :d` is what lets the planner seek; with only the OR
+it scans the index from the beginning.)
+Cursors are opaque to clients (URL-safe base64 of the last row's key).
+Lists ordered by id alone use the same scheme with `paginate_by_id`.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode(raw):
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode(cursor):
+    try:
+        return base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise InvalidCursor('Invalid cursor.') from e
+
+
+def encode_cursor(start_date, pk):
+    return _encode(f'{start_date.isoformat()}|{pk}')
+
+
+def decode_cursor(cursor):
+    try:
+        start_date, pk = _decode(cursor).split('|')
+        return datetime.fromisoformat(start_date), int(pk)
+    except ValueError as e:
+        raise InvalidCursor('Invalid cursor.') from e
+
+
+def paginate_by_start_date(queryset, cursor=None, limit=20, descending=False):
+    """
+    One page of `queryset` ordered by (start_date, id) (or newest first with
+    `descending`), starting after `cursor`.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Raises InvalidCursor for a malformed cursor.
+    """
+    if descending:
+        queryset = queryset.order_by('-start_date', '-id')
+    else:
+        queryset = queryset.order_by('start_date', 'id')
+    if cursor:
+        start_date, pk = decode_cursor(cursor)
+        if descending:
+            queryset = queryset.filter(Q(start_date__lt=start_date) | Q(id__lt=pk), start_date__lte=start_date)
+        else:
+            queryset = queryset.filter(Q(start_date__gt=start_date) | Q(id__gt=pk), start_date__gte=start_date)
+    rows = list(queryset[:limit + 1]) # One extra row tells us whether there is a next page
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].start_date, rows[-1].pk)
+
+
+def paginate_by_id(queryset, cursor=None, limit=50):
+    """
+    One page of `queryset` (model instances or `.values()` dicts including `id`)
+    ordered by id, starting after `cursor`. Returns (rows, next_cursor).
+    Raises InvalidCursor for a malformed cursor.
+    """
+    queryset = queryset.order_by('id')
+    if cursor:
+        try:
+            queryset = queryset.filter(id__gt=int(_decode(cursor)))
+        except ValueError as e:
+            raise InvalidCursor('Invalid cursor.') from e
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, _encode(str(last['id'] if isinstance(last, dict) else last.pk))
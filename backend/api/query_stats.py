@@ -0,0 +1,270 @@
+# api/query_stats.py
+"""
+Per-endpoint database query statistics.
+
+QueryStatsMiddleware records every query a request runs, on every database
+alias, by its fingerprint: the SQL with parameters left as placeholders,
+`IN (...)` lists collapsed and literals replaced by `?`. A fingerprint that
+repeats N_PLUS_ONE_THRESHOLD times in one request is flagged as an N+1
+pattern and logged, as is a request over its view's `query_budget`:
+
+    class EventListView(APIView):
+        query_budget = 3
+
+Totals are kept per URL name ('login', 'event_list', ...) for this worker
+process and served to admins by QueryStatsView. With
+QUERY_STATS['ENFORCE_BUDGETS'], which api.testing.QueryBudgetTestRunner turns
+on for the test suite, a request over budget raises QueryBudgetExceeded.
+
+The queries of a streamed response are recorded once its body has been sent.
+The middleware runs in the sync or async chain alike, so async views under
+backend/asgi.py are recorded without being adapted to sync.
+Time is measured around cursor.execute(), so fetching rows is not included.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.I)
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+MAX_FINGERPRINT_LENGTH = 300
+MAX_FLAGGED_FINGERPRINTS = 20 # Per URL name, most frequent first
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@lru_cache(maxsize=2048) # The ORM sends the same few SQL strings over and over
+def fingerprint(sql):
+    """
+    `sql` with its literal values and placeholder lists normalised, so repeats of one query compare equal.
+    """
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    sql = IN_LIST.sub('IN (...)', sql)
+    return ' '.join(sql.split())[:MAX_FINGERPRINT_LENGTH]
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper counting and timing queries by fingerprint.
+    """
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        """
+        Queries that repeated an earlier query's fingerprint.
+        """
+        return sum(count - 1 for count in self.fingerprints.values())
+
+    def n_plus_one(self, threshold=None):
+        """
+        {fingerprint: count} of the queries repeated at least `threshold` times.
+        """
+        threshold = threshold or settings.QUERY_STATS['N_PLUS_ONE_THRESHOLD']
+        return {sql: count for sql, count in self.fingerprints.most_common() if count >= threshold}
+
+    def report(self, limit=5):
+        lines = [f'{self.count} queries in {self.seconds * 1000:.1f}ms; most repeated:']
+        lines += [f'  {count} x {sql}' for sql, count in self.fingerprints.most_common(limit)]
+        return '\n'.join(lines)
+
+
+@contextmanager
+def record_queries(recorder=None):
+    """
+    Record the queries run in this block on every database alias; yields the QueryRecorder.
+    """
+    recorder = recorder or QueryRecorder()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+@asynccontextmanager
+async def arecord_queries(recorder=None):
+    """
+    record_queries() for async code. The ORM runs its queries on the request's sync thread, with that
+    thread's connections, so the wrappers are installed there.
+    """
+    recorder = recorder or QueryRecorder()
+    stack = ExitStack()
+    await sync_to_async(stack.enter_context)(record_queries(recorder))
+    try:
+        yield recorder
+    finally:
+        await sync_to_async(stack.close)()
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.queries_max = 0
+        self.seconds = 0.0
+        self.seconds_max = 0.0
+        self.duplicates = 0
+        self.n_plus_one_requests = 0
+        self.over_budget = 0
+        self.budget = None
+        self.flagged = Counter() # N+1 fingerprint -> requests it was flagged in
+
+    def add(self, recorder, flagged, budget):
+        self.requests += 1
+        self.queries += recorder.count
+        self.queries_max = max(self.queries_max, recorder.count)
+        self.seconds += recorder.seconds
+        self.seconds_max = max(self.seconds_max, recorder.seconds)
+        self.duplicates += recorder.duplicates
+        self.budget = budget
+        if budget is not None and recorder.count > budget:
+            self.over_budget += 1
+        if flagged:
+            self.n_plus_one_requests += 1
+            self.flagged.update(flagged.keys())
+            if len(self.flagged) > MAX_FLAGGED_FINGERPRINTS:
+                self.flagged = Counter(dict(self.flagged.most_common(MAX_FLAGGED_FINGERPRINTS)))
+
+    def as_dict(self, url_name):
+        return {
+            'url_name': url_name,
+            'requests': self.requests,
+            'queries_avg': round(self.queries / self.requests, 2),
+            'queries_max': self.queries_max,
+            'query_budget': self.budget,
+            'over_budget': self.over_budget,
+            'db_ms_avg': round(self.seconds / self.requests * 1000, 2),
+            'db_ms_max': round(self.seconds_max * 1000, 2),
+            'duplicate_queries': self.duplicates,
+            'n_plus_one_requests': self.n_plus_one_requests,
+            'n_plus_one': [{'fingerprint': sql, 'requests': count} for sql, count in self.flagged.most_common()],
+        }
+
+
+_endpoints = {}
+_endpoints_lock = threading.Lock()
+
+
+def record_request(url_name, recorder, budget=None):
+    """
+    Add one request's queries to `url_name`'s totals. Returns the fingerprints flagged as N+1.
+    """
+    flagged = recorder.n_plus_one()
+    with _endpoints_lock:
+        _endpoints.setdefault(url_name, EndpointStats()).add(recorder, flagged, budget)
+    return flagged
+
+
+def query_stats():
+    """
+    Totals per URL name since this process started (or was reset), by total database time.
+    """
+    with _endpoints_lock:
+        endpoints = [stats.as_dict(url_name) for url_name, stats in _endpoints.items()]
+    return sorted(endpoints, key=lambda endpoint: endpoint['db_ms_avg'] * endpoint['requests'], reverse=True)
+
+
+def reset_query_stats():
+    with _endpoints_lock:
+        _endpoints.clear()
+
+
+class QueryStatsMiddleware:
+    """
+    Records each request's queries under its URL name; see the module docstring.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.QUERY_STATS['ENABLED']:
+            return self.get_response(request)
+        request.query_budget = None
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        return self._finish(request, response, recorder)
+
+    async def __acall__(self, request):
+        if not settings.QUERY_STATS['ENABLED']:
+            return await self.get_response(request)
+        request.query_budget = None
+        async with arecord_queries() as recorder:
+            response = await self.get_response(request)
+        return self._finish(request, response, recorder)
+
+    def _finish(self, request, response, recorder):
+        if request.resolver_match is None:
+            return response
+        if response.streaming:
+            # Streamed exports keep querying while the body is sent
+            stream = self._astream if response.is_async else self._stream
+            response.streaming_content = stream(request, response.streaming_content, recorder)
+            return response
+        self._record(request, recorder)
+        return response
+
+    def _stream(self, request, content, recorder):
+        try:
+            with record_queries(recorder):
+                yield from content
+        finally:
+            self._record(request, recorder)
+
+    async def _astream(self, request, content, recorder):
+        try:
+            async with arecord_queries(recorder):
+                async for chunk in content:
+                    yield chunk
+        finally:
+            self._record(request, recorder)
+
+    def _record(self, request, recorder):
+        match, budget = request.resolver_match, request.query_budget
+        url_name = match.view_name or match.route
+        flagged = record_request(url_name, recorder, budget)
+        if flagged:
+            logger.warning('N+1 queries in %s %s (%s):\n%s', request.method, request.path, url_name,
+                           '\n'.join(f'  {count} x {sql}' for sql, count in flagged.items()))
+        if budget is not None and recorder.count > budget:
+            message = f'{request.method} {request.path} ({url_name}) is over its budget of {budget} queries: ' \
+                      f'{recorder.report()}'
+            if settings.QUERY_STATS['ENFORCE_BUDGETS']:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        request.query_budget = getattr(view, 'query_budget', None)
@@ -0,0 +1,78 @@
+# api/ratelimit.py
+"""
+Token-bucket rate limits kept in the Django cache.
+
+A bucket holds up to `capacity` tokens and regains one every
+`refill_seconds`; each request spends one, so clients get short bursts but
+a bounded long-run rate. Buckets are configured in
+settings.RATE_LIMITS['BUCKETS'] and stored in settings.RATE_LIMITS['CACHE'],
+which must be shared by every worker (CACHE_REDIS_URL) for a limit to hold
+across workers; with the default per-process cache each worker enforces
+its own.
+
+Each update runs under a short `cache.add()` lock (atomic on Redis and
+memcached). A request that finds its bucket locked by a concurrent request
+for the same key is refused rather than allowed to race it.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+LOCK_SECONDS = 2 # Longest a crashed request can keep a bucket locked
+
+
+class TokenBucket:
+    def __init__(self, name, capacity, refill_seconds):
+        self.name = name
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+
+    @classmethod
+    def named(cls, name):
+        """
+        The bucket configured as settings.RATE_LIMITS['BUCKETS'][name].
+        """
+        capacity, refill_seconds = settings.RATE_LIMITS['BUCKETS'][name]
+        return cls(name, capacity, refill_seconds)
+
+    def consume(self, identity, now=None):
+        """
+        Spend one of `identity`'s tokens. Returns (allowed, retry_after_seconds).
+        """
+        cache = caches[settings.RATE_LIMITS['CACHE']]
+        key = self._key(identity)
+        if not cache.add(f'{key}:lock', 1, timeout=LOCK_SECONDS):
+            return False, 1
+        try:
+            now = time.time() if now is None else now
+            tokens, updated_at = cache.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated_at) / self.refill_seconds)
+            if tokens < 1:
+                return False, math.ceil((1 - tokens) * self.refill_seconds)
+            # Expires once it would have refilled anyway
+            cache.set(key, (tokens - 1, now), timeout=math.ceil(self.capacity * self.refill_seconds))
+            return True, 0
+        finally:
+            cache.delete(f'{key}:lock')
+
+    def _key(self, identity):
+        # Hashed so raw email addresses and IPs never appear in cache keys
+        digest = hashlib.sha256(f'{self.name}:{identity}'.encode()).hexdigest()[:32]
+        return f'ratelimit:{self.name}:{digest}'
+
+
+def client_ip(request):
+    """
+    The client's address: REMOTE_ADDR, or the X-Forwarded-For entry added by the
+    outermost of settings.RATE_LIMITS['TRUSTED_PROXY_COUNT'] proxies.
+    Entries further left can be set by the client and are ignored.
+    """
+    proxies = settings.RATE_LIMITS['TRUSTED_PROXY_COUNT']
+    if proxies:
+        forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
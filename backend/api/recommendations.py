@@ -0,0 +1,172 @@
+# api/recommendations.py
+"""
+Recommended events for /api/events/recommended/.
+
+Scoring runs offline (`python manage.py compute_recommendations`, e.g.
+hourly) over the whole paid ticket history, with NumPy/SciPy sparse
+matrices instead of per-user queries:
+
+- A is users x events, 1 where the user holds a valid paid ticket.
+- Co-attendance: A @ (A.T @ A) scores each candidate event by how many
+  people who attended the user's past events also bought it.
+- Category affinity: the user's share of past events in the candidate's
+  category, weighted by the candidate's popularity (tickets sold).
+
+Candidates are published events that have not started and that the user
+holds no ticket for. Each user's best LIST_SIZE event cards are stored in
+one RecommendationList row ('user:<id>'), next to 'popular:<category>' and
+'popular:all' rows for users without history. Serving is one primary-key
+lookup: cards for events that started since the last run are skipped and
+short lists are topped up from the popular list.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Event, RecommendationList, Ticket
+
+try: # Only the batch job needs these
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+CARD_FIELDS = ('id', 'title', 'category', 'location', 'start_date', 'image_url')
+CO_ATTENDANCE_WEIGHT = 1.0
+CATEGORY_WEIGHT = 0.5
+MAX_BLOCK_CELLS = 4_000_000 # Dense users x candidates scores held at once (~16 MB of float32)
+
+
+def recommended_events(user_id=None, category=None, limit=12, now=None):
+    """
+    Up to `limit` event cards for the user (or an anonymous visitor), best first.
+    Returns (cards, source) where source is 'personal' if any card came from the
+    user's own list and 'popular' otherwise.
+    """
+    now = now or timezone.now()
+    popular_key = f"popular:{category or 'all'}"
+    keys = [popular_key]
+    if user_id is not None:
+        keys.append(f'user:{user_id}')
+    lists = dict(RecommendationList.objects.filter(key__in=keys).values_list('key', 'events'))
+    personal = lists.get(f'user:{user_id}', [])
+
+    cards, seen, from_personal = [], set(), 0
+    for index, card in enumerate(personal + lists.get(popular_key, [])):
+        if len(cards) == limit:
+            break
+        if card['id'] in seen or (category and card['category'] != category):
+            continue
+        if datetime.fromisoformat(card['start_date']) <= now:
+            continue # Started since the lists were computed
+        seen.add(card['id'])
+        cards.append(card)
+        from_personal += index < len(personal)
+    return cards, 'personal' if from_personal else 'popular'
+
+
+def compute_recommendations(list_size=None, now=None):
+    """
+    Recompute every recommendation list and delete lists that are no longer produced.
+    Returns {'users': ..., 'candidates': ..., 'lists': ...}.
+    """
+    if np is None:
+        raise ImproperlyConfigured('compute_recommendations requires the numpy and scipy packages.')
+
+    now = now or timezone.now()
+    list_size = list_size or settings.RECOMMENDATIONS['LIST_SIZE']
+    categories = [value for value, _ in Event.CATEGORY_CHOICES]
+    category_code = {value: code for code, value in enumerate(categories)}
+
+    # Candidates: published events that have not started, with tickets sold as popularity
+    candidates = list(Event.objects.published().filter(start_date__gt=now).order_by('id').values(*CARD_FIELDS))
+    sold = dict(Ticket.objects.filter(status='valid', event__status='published', event__start_date__gt=now)
+                .order_by().values('event_id').annotate(count=Count('id')).values_list('event_id', 'count'))
+    candidate_ids = np.array([event['id'] for event in candidates], dtype=np.int64)
+    candidate_categories = np.array([category_code[event['category']] for event in candidates], dtype=np.int64)
+    popularity = np.log1p(np.array([sold.get(event['id'], 0) for event in candidates], dtype=np.float32))
+    if len(candidates) and popularity.max() > 0:
+        popularity /= popularity.max()
+    cards = [_card(event) for event in candidates]
+
+    # Popular lists: most tickets sold first, then soonest
+    starts = np.array([event['start_date'].timestamp() for event in candidates], dtype=np.float64)
+    order = np.lexsort((candidate_ids, starts, -popularity))
+    rows = [_list_row('popular:all', order[:list_size], cards, popularity, now)]
+    for category in categories:
+        in_category = order[candidate_categories[order] == category_code[category]]
+        rows.append(_list_row(f'popular:{category}', in_category[:list_size], cards, popularity, now))
+    written = _save(rows)
+
+    # Ticket history as (user, event, category) triples
+    history = list(Ticket.objects.filter(status='valid', order__status='paid', order__buyer__isnull=False)
+                   .order_by().values_list('order__buyer_id', 'event_id', 'event__category').distinct())
+    users = np.empty(0, dtype=np.int64)
+    if history and len(candidates):
+        pairs = np.array([(user, event) for user, event, _ in history], dtype=np.int64)
+        users, user_index = np.unique(pairs[:, 0], return_inverse=True)
+        events, event_index = np.unique(pairs[:, 1], return_inverse=True)
+        attended = sparse.csr_matrix((np.ones(len(pairs), dtype=np.float32), (user_index, event_index)),
+                                     shape=(len(users), len(events)))
+
+        # Users' share of past events per category
+        event_categories = np.zeros(len(events), dtype=np.int64)
+        event_categories[event_index] = [category_code[category] for _, _, category in history]
+        by_category = sparse.csr_matrix((np.ones(len(events), dtype=np.float32),
+                                         (np.arange(len(events)), event_categories)),
+                                        shape=(len(events), len(categories)))
+        affinity = np.asarray((attended @ by_category).todense())
+        affinity /= np.maximum(affinity.sum(axis=1, keepdims=True), 1)
+
+        # Candidate columns of the history matrix (candidates nobody has bought yet stay empty)
+        position = np.searchsorted(events, candidate_ids)
+        known = (position < len(events)) & (events[np.minimum(position, len(events) - 1)] == candidate_ids)
+        to_candidates = sparse.csr_matrix((np.ones(known.sum(), dtype=np.float32),
+                                           (position[known], np.flatnonzero(known))),
+                                          shape=(len(events), len(candidates)))
+        attended_candidates = (attended @ to_candidates).tocsr()
+        co_attendance = (attended.T @ attended_candidates).tocsr() # past event x candidate: shared attendees
+
+        block = max(1, MAX_BLOCK_CELLS // len(candidates))
+        for start in range(0, len(users), block):
+            stop = min(start + block, len(users))
+            co = (attended[start:stop] @ co_attendance).toarray()
+            co /= np.maximum(co.max(axis=1, keepdims=True), 1)
+            category_scores = affinity[start:stop][:, candidate_categories] * popularity
+            scores = CO_ATTENDANCE_WEIGHT * co + CATEGORY_WEIGHT * category_scores
+            scores[attended_candidates[start:stop].toarray() > 0] = 0 # Already has a ticket
+            rows = []
+            for offset, top in enumerate(_top_indices(scores, list_size)):
+                top = top[scores[offset, top] > 0]
+                if len(top):
+                    rows.append(_list_row(f'user:{users[start + offset]}', top, cards, scores[offset], now))
+            written += _save(rows)
+
+    RecommendationList.objects.filter(computed_at__lt=now).delete()
+    return {'users': len(users), 'candidates': len(candidates), 'lists': written}
+
+
+def _card(event):
+    return {**event, 'start_date': event['start_date'].isoformat()}
+
+
+def _list_row(key, indices, cards, scores, now):
+    events = [{**cards[i], 'score': round(float(scores[i]), 4)} for i in indices]
+    return RecommendationList(key=key, events=events, computed_at=now)
+
+
+def _save(rows):
+    RecommendationList.objects.bulk_create(rows, batch_size=1000, update_conflicts=True, unique_fields=['key'],
+                                           update_fields=['events', 'computed_at'])
+    return len(rows)
+
+
+def _top_indices(scores, count):
+    # Best `count` columns of each row, best first, without sorting whole rows
+    count = min(count, scores.shape[1])
+    top = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1)
@@ -0,0 +1,196 @@
+# api/reservations.py
+"""
+Ticket inventory: holds and checkout.
+
+Stock lives in `TicketTier.remaining_capacity`. A reservation takes tickets
+out with a single conditional UPDATE:
+
+    UPDATE tickettier SET remaining_capacity = remaining_capacity - n
+    WHERE id = ? AND remaining_capacity >= n
+
+The row lock is held only for that statement, so buyers never read-modify-write
+the counter and a tier can never be oversold however many workers race for it
+(the check constraint on the table is a second line of defence).
+
+Each reservation is a `TicketHold` that expires after settings.TICKET_HOLDS
+['HOLD_SECONDS']. Checkout turns an active hold into an order exactly once per
+Idempotency-Key; expired holds are released by `release_expired_holds`
+(`python manage.py release_expired_holds`) and their tickets returned to the tier.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .metrics import record_order
+from .models import Event, Order, Ticket, TicketHold, TicketTier
+
+
+class ReservationError(Exception):
+    pass
+
+
+class SoldOut(ReservationError):
+    pass
+
+
+class NotOnSale(ReservationError):
+    pass
+
+
+class HoldExpired(ReservationError):
+    pass
+
+
+class IdempotencyConflict(ReservationError):
+    """
+    The Idempotency-Key was already used to check out a different hold.
+    """
+
+
+def reserve(tier_id, quantity, email, buyer_id=None, hold_seconds=None):
+    """
+    Take `quantity` tickets out of the tier and return the active TicketHold.
+    Raises SoldOut if fewer tickets remain, NotOnSale outside the tier's sales window.
+    """
+    now = timezone.now()
+    hold_seconds = hold_seconds or settings.TICKET_HOLDS['HOLD_SECONDS']
+    # No joins here: Django would turn a joined UPDATE into `id IN (subquery)` and the
+    # capacity check would then not be re-evaluated after waiting for the row lock.
+    on_sale = (
+        (Q(sales_start__isnull=True) | Q(sales_start__lte=now))
+        & (Q(sales_end__isnull=True) | Q(sales_end__gt=now))
+        & Q(event__in=Event.objects.filter(status='published').values('pk'))
+    )
+    with transaction.atomic():
+        taken = (TicketTier.objects
+                 .filter(on_sale, pk=tier_id, remaining_capacity__gte=quantity)
+                 .update(remaining_capacity=F('remaining_capacity') - quantity))
+        if not taken:
+            # Slow path only: work out why, for the error message
+            tier = TicketTier.objects.filter(pk=tier_id).filter(on_sale).first()
+            if tier is None:
+                raise NotOnSale('These tickets are not on sale.')
+            raise SoldOut(f'Only {tier.remaining_capacity} tickets left.')
+        return TicketHold.objects.create(
+            tier_id=tier_id,
+            quantity=quantity,
+            email=email,
+            buyer_id=buyer_id,
+            expires_at=now + timedelta(seconds=hold_seconds),
+        )
+
+
+def _return_stock(holds):
+    per_tier = Counter()
+    for hold in holds:
+        per_tier[hold.tier_id] += hold.quantity
+    for tier_id, quantity in per_tier.items():
+        TicketTier.objects.filter(pk=tier_id).update(remaining_capacity=F('remaining_capacity') + quantity)
+
+
+def release_hold(hold_key):
+    """
+    Give an active hold's tickets back. Returns False if it was already converted or released.
+    """
+    with transaction.atomic():
+        hold = (TicketHold.objects.select_for_update()
+                .filter(hold_key=hold_key, status='active').first())
+        if hold is None:
+            return False
+        hold.status = 'released'
+        hold.save(update_fields=['status'])
+        _return_stock([hold])
+    return True
+
+
+def release_expired_holds(now=None, batch_size=500):
+    """
+    Release every active hold past its expiry, in batches. Returns the number released.
+    Rows locked by a concurrent checkout are skipped and picked up next run.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            holds = list(TicketHold.objects.select_for_update(skip_locked=True)
+                         .filter(status='active', expires_at__lte=now)[:batch_size])
+            if not holds:
+                return released
+            TicketHold.objects.filter(pk__in=[hold.pk for hold in holds]).update(status='released')
+            _return_stock(holds)
+        released += len(holds)
+
+
+def checkout(hold_key, idempotency_key, attendee_name=''):
+    """
+    Convert an active hold into a paid order with one ticket per held seat.
+    Returns (order, created). Repeating the call with the same idempotency key
+    returns the original order with created=False.
+    """
+    existing = _order_for_key(hold_key, idempotency_key)
+    if existing:
+        return existing, False
+
+    try:
+        with transaction.atomic():
+            hold = (TicketHold.objects.select_for_update()
+                    .select_related('tier').filter(hold_key=hold_key).first())
+            if hold is not None and hold.status == 'converted':
+                # A concurrent retry with the same key converted it while we waited for the lock
+                existing = _order_for_key(hold_key, idempotency_key)
+                if existing:
+                    return existing, False
+            if hold is None or hold.status != 'active':
+                raise HoldExpired('This reservation is no longer active.')
+            if hold.expires_at <= timezone.now():
+                hold.status = 'released'
+                hold.save(update_fields=['status'])
+                _return_stock([hold])
+                # Commit the release; the caller still gets HoldExpired below
+                expired = True
+            else:
+                expired = False
+                tier = hold.tier
+                organizer_id = Event.objects.filter(pk=tier.event_id).values_list('organizer_id', flat=True).get()
+                # No payment provider yet: orders are recorded as paid at checkout
+                order = Order.objects.create(
+                    event_id=tier.event_id,
+                    buyer_id=hold.buyer_id,
+                    email=hold.email,
+                    full_name=attendee_name,
+                    status='paid',
+                    total_amount=tier.price * hold.quantity,
+                    idempotency_key=idempotency_key,
+                )
+                Ticket.objects.bulk_create([
+                    Ticket(order=order, event_id=tier.event_id, organizer_id=organizer_id, tier=tier,
+                           attendee_name=attendee_name, attendee_email=hold.email)
+                    for _ in range(hold.quantity)
+                ])
+                hold.status = 'converted'
+                hold.order = order
+                hold.save(update_fields=['status', 'order'])
+                record_order(tier.event_id, order.total_amount, hold.quantity)
+    except IntegrityError:
+        # A concurrent request with the same key won the race
+        existing = _order_for_key(hold_key, idempotency_key)
+        if existing:
+            return existing, False
+        raise
+    if expired:
+        raise HoldExpired('This reservation has expired.')
+    return order, True
+
+
+def _order_for_key(hold_key, idempotency_key):
+    order = Order.objects.filter(idempotency_key=idempotency_key).select_related('hold').first()
+    if order is None:
+        return None
+    hold = getattr(order, 'hold', None)
+    if hold is None or str(hold.hold_key) != str(hold_key):
+        raise IdempotencyConflict('This Idempotency-Key was used for a different reservation.')
+    return order
@@ -0,0 +1,196 @@
+# api/search.py
+"""
+Event search for /api/events/search/.
+
+On PostgreSQL each event carries a weighted `search_vector` (title A,
+category B, location C, description D) in a GIN index, and the title has a
+trigram GIN index. A query matches events whose document matches the
+websearch-style query *or* whose title is trigram-similar to it (so
+"concrt" still finds "Concert"); results are ordered by text rank, then
+similarity, and the few rows returned get highlighted snippets. Without
+the pg_trgm extension (see api/migration_operations.py) only the document
+is matched. Documents use the EVENT_SEARCH['CONFIG'] text search
+configuration, here and in migration 0013's backfill.
+
+`search_vector` is refreshed by a post_save signal (api/signals.py) when a
+searched field changes; `rebuild_search_index()` (`python manage.py
+rebuild_event_search`) refreshes it in bulk after imports that bypass signals.
+
+Other databases (SQLite in local development and tests) fall back to
+case-insensitive substring matching with highlighting done in Python.
+"""
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db import connection, connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils.html import escape
+
+from .migration_operations import trigram_extension_installed
+from .models import Event
+
+SEARCH_FIELDS = ('title', 'category', 'location', 'description')
+RESULT_FIELDS = ('id', 'title', 'category', 'location', 'start_date', 'image_url')
+HIGHLIGHT_START, HIGHLIGHT_STOP = '<mark>', '</mark>'
+
+_trigram_support = {} # alias -> whether pg_trgm is installed, checked once per process
+
+
+def use_postgres_search():
+    return connection.vendor == 'postgresql'
+
+
+def trigrams_available(alias):
+    if alias not in _trigram_support:
+        _trigram_support[alias] = trigram_extension_installed(connections[alias])
+    return _trigram_support[alias]
+
+
+def event_document():
+    config = settings.EVENT_SEARCH['CONFIG']
+    return (
+        SearchVector('title', weight='A', config=config)
+        + SearchVector('category', weight='B', config=config)
+        + SearchVector('location', weight='C', config=config)
+        + SearchVector('description', weight='D', config=config)
+    )
+
+
+def update_search_vector(event_id):
+    """
+    Recompute one event's document in the database (a single UPDATE).
+    """
+    if use_postgres_search():
+        Event.objects.filter(pk=event_id).update(search_vector=event_document())
+
+
+def rebuild_search_index(batch_size=10000):
+    """
+    Recompute every event's document, in primary-key batches. Returns the number of events updated.
+    """
+    if not use_postgres_search():
+        return 0
+    updated = 0
+    last_id = 0
+    while True:
+        ids = list(Event.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return updated
+        updated += Event.objects.filter(pk__gte=ids[0], pk__lte=ids[-1]).update(search_vector=event_document())
+        last_id = ids[-1]
+
+
+def search_events(query, limit=20, category=None):
+    """
+    Published, upcoming events matching `query`, best match first.
+    Returns a list of dicts with RESULT_FIELDS plus `rank`, `title_highlight` and `snippet`
+    (HTML-escaped text with matches wrapped in <mark>).
+    """
+    events = Event.objects.published().upcoming()
+    if category:
+        events = events.filter(category=category)
+    if use_postgres_search():
+        return _postgres_search(events, query, limit)
+    return _fallback_search(events, query, limit)
+
+
+def _postgres_search(events, query, limit):
+    config = settings.EVENT_SEARCH['CONFIG']
+    search_query = SearchQuery(query, search_type='websearch', config=config)
+    threshold = settings.EVENT_SEARCH['TRIGRAM_THRESHOLD']
+    matches, similarity = Q(search_vector=search_query), Value(0.0, output_field=FloatField())
+    if trigrams_available(events.db):
+        matches |= Q(title__trigram_similar=query)
+        similarity = TrigramSimilarity('title', query)
+
+    # 1) Rank candidates using only the indexed columns.
+    ranked = list(
+        events
+        .filter(matches)
+        .annotate(
+            rank=Coalesce(SearchRank(F('search_vector'), search_query), 0.0), # NULL vector: not yet indexed
+            similarity=similarity,
+        )
+        .filter(Q(rank__gt=0) | Q(similarity__gte=threshold))
+        .order_by('-rank', '-similarity', 'start_date', 'id')
+        .values_list('id', 'rank', 'similarity')[:limit]
+    )
+    if not ranked:
+        return []
+
+    # 2) Build headlines only for the rows being returned; ts_headline is the expensive part.
+    highlight = {'start_sel': HIGHLIGHT_START, 'stop_sel': HIGHLIGHT_STOP, 'config': config}
+    rows = Event.objects.filter(pk__in=[pk for pk, _, _ in ranked]).annotate(
+        title_highlight=SearchHeadline('title', search_query, highlight_all=True, **highlight),
+        snippet=SearchHeadline('description', search_query, max_words=30, min_words=12, **highlight),
+    ).values(*RESULT_FIELDS, 'title_highlight', 'snippet')
+    by_id = {row['id']: row for row in rows}
+
+    results = []
+    for pk, rank, similarity in ranked:
+        row = by_id[pk]
+        if HIGHLIGHT_START in row['title_highlight']:
+            row['title_highlight'] = _escape_headline(row['title_highlight'])
+        else:
+            # Typo match: there is no lexeme to highlight, so return the title as-is
+            row['title_highlight'] = escape(row['title'])
+        row['snippet'] = _escape_headline(row['snippet']) if HIGHLIGHT_START in row['snippet'] else ''
+        row['rank'] = round(max(rank, similarity), 4)
+        results.append(row)
+    return results
+
+
+def _escape_headline(headline):
+    # ts_headline returns the stored text verbatim; escape it but keep our <mark> tags
+    return (escape(headline)
+            .replace(escape(HIGHLIGHT_START), HIGHLIGHT_START)
+            .replace(escape(HIGHLIGHT_STOP), HIGHLIGHT_STOP))
+
+
+def _fallback_search(events, query, limit):
+    terms = [term for term in re.split(r'\W+', query) if term]
+    if not terms:
+        return []
+    for term in terms:
+        events = events.filter(
+            Q(title__icontains=term) | Q(category__icontains=term)
+            | Q(location__icontains=term) | Q(description__icontains=term)
+        )
+    pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+    results = []
+    for row in events.order_by('start_date', 'id').values(*RESULT_FIELDS, 'description')[:limit]:
+        description = row.pop('description')
+        row['title_highlight'] = _highlight(row['title'], pattern)
+        row['snippet'] = _snippet(description, pattern)
+        row['rank'] = sum(1 for term in terms if term.lower() in row['title'].lower())
+        results.append(row)
+    results.sort(key=lambda row: -row['rank'])
+    return results
+
+
+def _highlight(text, pattern):
+    parts = []
+    position = 0
+    for match in pattern.finditer(text):
+        parts.append(escape(text[position:match.start()]))
+        parts.append(f'{HIGHLIGHT_START}{escape(match.group())}{HIGHLIGHT_STOP}')
+        position = match.end()
+    parts.append(escape(text[position:]))
+    return ''.join(parts)
+
+
+def _snippet(text, pattern, radius=80):
+    match = pattern.search(text)
+    if not match:
+        return ''
+    start = max(match.start() - radius, 0)
+    end = min(match.end() + radius, len(text))
+    return ('…' if start else '') + _highlight(text[start:end], pattern) + ('…' if end < len(text) else '')
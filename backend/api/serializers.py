@@ -1,13 +1,17 @@
 # api/serializers.py
+from operator import attrgetter, itemgetter
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from .models import CustomUser
+from .models import Announcement, CustomUser, Event, Order, Ticket, TicketCategory, TicketTier, UploadedImage
+from .event_status import TABS, event_state
+from .ticket_codes import ticket_code
+from .bulk_mail import announcement_progress
+from .images import CARD_IMAGE_WIDTH, PAGE_IMAGE_WIDTH, image_payload
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.conf import settings # To access GOOGLE_CLIENT_ID from settings
 
-# For Google ID token verification
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+# For Google ID token verification (cached signing certificates)
+from .google_auth import verify_google_id_token
 
 
 class UserRegisterSerializer(serializers.ModelSerializer):
@@ -50,9 +54,12 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         Create and return a new `CustomUser` instance, given the validated data.
         """
         validated_data.pop('confirm_password') # Remove confirm_password as it's not a model field
+        # The async registration view hashes the password on the hash pool and passes the result in
+        encoded_password = validated_data.pop('encoded_password', None)
         user = CustomUser.objects.create_user(
             email=validated_data['email'],
-            password=validated_data['password'],
+            password=None if encoded_password else validated_data['password'],
+            encoded_password=encoded_password,
             first_name=validated_data.get('first_name', ''),
             last_name=validated_data.get('last_name', ''),
             company_name=validated_data.get('company_name', ''),
@@ -65,13 +72,18 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         )
         return user
 
-class UserLoginSerializer(serializers.Serializer):
+class LoginCredentialsSerializer(serializers.Serializer):
     """
-    Serializer for user login with email and password.
+    Validates the shape of login credentials without checking them.
+    Used directly by the async login view, which verifies the password on the hash pool.
     """
     email = serializers.EmailField(required=True)
     password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
 
+class UserLoginSerializer(LoginCredentialsSerializer):
+    """
+    Serializer for user login with email and password.
+    """
     def validate(self, data):
         """
         Validate user credentials and authenticate the user.
@@ -105,7 +117,8 @@ class BaseGoogleAuthSerializer(serializers.Serializer):
         try:
             # IMPORTANT: Ensure settings.GOOGLE_CLIENT_ID is correctly set in your Django settings.py
             # It must match the client_id used in your frontend.
-            idinfo = id_token.verify_oauth2_token(token, google_requests.Request(), settings.GOOGLE_CLIENT_ID, clock_skew_in_seconds=10)
+            # Google's certificates come from a process-wide cache instead of being downloaded per request.
+            idinfo = verify_google_id_token(token, settings.GOOGLE_CLIENT_ID, clock_skew_in_seconds=10)
 
             if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
                 print(f"DEBUG: Google token verification failed - Wrong issuer: {idinfo.get('iss')}")
@@ -199,3 +212,292 @@ class OTPVerifySerializer(serializers.Serializer):
     """
     email = serializers.EmailField()
     otp = serializers.CharField(max_length=6, min_length=6) # Ensure 6 digits
+
+
+# --- Read-optimised user payload for auth responses ---
+def _isoformat_or_none(value):
+    return value.isoformat() if value else None
+
+
+class UserPayload:
+    """
+    Builds the `user` object returned by every auth endpoint and the extra
+    claims returned next to the JWT tokens.
+    Unlike a DRF serializer there is no per-call field introspection: the
+    field plan is compiled once per process and each value is read exactly once.
+    """
+    FIELDS = (
+        'email', 'first_name', 'last_name', 'profile_picture', 'role',
+        'phone_number', 'birthday', 'gender', 'company_name', 'company_website',
+    )
+    # Client (organizer) accounts must fill these in before they can continue
+    PROFILE_FIELDS = ('phone_number', 'birthday', 'gender', 'company_name', 'company_website')
+    TOKEN_FIELDS = ('role', 'phone_number', 'birthday', 'gender', 'company_name', 'company_website')
+    __slots__ = ('user', 'values', 'needs_profile_completion')
+
+    # Compiled once: C-level getters read every field in a single call.
+    _read_fields = attrgetter(*FIELDS)
+    _read_profile_fields = itemgetter(*PROFILE_FIELDS)
+    _read_token_fields = itemgetter(*TOKEN_FIELDS)
+
+    def __init__(self, user, needs_profile_completion=None):
+        """
+        `needs_profile_completion` defaults to "client with missing profile fields";
+        views pass an explicit value when the flow already decides it.
+        """
+        self.user = user
+        self.values = values = dict(zip(self.FIELDS, self._read_fields(user)))
+        values['birthday'] = _isoformat_or_none(values['birthday'])
+        if needs_profile_completion is None:
+            needs_profile_completion = values['role'] == 'client' and not all(self._read_profile_fields(values))
+        self.needs_profile_completion = needs_profile_completion
+
+    @property
+    def data(self):
+        return {**self.values, 'needs_profile_completion': self.needs_profile_completion} # Flag for frontend
+
+    def token_claims(self):
+        return dict(zip(self.TOKEN_FIELDS, self._read_token_fields(self.values)))
+
+
+# --- Event serializers ---
+class SparseFieldsMixin:
+    """
+    Accepts `fields=(...)` to serialize only a subset of Meta.fields (e.g. from `?fields=`).
+    """
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class OrganizerNameMixin:
+    def get_organizer_name(self, obj):
+        organizer = obj.organizer # Loaded with select_related by the views
+        return organizer.company_name or f'{organizer.first_name} {organizer.last_name}'.strip()
+
+
+class EventListSerializer(SparseFieldsMixin, OrganizerNameMixin, serializers.ModelSerializer):
+    """
+    Event card for listings. Expects a queryset from
+    `Event.objects.with_ticket_summary().select_related('organizer', 'image')`.
+    `image` is sized for context['image_width'].
+    """
+    organizer_name = serializers.SerializerMethodField()
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    is_sold_out = serializers.SerializerMethodField()
+    image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Event
+        fields = (
+            'id', 'title', 'category', 'location', 'start_date', 'end_date', 'image_url', 'image',
+            'organizer_name', 'min_price', 'is_sold_out',
+        )
+
+    def get_image(self, obj):
+        return image_payload(obj.image, self.context.get('image_width', CARD_IMAGE_WIDTH))
+
+    def get_is_sold_out(self, obj):
+        return obj.tier_count > 0 and obj.tickets_remaining == 0
+
+
+class EventListQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the public event listing.
+    """
+    category = serializers.ChoiceField(choices=Event.CATEGORY_CHOICES, required=False)
+    location = serializers.CharField(max_length=255, required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    cursor = serializers.CharField(max_length=200, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    fields = serializers.CharField(required=False) # Comma-separated subset of EventListSerializer fields
+    # Card width in device pixels; `image` is the narrowest variant at least this wide
+    image_width = serializers.IntegerField(min_value=16, max_value=3840, default=CARD_IMAGE_WIDTH)
+
+    def validate_fields(self, value):
+        fields = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = set(fields) - set(EventListSerializer.Meta.fields)
+        if unknown:
+            raise serializers.ValidationError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+        return fields
+
+
+class OrganizerEventQuerySerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Event.STATUS_CHOICES, required=False)
+    cursor = serializers.CharField(max_length=200, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class EventSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    category = serializers.ChoiceField(choices=Event.CATEGORY_CHOICES, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=20)
+
+
+class AdminEventTabQuerySerializer(serializers.Serializer):
+    tab = serializers.ChoiceField(choices=TABS, default='all')
+    cursor = serializers.CharField(max_length=200, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class AdminEventSerializer(OrganizerNameMixin, serializers.ModelSerializer):
+    """
+    Admin dashboard event row. Expects `event_status.tab_events()` rows and `now` in the context.
+    """
+    organizer_name = serializers.SerializerMethodField()
+    attendee_count = serializers.IntegerField(read_only=True)
+    state = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Event
+        fields = ('id', 'title', 'location', 'start_date', 'end_date', 'status', 'state',
+                  'organizer_name', 'attendee_count')
+
+    def get_state(self, obj):
+        return event_state(obj, self.context['now'])
+
+
+class RecommendedEventsQuerySerializer(serializers.Serializer):
+    category = serializers.ChoiceField(choices=Event.CATEGORY_CHOICES, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=24, default=12)
+
+
+class TicketTierSerializer(serializers.ModelSerializer):
+    is_sold_out = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = TicketTier
+        fields = ('id', 'name', 'price', 'capacity', 'remaining_capacity', 'sales_start', 'sales_end', 'is_sold_out')
+
+
+class TicketCategorySerializer(serializers.ModelSerializer):
+    tiers = TicketTierSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = TicketCategory
+        fields = ('id', 'name', 'description', 'tiers')
+
+
+class EventDetailSerializer(OrganizerNameMixin, serializers.ModelSerializer):
+    """
+    Full event page. Expects ticket categories and their tiers to be prefetched.
+    """
+    organizer_name = serializers.SerializerMethodField()
+    ticket_categories = TicketCategorySerializer(many=True, read_only=True)
+    image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Event
+        fields = (
+            'id', 'title', 'description', 'category', 'location', 'start_date', 'end_date',
+            'check_in_time', 'image_url', 'image', 'status', 'organizer_name', 'ticket_categories',
+        )
+
+    def get_image(self, obj):
+        return image_payload(obj.image, PAGE_IMAGE_WIDTH)
+
+
+# --- Reservation serializers ---
+class ReserveTicketsSerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=1)
+    email = serializers.EmailField()
+
+    def validate_quantity(self, value):
+        limit = settings.TICKET_HOLDS['MAX_PER_HOLD']
+        if value > limit:
+            raise serializers.ValidationError(f'You can reserve at most {limit} tickets at a time.')
+        return value
+
+
+class CheckInScanSerializer(serializers.Serializer):
+    code = serializers.CharField(max_length=200)
+    scanned_at = serializers.DateTimeField(required=False) # When the device scanned it; defaults to upload time
+
+
+class CheckInBatchSerializer(serializers.Serializer):
+    """
+    Scans uploaded by a door device, possibly queued while it was offline.
+    """
+    device_id = serializers.CharField(max_length=64, required=False, allow_blank=True, default='')
+    scans = serializers.ListField(child=CheckInScanSerializer(), allow_empty=False,
+                                  max_length=settings.TICKET_CODES['MAX_SCANS_PER_BATCH'])
+
+
+class UploadedImageSerializer(serializers.ModelSerializer):
+    image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadedImage
+        fields = ('key', 'kind', 'status', 'width', 'height', 'size', 'image', 'created_at', 'processed_at')
+
+    def get_image(self, obj):
+        return image_payload(obj, PAGE_IMAGE_WIDTH)
+
+
+class AnnouncementSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Announcement
+        fields = ('id', 'subject', 'body', 'status', 'recipient_count', 'progress', 'created_at', 'completed_at')
+        read_only_fields = ('status', 'recipient_count', 'created_at', 'completed_at')
+        extra_kwargs = {'body': {'max_length': settings.BULK_EMAIL['MAX_BODY_CHARS']}}
+
+    def get_progress(self, obj):
+        # Views listing several announcements pass {id: progress} from one announcement_progress() query
+        if 'progress' in self.context:
+            return self.context['progress'].get(obj.pk)
+        return announcement_progress([obj.pk])[obj.pk]
+
+
+class FindTicketsSerializer(serializers.Serializer):
+    email = serializers.EmailField()
+
+
+class CheckoutSerializer(serializers.Serializer):
+    hold_key = serializers.UUIDField()
+    attendee_name = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    ticket_ids = serializers.SerializerMethodField()
+    tickets = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Order
+        fields = ('id', 'event', 'email', 'full_name', 'status', 'total_amount', 'created_at', 'ticket_ids', 'tickets')
+
+    def get_ticket_ids(self, obj):
+        return [ticket['id'] for ticket in self.get_tickets(obj)]
+
+    def get_tickets(self, obj):
+        """
+        Each ticket with its signed QR code for the door (api/ticket_codes.py).
+        """
+        # Read once per order for both fields
+        cache = self.__dict__.setdefault('_tickets_by_order', {})
+        if obj.pk not in cache:
+            cache[obj.pk] = [{'id': ticket_id, 'code': ticket_code(ticket_id, obj.event_id)}
+                             for ticket_id in obj.tickets.order_by('id').values_list('id', flat=True)]
+        return cache[obj.pk]
+
+
+# --- Attendee serializers ---
+class AttendeeQuerySerializer(serializers.Serializer):
+    """
+    Filters shared by the organizer attendee list and exports.
+    """
+    event = serializers.IntegerField(required=False)
+    q = serializers.CharField(max_length=200, required=False, allow_blank=True)
+    status = serializers.ChoiceField(choices=Ticket.STATUS_CHOICES, required=False)
+
+
+class AttendeeListQuerySerializer(AttendeeQuerySerializer):
+    """
+    Attendee list filters plus keyset pagination (`cursor` from the previous page's `next_cursor`).
+    """
+    cursor = serializers.CharField(max_length=200, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=50)
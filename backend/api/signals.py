@@ -0,0 +1,60 @@
+# api/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import cache_account_state, forget_account_state
+from .event_status import invalidate_event_tabs
+from .metrics import apply_metrics_delta
+from .models import CustomUser, Event, Ticket
+from .search import SEARCH_FIELDS, update_search_vector
+from .ticket_codes import invalidate_valid_tickets
+
+
+@receiver(post_save, sender=CustomUser)
+def refresh_cached_account_state(sender, instance, **kwargs):
+    # Deactivation, role changes and token revocation reach StatelessJWTAuthentication immediately
+    # in this cache, and in every other worker's cache once its entry expires.
+    cache_account_state(instance)
+
+
+@receiver(post_delete, sender=CustomUser)
+def drop_cached_account_state(sender, instance, **kwargs):
+    forget_account_state(instance.pk)
+
+
+@receiver(post_save, sender=Event)
+def refresh_event_search_vector(sender, instance, update_fields=None, **kwargs):
+    # Only re-index when a searched field may have changed
+    if update_fields is None or set(update_fields) & set(SEARCH_FIELDS):
+        update_search_vector(instance.pk)
+
+
+@receiver(post_save, sender=Event)
+def count_created_event(sender, instance, created, **kwargs):
+    if created:
+        apply_metrics_delta(instance.organizer_id, events=1)
+
+
+@receiver(post_delete, sender=Event)
+def uncount_deleted_event(sender, instance, **kwargs):
+    # Never create a row here: the organizer itself may be being deleted
+    apply_metrics_delta(instance.organizer_id, events=-1, create=False)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def refresh_admin_event_tabs(sender, **kwargs):
+    # Any field the tabs show may have changed, not only status and dates
+    invalidate_event_tabs()
+
+
+@receiver(post_save, sender=Ticket)
+def refresh_valid_tickets(sender, instance, created, **kwargs):
+    # New tickets are found without a reload (see api/ticket_codes.py); a status change must not be missed
+    if not created:
+        invalidate_valid_tickets(instance.event_id)
+
+
+@receiver(post_delete, sender=Ticket)
+def drop_valid_ticket(sender, instance, **kwargs):
+    invalidate_valid_tickets(instance.event_id)
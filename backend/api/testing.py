@@ -0,0 +1,389 @@
+# api/testing.py
+"""
+Local stand-ins for external services, shared by the test suite and the
+benchmark management commands, and the test suite's query budget helpers.
+"""
+import datetime
+import html
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+from django.utils import timezone
+from google.auth import crypt, jwt
+
+from .models import Event, Ticket
+from .query_stats import QueryBudgetExceeded, record_queries
+
+
+class FakeGoogleCertsServer:
+    """
+    Serves a Google-style certificate document ({key id: PEM certificate})
+    on localhost and signs ID tokens with the matching private key.
+
+        with FakeGoogleCertsServer(max_age=3600) as server:
+            token = server.make_id_token(email='user@example.com', audience=client_id)
+            ... point settings.GOOGLE_CERTS_URL at server.url ...
+
+    `latency` adds a delay to every certificate response to mimic a real
+    round trip; `fail` makes the endpoint return 503; `requests_served`
+    counts certificate downloads.
+    """
+    def __init__(self, key_id='fake-key-1', max_age=3600, latency=0.0):
+        self.key_id = key_id
+        self.max_age = max_age
+        self.latency = latency
+        self.fail = False
+        self.requests_served = 0
+        self._private_pem, self._certificate_pem = _make_key_pair()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}/oauth2/v1/certs'
+
+    def __enter__(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests_served += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fake.fail:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                body = json.dumps({fake.key_id: fake._certificate_pem}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', f'public, max-age={fake.max_age}, must-revalidate, no-transform')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def make_id_token(self, email, audience, issuer='https://accounts.google.com', lifetime=3600, **claims):
+        now = int(time.time())
+        payload = {
+            'iss': issuer,
+            'aud': audience,
+            'sub': str(abs(hash(email))),
+            'email': email,
+            'email_verified': True,
+            'iat': now,
+            'exp': now + lifetime,
+            **claims,
+        }
+        signer = crypt.RSASigner.from_string(self._private_pem, key_id=self.key_id)
+        return jwt.encode(signer, payload).decode()
+
+
+def _make_key_pair():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'fake-google-certs')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption(),
+    ).decode()
+    return private_pem, certificate.public_bytes(serialization.Encoding.PEM).decode()
+
+
+
+class FakeSESServer:
+    """
+    A local endpoint for the parts of the SES v1 API that bulk announcements
+    use: GetSendQuota, GetTemplate, CreateTemplate and SendBulkTemplatedEmail.
+
+        with FakeSESServer(max_send_rate=14) as server:
+            client = ses_client(endpoint_url=server.url)
+
+    Sends are limited to `max_send_rate` messages per second (a token bucket
+    holding one second of sends) and refused with a Throttling error above
+    it. Delivered messages are rendered and kept in `messages` as
+    {to, subject, html, text}; `reject` is a set of addresses that get a
+    MessageRejected status, and `latency` delays every response.
+    """
+    NAMESPACE = 'http://ses.amazonaws.com/doc/2010-12-01/'
+
+    def __init__(self, max_send_rate=14.0, latency=0.0):
+        self.max_send_rate = max_send_rate
+        self.latency = latency
+        self.reject = set()
+        self.templates = {}
+        self.messages = []
+        self.calls = 0
+        self.throttled_calls = 0
+        self._tokens = max_send_rate
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode()
+                params = {key: values[0] for key, values in parse_qs(body, keep_blank_values=True).items()}
+                if fake.latency:
+                    time.sleep(fake.latency)
+                status, xml = fake._handle(params)
+                payload = xml.encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/xml')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def recipients(self):
+        """
+        How many messages each address received.
+        """
+        counts = {}
+        for message in self.messages:
+            counts[message['to']] = counts.get(message['to'], 0) + 1
+        return counts
+
+    def _handle(self, params):
+        action = params.get('Action')
+        if action == 'GetSendQuota':
+            return self._result(action, f'<Max24HourSend>50000.0</Max24HourSend>'
+                                        f'<MaxSendRate>{self.max_send_rate}</MaxSendRate>'
+                                        f'<SentLast24Hours>{len(self.messages)}.0</SentLast24Hours>')
+        if action == 'GetTemplate':
+            template = self.templates.get(params.get('TemplateName'))
+            if template is None:
+                return self._error('TemplateDoesNotExist', f"Template {params.get('TemplateName')} does not exist.")
+            return self._result(action, '<Template>' + ''.join(
+                f'<{key}>{html.escape(value)}</{key}>' for key, value in template.items()) + '</Template>')
+        if action == 'CreateTemplate':
+            template = {key.split('.', 1)[1]: value for key, value in params.items() if key.startswith('Template.')}
+            if template['TemplateName'] in self.templates:
+                return self._error('AlreadyExists', f"Template {template['TemplateName']} already exists.")
+            self.templates[template['TemplateName']] = template
+            return self._result(action, '')
+        if action == 'SendBulkTemplatedEmail':
+            return self._send_bulk(params)
+        return self._error('InvalidAction', f'Unsupported action {action}.')
+
+    def _send_bulk(self, params):
+        template = self.templates.get(params.get('Template'))
+        if template is None:
+            return self._error('TemplateDoesNotExist', f"Template {params.get('Template')} does not exist.")
+        destinations = []
+        while f'Destinations.member.{len(destinations) + 1}.Destination.ToAddresses.member.1' in params:
+            prefix = f'Destinations.member.{len(destinations) + 1}'
+            destinations.append((params[f'{prefix}.Destination.ToAddresses.member.1'],
+                                 json.loads(params.get(f'{prefix}.ReplacementTemplateData') or '{}')))
+        if not 1 <= len(destinations) <= 50:
+            return self._error('InvalidParameterValue', 'Between 1 and 50 destinations are allowed per call.')
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            self._tokens = min(self.max_send_rate, self._tokens + (now - self._updated_at) * self.max_send_rate)
+            self._updated_at = now
+            if self._tokens < len(destinations):
+                self.throttled_calls += 1
+                return self._error('Throttling', 'Maximum sending rate exceeded.')
+            self._tokens -= len(destinations)
+
+            default_data = json.loads(params.get('DefaultTemplateData') or '{}')
+            statuses = []
+            for address, replacement in destinations:
+                if address in self.reject:
+                    statuses.append('<member><Status>MessageRejected</Status>'
+                                    '<Error>Email address is on the suppression list.</Error></member>')
+                    continue
+                data = {**default_data, **replacement}
+                self.messages.append({'to': address, **{
+                    part: _render_handlebars(template.get(f'{part.title()}Part', ''), data)
+                    for part in ('subject', 'html', 'text')
+                }})
+                statuses.append(f'<member><Status>Success</Status><MessageId>{uuid.uuid4()}</MessageId></member>')
+        return self._result('SendBulkTemplatedEmail', f"<Status>{''.join(statuses)}</Status>")
+
+    def _result(self, action, body):
+        return 200, (f'<{action}Response xmlns="{self.NAMESPACE}"><{action}Result>{body}</{action}Result>'
+                     f'<ResponseMetadata><RequestId>{uuid.uuid4()}</RequestId></ResponseMetadata>'
+                     f'</{action}Response>')
+
+    def _error(self, code, message):
+        return 400, (f'<ErrorResponse xmlns="{self.NAMESPACE}"><Error><Type>Sender</Type><Code>{code}</Code>'
+                     f'<Message>{html.escape(message)}</Message></Error>'
+                     f'<RequestId>{uuid.uuid4()}</RequestId></ErrorResponse>')
+
+
+def _render_handlebars(template, data):
+    # {{{name}}} is inserted as is and {{name}} HTML-escaped, as SES does
+    return re.sub(r'\{\{(\{?)\s*(\w+)\s*\}?\}\}',
+                  lambda match: str(data.get(match.group(2), '')) if match.group(1)
+                  else html.escape(str(data.get(match.group(2), ''))), template)
+
+# --- Synthetic event catalogue ---
+SYNTHETIC_ADJECTIVES = ('Summer', 'Midnight', 'Grand', 'Indie', 'Acoustic', 'Annual', 'Urban', 'Coastal',
+                        'Vintage', 'Electric', 'Sunset', 'Community', 'Global', 'Local', 'Open-Air')
+SYNTHETIC_NOUNS = ('Concert', 'Festival', 'Conference', 'Workshop', 'Market', 'Marathon', 'Exhibit',
+                   'Summit', 'Showcase', 'Meetup', 'Tasting', 'Hackathon', 'Gala', 'Fair', 'Jam')
+SYNTHETIC_TOPICS = ('jazz', 'startups', 'street food', 'photography', 'coffee', 'robotics', 'poetry',
+                    'basketball', 'film', 'design', 'wine', 'gaming', 'yoga', 'crafts', 'comedy')
+SYNTHETIC_LOCATIONS = ('Manila', 'Cebu', 'Davao', 'Baguio', 'Iloilo', 'Makati', 'Quezon City', 'Bacolod')
+
+
+def synthetic_events(organizer, count, seed=0):
+    """
+    Yield `count` unsaved, published, upcoming Events with varied titles,
+    descriptions, categories, locations and start dates (some tied), for
+    benchmarks: `Event.objects.bulk_create(batch)`.
+    """
+    rng = random.Random(seed)
+    categories = [value for value, _ in Event.CATEGORY_CHOICES]
+    base = timezone.now() + datetime.timedelta(days=1)
+    for i in range(count):
+        topic = rng.choice(SYNTHETIC_TOPICS)
+        location = rng.choice(SYNTHETIC_LOCATIONS)
+        start = base + datetime.timedelta(minutes=rng.randrange(count * 3)) # Shuffled, with some ties
+        yield Event(
+            organizer=organizer,
+            title=f'{rng.choice(SYNTHETIC_ADJECTIVES)} {topic.title()} {rng.choice(SYNTHETIC_NOUNS)} {i}',
+            description=(f'Join us in {location} for an afternoon of {topic}, '
+                         f'{rng.choice(SYNTHETIC_TOPICS)} and good company. Tickets are limited.'),
+            category=rng.choice(categories),
+            location=location,
+            start_date=start,
+            end_date=start + datetime.timedelta(hours=3),
+            status='published',
+        )
+
+
+def load_synthetic_events(organizer, count, batch_size=10000, seed=0):
+    """
+    bulk_create `count` synthetic events in batches. Returns the number created.
+    """
+    events = synthetic_events(organizer, count, seed=seed)
+    created = 0
+    while created < count:
+        batch = [event for _, event in zip(range(batch_size), events)]
+        Event.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+    return created
+
+
+# --- Synthetic attendees ---
+SYNTHETIC_FIRST_NAMES = ('Maria', 'Jose', 'Juan', 'Ana', 'Mark', 'Angel', 'Paolo', 'Kristine', 'John', 'Camille',
+                         'Miguel', 'Andrea', 'Carlo', 'Bea', 'Rafael', 'Nicole', 'Luis', 'Patricia', 'Gabriel', 'Joy')
+SYNTHETIC_LAST_NAMES = ('Santos', 'Reyes', 'Cruz', 'Bautista', 'Garcia', 'Mendoza', 'Torres', 'Flores', 'Ramos',
+                        'Aquino', 'Villanueva', 'Castillo', 'Navarro', 'Dela Cruz', 'Gonzales', 'Lim', 'Tan', 'Domingo')
+SYNTHETIC_EMAIL_DOMAINS = ('gmail.com', 'yahoo.com', 'outlook.com', 'example.ph', 'company.com')
+
+
+def load_synthetic_attendees(order, tier, count, batch_size=10000, seed=0):
+    """
+    bulk_create `count` valid tickets for `order` in `tier` with varied
+    attendee names and unique emails. Returns the number created.
+    """
+    organizer_id = Event.objects.filter(pk=tier.event_id).values_list('organizer_id', flat=True).get()
+    rng = random.Random(seed)
+    created = 0
+    while created < count:
+        batch = []
+        for i in range(created, min(created + batch_size, count)):
+            first, last = rng.choice(SYNTHETIC_FIRST_NAMES), rng.choice(SYNTHETIC_LAST_NAMES)
+            email = f"{first}.{last.replace(' ', '')}{i}@{rng.choice(SYNTHETIC_EMAIL_DOMAINS)}".lower()
+            batch.append(Ticket(order=order, event_id=tier.event_id, organizer_id=organizer_id, tier=tier,
+                                attendee_name=f'{first} {last}', attendee_email=email))
+        Ticket.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+    return created
+
+
+def delete_synthetic_rows(model, **columns):
+    """
+    DELETE the `model` rows whose columns equal `columns` in one statement.
+    Returns the number deleted. Unlike QuerySet.delete() it neither collects
+    rows nor sends delete signals, which take minutes for synthetic data,
+    so dependent rows must be deleted first.
+    """
+    quote = connection.ops.quote_name
+    where = ' AND '.join(f'{quote(column)} = %s' for column in columns)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {quote(model._meta.db_table)} WHERE {where}', list(columns.values()))
+        return cursor.rowcount
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """
+    Test runner under which a request over its view's `query_budget` raises QueryBudgetExceeded.
+    """
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._enforce_budgets = override_settings(QUERY_STATS={**settings.QUERY_STATS, 'ENFORCE_BUDGETS': True})
+        self._enforce_budgets.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._enforce_budgets.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """
+    Fail with the most repeated queries if the block runs more than `limit` queries, on any database.
+    """
+    with record_queries() as recorder:
+        yield recorder
+    if recorder.count > limit:
+        raise QueryBudgetExceeded(f'Expected at most {limit} queries. {recorder.report()}')
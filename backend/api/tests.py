@@ -1,3 +1,1614 @@
-from django.test import TestCase
+import base64
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.cache import cache
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient, APIRequestFactory
+
+from backend.db_router import ReplicaRouter, ReplicaRoutingMiddleware, RequestRouting
+
+from .authentication import AccountTokenUser, StatelessJWTAuthentication
+from .bulk_mail import SendPacer, claim_recipients, requeue_unknown, send_due, ses_client
+from . import hashing
+from .async_views import AsyncUserLoginView, AsyncUserRegistrationView
+from .email_templates import inline_css, render_email_template, render_many, text_from_html
+from .hash_pool import HashPool, PoolBroken, get_hash_pool, reset_hash_pools
+from .images import claim_images, process_images, render_variants
+from .event_status import VERSION_KEY
+from .google_auth import GoogleCertificateCache, verify_google_id_token
+from .mail_queue import (BaseTransport, PermanentSendError, claim_batch, deliver_batch, purge_sent_emails, queue_metrics,
+                         render_email, requeue_dead)
+from .models import (Announcement, AnnouncementRecipient, CheckIn, CustomUser, Event, OTPCode, Order, OrganizerMetrics,
+                     OutboundEmail, RecommendationList, Ticket, TicketCategory, TicketHold, TicketTier, UploadedImage)
+from .otp_store import DatabaseOTPStore, RedisOTPStore
+from .query_stats import QueryBudgetExceeded, QueryStatsMiddleware, fingerprint, query_stats, reset_query_stats
+from .ratelimit import TokenBucket
+from .ticket_codes import InvalidTicketCode, public_key_bytes, read_ticket_code, ticket_code
+from .attendees import count_attendees, organizer_attendees
+from .metrics import reconcile_organizer_metrics
+from .migration_operations import uses_trigrams
+from .recommendations import compute_recommendations, np, recommended_events
+from .reservations import checkout, release_expired_holds, reserve
+from .serializers import OrderSerializer, UserPayload
+from .testing import FakeGoogleCertsServer, FakeSESServer, assert_max_queries
+from .views import EventListView, get_tokens_for_user
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class RecordingTransport(BaseTransport):
+    """
+    Test transport that records deliveries and fails for configured recipients.
+    """
+    def __init__(self, failures=None):
+        self.sent = []
+        self.failures = failures or {}
+
+    def send(self, email, html_body, text_body):
+        if email.recipient in self.failures:
+            raise self.failures[email.recipient]
+        self.sent.append((email.recipient, email.subject, html_body, text_body))
+
+
+class MailQueueTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_send_otp_enqueues_instead_of_sending(self):
+        response = self.client.post(reverse('otp_send'), {'email': 'guest@example.com'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.recipient, 'guest@example.com')
+        self.assertEqual(email.template_name, 'api/emails/otp_verification.html')
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(len(email.context['otp']), 6)
+
+    def test_worker_renders_and_marks_sent(self):
+        OutboundEmail.objects.create(
+            template_name='api/emails/otp_verification.html', subject='Code',
+            recipient='a@example.com', context={'otp': '123456'},
+        )
+        transport = RecordingTransport()
+
+        outcome = deliver_batch(claim_batch(), transport)
+
+        self.assertEqual(outcome, {'sent': 1, 'retried': 0, 'dead': 0})
+        self.assertIn('123456', transport.sent[0][3])
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.status, 'sent')
+        self.assertIsNotNone(email.sent_at)
+        self.assertEqual(email.context, {}) # The code is not kept once delivered
+        self.assertEqual(queue_metrics()['send_latency_seconds']['samples'], 1)
+
+    @override_settings(EMAIL_QUEUE={
+        'TRANSPORT': 'file', 'FILE_PATH': '', 'SMTP_HOST': '', 'SMTP_PORT': 0, 'BATCH_SIZE': 10,
+        'MAX_ATTEMPTS': 2, 'BACKOFF_SECONDS': 10, 'MAX_BACKOFF_SECONDS': 60, 'LEASE_SECONDS': 60,
+        'SECRET_TEMPLATES': ['api/emails/otp_verification.html'], 'RETENTION_DAYS': 30,
+    })
+    def test_transient_failure_backs_off_then_dead_letters(self):
+        email = OutboundEmail.objects.create(
+            template_name='api/emails/otp_verification.html', subject='Code',
+            recipient='flaky@example.com', context={'otp': '123456'},
+        )
+        transport = RecordingTransport(failures={'flaky@example.com': ConnectionError('throttled')})
+
+        self.assertEqual(deliver_batch(claim_batch(), transport)['retried'], 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'pending')
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertEqual(claim_batch(), []) # Not due yet
+
+        OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(deliver_batch(claim_batch(), transport)['dead'], 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'dead')
+        self.assertEqual(email.attempts, 2)
+
+    def test_permanent_failure_dead_letters_immediately(self):
+        OutboundEmail.objects.create(
+            template_name='api/emails/otp_verification.html', subject='Code',
+            recipient='bounce@example.com', context={'otp': '123456'},
+        )
+        transport = RecordingTransport(failures={'bounce@example.com': PermanentSendError('rejected')})
+
+        self.assertEqual(deliver_batch(claim_batch(), transport)['dead'], 1)
+        self.assertEqual(queue_metrics()['depth']['dead'], 1)
+        self.assertEqual(OutboundEmail.objects.get().context, {})
+
+    def test_dead_codes_are_not_requeued_and_old_rows_are_purged(self):
+        transport = RecordingTransport(failures={'bounce@example.com': PermanentSendError('rejected')})
+        for template_name, context in (('api/emails/otp_verification.html', {'otp': '123456'}),
+                                       ('api/emails/account_confirmation.html', {'first_name': 'Ana'})):
+            OutboundEmail.objects.create(template_name=template_name, subject='Hi', recipient='bounce@example.com',
+                                         context=context)
+        deliver_batch(claim_batch(), transport)
+        self.assertEqual(requeue_dead(), 1)
+        self.assertEqual(OutboundEmail.objects.get(status='pending').context, {'first_name': 'Ana'})
+
+        OutboundEmail.objects.create(template_name='api/emails/account_confirmation.html', subject='Hi',
+                                     recipient='old@example.com', status='sent')
+        self.assertEqual(purge_sent_emails(now=timezone.now() + timedelta(days=31)), 2) # Sent and dead, not pending
+        self.assertEqual(list(OutboundEmail.objects.values_list('status', flat=True)), ['pending'])
+
+    def test_expired_lease_is_reclaimed(self):
+        OutboundEmail.objects.create(
+            template_name='api/emails/otp_verification.html', subject='Code',
+            recipient='a@example.com', context={'otp': '123456'},
+            status='sending', next_attempt_at=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertEqual(len(claim_batch()), 1)
+
+
+class EmailTemplateTests(TestCase):
+    def test_css_is_inlined_and_text_part_has_its_own_template(self):
+        html_body, text_body = render_email_template('api/emails/ticket_summary.html', {'orders': [{
+            'order_id': 7, 'event_title': 'Rock & Roll', 'location': 'Manila', 'starts': 'Sat',
+            'ticket_count': 2, 'total_amount': '100.00',
+        }]})
+        self.assertIn('<div class="order" style="text-align: left;', html_body)
+        self.assertIn('Rock &amp; Roll', html_body)
+        self.assertNotIn('.order {', html_body) # Only rules that cannot be inlined are left in <style>
+        self.assertIn('.content { padding: 20px !important; }', html_body)
+        self.assertIn('Rock & Roll\nSat · Manila\nOrder #7 · 2 tickets · ₱100.00', text_body)
+        self.assertNotIn('<', text_body)
+        self.assertNotIn('font-family', text_body)
+
+    def test_render_many_renders_each_context(self):
+        rendered = render_many('api/emails/otp_verification.html', [{'otp': '111111'}, {'otp': '222222'}])
+        self.assertEqual([('111111' in html_body, '222222' in text_body) for html_body, text_body in rendered],
+                         [(True, False), (False, True)])
+
+    def test_inlining_follows_the_cascade(self):
+        source = (
+            '<style>p { color: red; margin: 0 } .note p { color: blue } a:hover { color: green }</style>'
+            '<div class="note"><p style="margin: 4px">Hi</p></div><p>{{ name }}</p>'
+        )
+        self.assertEqual(inline_css(source), (
+            '<style>\na:hover { color: green }\n</style>'
+            '<div class="note"><p style="color: blue; margin: 4px;">Hi</p></div>'
+            '<p style="color: red; margin: 0;">{{ name }}</p>'
+        ))
+
+    def test_text_is_derived_when_there_is_no_text_template(self):
+        source = '<html><head><title>T</title></head><body><p>Hi {{ name }},</p>\n\n\n<p>A &amp; B</p></body></html>'
+        self.assertEqual(text_from_html(source), 'Hi {{ name }},\n\nA & B\n')
+
+
+class OTPStoreTests(TestCase):
+    def setUp(self):
+        self.store = DatabaseOTPStore(ttl_seconds=300, max_attempts=3)
+
+    def test_code_is_consumed_exactly_once(self):
+        self.store.issue('User@Example.com', '123456')
+        self.assertTrue(self.store.verify('user@example.com', '123456'))
+        self.assertFalse(self.store.verify('user@example.com', '123456'))
+
+    def test_reissue_replaces_previous_code(self):
+        self.store.issue('user@example.com', '111111')
+        self.store.issue('user@example.com', '222222')
+        self.assertFalse(self.store.verify('user@example.com', '111111'))
+        self.assertTrue(self.store.verify('user@example.com', '222222'))
+
+    def test_code_is_burned_after_max_attempts(self):
+        self.store.issue('user@example.com', '123456')
+        for _ in range(3):
+            self.assertFalse(self.store.verify('user@example.com', '000000'))
+        self.assertFalse(self.store.verify('user@example.com', '123456'))
+
+    def test_expired_codes_are_rejected_and_swept(self):
+        self.store.issue('user@example.com', '123456')
+        OTPCode.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertFalse(self.store.verify('user@example.com', '123456'))
+        self.assertEqual(self.store.sweep(), 1)
+        self.assertFalse(OTPCode.objects.exists())
+
+    def test_send_and_verify_views_use_the_shared_store(self):
+        client = APIClient()
+        client.post(reverse('otp_send'), {'email': 'guest@example.com'}, format='json')
+        otp = OutboundEmail.objects.get().context['otp']
+
+        wrong = client.post(reverse('otp_verify'), {'email': 'guest@example.com', 'otp': '000000'}, format='json')
+        right = client.post(reverse('otp_verify'), {'email': 'guest@example.com', 'otp': otp}, format='json')
+
+        self.assertEqual(wrong.status_code, 400)
+        self.assertEqual(right.status_code, 200)
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    def test_redis_store_consumes_once_and_burns_after_max_attempts(self):
+        store = RedisOTPStore(client=fakeredis.FakeRedis(), ttl_seconds=300, max_attempts=2)
+        store.issue('user@example.com', '123456')
+        self.assertTrue(store.verify('user@example.com', '123456'))
+        self.assertFalse(store.verify('user@example.com', '123456'))
+
+        store.issue('user@example.com', '123456')
+        self.assertFalse(store.verify('user@example.com', '000000'))
+        self.assertFalse(store.verify('user@example.com', '000000'))
+        self.assertFalse(store.verify('user@example.com', '123456'))
+
+
+GOOGLE_AUDIENCE = 'test-client.apps.googleusercontent.com'
+
+
+class GoogleCertificateCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeGoogleCertsServer(max_age=3600).__enter__()
+        cls.token = cls.server.make_id_token(email='google@example.com', audience=GOOGLE_AUDIENCE)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.__exit__(None, None, None)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.max_age = 3600
+        self.server.fail = False
+        self.server.latency = 0
+
+    def test_certificates_are_cached_for_max_age(self):
+        certs = GoogleCertificateCache(self.server.url)
+        before = self.server.requests_served
+        certs.get_certs()
+        certs.get_certs()
+        self.assertEqual(self.server.requests_served - before, 1)
+
+    def test_stale_certificates_are_used_when_fetch_fails(self):
+        self.server.max_age = 0
+        certs = GoogleCertificateCache(self.server.url)
+        first = certs.get_certs()
+        self.server.fail = True
+        self.assertEqual(certs.get_certs(), first)
+
+    def test_concurrent_callers_share_one_fetch(self):
+        self.server.max_age = 0
+        certs = GoogleCertificateCache(self.server.url)
+        certs.get_certs()
+        self.server.latency = 0.2
+        before = self.server.requests_served
+        threads = [threading.Thread(target=certs.get_certs) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.server.requests_served - before, 1)
+
+    def test_failed_fetches_back_off(self):
+        self.server.max_age = 0
+        certs = GoogleCertificateCache(self.server.url, backoff=0.2)
+        first = certs.get_certs()
+        self.server.fail = True
+        before = self.server.requests_served
+        for _ in range(5):
+            self.assertEqual(certs.get_certs(), first) # Stale, without asking Google again
+        self.assertEqual(self.server.requests_served - before, 1)
+        time.sleep(0.25)
+        self.server.fail = False
+        certs.get_certs()
+        self.assertEqual((self.server.requests_served - before, certs.fetch_count), (2, 2))
+
+    def test_refreshes_in_background_before_expiry(self):
+        self.server.max_age = 60
+        certs = GoogleCertificateCache(self.server.url, refresh_margin=300)
+        certs.get_certs()
+        certs.get_certs() # Inside the refresh margin: served from cache, refresh started
+        deadline = time.time() + 5
+        while certs.fetch_count < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(certs.fetch_count, 2)
+
+    def test_google_login_verifies_against_cached_certificates(self):
+        CustomUser.objects.create_user(email='google@example.com')
+        with override_settings(GOOGLE_CERTS_URL=self.server.url, GOOGLE_CLIENT_ID=GOOGLE_AUDIENCE):
+            self.assertEqual(verify_google_id_token(self.token, GOOGLE_AUDIENCE)['email'], 'google@example.com')
+            response = APIClient().post(reverse('google_login'), {'token': self.token}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['email'], 'google@example.com')
+
+    def test_wrong_audience_is_rejected(self):
+        with override_settings(GOOGLE_CERTS_URL=self.server.url):
+            with self.assertRaises(ValueError):
+                verify_google_id_token(self.token, 'someone-else.apps.googleusercontent.com')
+
+
+class UserPayloadTests(TestCase):
+    def test_payload_fields_and_token_claims(self):
+        user = CustomUser(email='client@example.com', first_name='Ana', role='client',
+                          birthday=datetime.date(1990, 5, 17), phone_number='0917')
+        payload = UserPayload(user)
+
+        self.assertEqual(list(payload.data), list(UserPayload.FIELDS) + ['needs_profile_completion'])
+        self.assertEqual(payload.data['birthday'], '1990-05-17')
+        self.assertTrue(payload.data['needs_profile_completion']) # gender/company missing
+        self.assertEqual(payload.token_claims(), {
+            'role': 'client', 'phone_number': '0917', 'birthday': '1990-05-17',
+            'gender': None, 'company_name': None, 'company_website': None,
+        })
+
+    def test_completed_client_and_guest_do_not_need_profile_completion(self):
+        client = CustomUser(email='c@example.com', role='client', phone_number='0917',
+                            birthday=datetime.date(1990, 5, 17), gender='female',
+                            company_name='Sari', company_website='https://sari.example.com')
+        self.assertFalse(UserPayload(client).needs_profile_completion)
+        self.assertFalse(UserPayload(CustomUser(email='g@example.com', role='guest')).needs_profile_completion)
+        self.assertTrue(UserPayload(client, needs_profile_completion=True).data['needs_profile_completion'])
+
+    def test_login_response_uses_payload(self):
+        CustomUser.objects.create_user(email='guest@example.com', password='s3cure-pass', first_name='Gia')
+        response = APIClient().post(reverse('login'), {'email': 'guest@example.com', 'password': 's3cure-pass'},
+                                    format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['first_name'], 'Gia')
+        self.assertFalse(response.data['user']['needs_profile_completion'])
+        self.assertEqual(response.data['tokens']['role'], 'guest')
+        self.assertIn('access', response.data['tokens'])
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(email='client@example.com', password='s3cure-pass', role='client')
+        response = self.client.post(reverse('login'), {'email': 'client@example.com', 'password': 's3cure-pass'},
+                                    format='json')
+        self.authorization = f"Bearer {response.data['tokens']['access']}"
+        self.client.credentials(HTTP_AUTHORIZATION=self.authorization)
+
+    def authenticate(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=self.authorization)
+        return StatelessJWTAuthentication().authenticate(request)
+
+    def test_warm_cache_authenticates_without_queries(self):
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+        self.assertIsInstance(user, AccountTokenUser)
+        self.assertEqual(user.role, 'client')
+        self.assertEqual(str(user.id), str(self.user.pk))
+
+    def test_cold_cache_costs_one_query(self):
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            self.authenticate()
+
+    def test_deactivated_user_is_cut_off(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.post(reverse('complete_profile'), {'gender': 'female'}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_change_revokes_tokens(self):
+        self.user.set_password('an0ther-pass')
+        self.user.save()
+        response = self.client.post(reverse('complete_profile'), {'gender': 'female'}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_profile_completion_loads_the_user_row(self):
+        response = self.client.post(reverse('complete_profile'), {'gender': 'female'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.gender, 'female')
+
+
+class PasswordHashingPolicyTests(TestCase):
+    def test_new_passwords_use_the_preferred_tier(self):
+        user = CustomUser.objects.create_user(email='a@example.com', password='s3cure-pass')
+        self.assertEqual(identify_hasher(user.password).algorithm, 'bcrypt_sha256')
+
+    def test_legacy_hash_is_upgraded_on_login_without_revoking_tokens(self):
+        user = CustomUser.objects.create_user(email='a@example.com', password='s3cure-pass')
+        legacy = make_password('s3cure-pass', hasher='pbkdf2_sha256')
+        CustomUser.objects.filter(pk=user.pk).update(password=legacy)
+        version = CustomUser.objects.get(pk=user.pk).token_version
+
+        self.assertEqual(authenticate(email='a@example.com', password='s3cure-pass').pk, user.pk)
+
+        user.refresh_from_db()
+        self.assertEqual(identify_hasher(user.password).algorithm, 'bcrypt_sha256')
+        self.assertEqual(user.token_version, version)
+
+    def test_work_factor_change_triggers_rehash(self):
+        user = CustomUser.objects.create_user(email='a@example.com', password='s3cure-pass')
+        with self.settings(PASSWORD_HASHING={**settings.PASSWORD_HASHING, 'BCRYPT_ROUNDS': 5}):
+            self.assertTrue(user.check_password('s3cure-pass'))
+        user.refresh_from_db()
+        self.assertIn('$05$', user.password)
+
+    def test_unknown_email_checks_against_dummy_hash(self):
+        with mock.patch('api.hashing.check_password', wraps=hashing.check_password) as checked:
+            self.assertIsNone(authenticate(email='nobody@example.com', password='s3cure-pass'))
+        checked.assert_called_once_with('s3cure-pass', hashing.dummy_password_hash())
+        self.assertEqual(identify_hasher(hashing.dummy_password_hash()).algorithm, 'bcrypt_sha256')
+
+
+THREAD_HASH_POOLS = {
+    'login': {'WORKERS': 1, 'MAX_QUEUE': 0, 'EXECUTOR': 'thread'},
+    'register': {'WORKERS': 1, 'MAX_QUEUE': 0, 'EXECUTOR': 'thread'},
+}
+
+
+@override_settings(AUTH_HASH_POOLS=THREAD_HASH_POOLS)
+class AsyncAuthViewTests(TestCase):
+    def setUp(self):
+        reset_hash_pools()
+        self.factory = AsyncRequestFactory()
+
+    def tearDown(self):
+        reset_hash_pools()
+
+    def post(self, view_class, data):
+        request = self.factory.post('/', data, content_type='application/json')
+        return view_class.as_view()(request)
+
+    async def test_login_verifies_on_the_pool(self):
+        await CustomUser.objects.acreate(email='guest@example.com', password=make_password('s3cure-pass'))
+
+        response = await self.post(AsyncUserLoginView, {'email': 'guest@example.com', 'password': 's3cure-pass'})
+        wrong = await self.post(AsyncUserLoginView, {'email': 'guest@example.com', 'password': 'nope-nope'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', json.loads(response.content)['tokens'])
+        self.assertEqual(wrong.status_code, 400)
+        self.assertEqual(get_hash_pool('login').stats()['completed'], 2)
+
+    async def test_registration_hashes_on_the_pool(self):
+        response = await self.post(AsyncUserRegistrationView, {
+            'email': 'new@example.com', 'password': 's3cure-pass', 'confirm_password': 's3cure-pass',
+        })
+
+        self.assertEqual(response.status_code, 201)
+        user = await CustomUser.objects.aget(email='new@example.com')
+        self.assertTrue(await user.acheck_password('s3cure-pass'))
+        self.assertTrue(await OutboundEmail.objects.filter(recipient='new@example.com').aexists())
+
+    async def test_full_pool_returns_503_with_retry_after(self):
+        release = threading.Event()
+        busy = get_hash_pool('login').submit(release.wait)
+        try:
+            response = await self.post(AsyncUserLoginView, {'email': 'a@example.com', 'password': 's3cure-pass'})
+        finally:
+            release.set()
+            busy.result()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(get_hash_pool('login').stats()['rejected'], 1)
+
+    async def test_dead_worker_returns_503_and_restarts_the_pool(self):
+        pool = HashPool('login', workers=1, max_queue=0, executor='process')
+        self.addCleanup(pool.shutdown)
+        with self.assertRaises(PoolBroken):
+            await pool.run(os._exit, 1) # The worker dies mid-job, as when killed for memory
+        self.assertEqual(await pool.run(abs, -3), 3) # On a new executor
+        self.assertEqual(pool.stats()['restarts'], 1)
+
+        with mock.patch.object(HashPool, 'run', side_effect=PoolBroken('login')):
+            response = await self.post(AsyncUserLoginView, {'email': 'a@example.com', 'password': 's3cure-pass'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+
+    def test_pool_stats_are_admin_only(self):
+        admin = CustomUser.objects.create_superuser(email='admin@example.com', password='s3cure-pass')
+        guest = CustomUser.objects.create_user(email='guest@example.com', password='s3cure-pass')
+        client = APIClient()
+
+        client.force_authenticate(guest)
+        self.assertEqual(client.get(reverse('hash_pool_stats')).status_code, 403)
+        client.force_authenticate(admin)
+        self.assertEqual(client.get(reverse('hash_pool_stats')).status_code, 200)
+
+    def test_database_pool_stats(self):
+        admin = CustomUser.objects.create_superuser(email='admin@example.com', password='s3cure-pass')
+        client = APIClient()
+
+        self.assertEqual(client.get(reverse('db_pool_stats')).status_code, 401)
+        client.force_authenticate(admin)
+        response = client.get(reverse('db_pool_stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['pid'], os.getpid())
+        default = response.data['databases'][0]
+        self.assertEqual(default['alias'], 'default')
+        # The test database is SQLite, which is never pooled
+        self.assertEqual((default['pooled'], default['pool']), (False, None))
+
+
+def make_event(organizer, title='Launch Night', status='published', days_ahead=7, tiers=((500, 100),), **fields):
+    start = timezone.now() + timedelta(days=days_ahead)
+    fields.setdefault('location', 'Manila')
+    event = Event.objects.create(
+        organizer=organizer, title=title, status=status,
+        start_date=start, end_date=start + timedelta(hours=4), **fields,
+    )
+    category = TicketCategory.objects.create(event=event, name='General Admission')
+    for price, capacity in tiers:
+        TicketTier.objects.create(event=event, category=category, name=f'Tier {price}', price=price, capacity=capacity)
+    return event
+
+
+class EventQueryCountTests(TestCase):
+    """
+    Listing and detail endpoints must run a fixed number of queries however
+    many events, organizers, categories and tiers are involved.
+    """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.organizer = CustomUser.objects.create_user(email='org@example.com', password='s3cure-pass', role='client',
+                                                        company_name='Sari-Sari Live')
+
+    def login(self, user):
+        response = self.client.post(reverse('login'), {'email': user.email, 'password': 's3cure-pass'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['tokens']['access']}")
+
+    def test_event_list_query_count_is_constant(self):
+        make_event(self.organizer)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('event_list'))
+        self.assertEqual(len(response.data['results']), 1)
+
+        for i in range(5):
+            other = CustomUser.objects.create_user(email=f'org{i}@example.com', password='x', role='client')
+            make_event(other, title=f'Event {i}', tiers=((100, 10), (200, 20), (300, 30)))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('event_list'))
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_event_list_summarises_tiers(self):
+        make_event(self.organizer, tiers=((750, 0), (500, 10)))
+        sold_out = make_event(self.organizer, title='Sold Out', tiers=((300, 0),))
+        make_event(self.organizer, title='Draft', status='draft')
+        make_event(self.organizer, title='Past', days_ahead=-7)
+
+        results = {row['title']: row for row in self.client.get(reverse('event_list')).data['results']}
+        self.assertEqual(set(results), {'Launch Night', 'Sold Out'})
+        self.assertEqual(results['Launch Night']['min_price'], '500.00')
+        self.assertFalse(results['Launch Night']['is_sold_out'])
+        self.assertTrue(results['Sold Out']['is_sold_out'])
+        self.assertEqual(results['Sold Out']['organizer_name'], 'Sari-Sari Live')
+        self.assertEqual(TicketTier.objects.get(event=sold_out).remaining_capacity, 0)
+
+    def test_event_list_filters_by_category(self):
+        make_event(self.organizer, title='Gig', category='music')
+        make_event(self.organizer, title='Summit', category='business')
+        response = self.client.get(reverse('event_list'), {'category': 'music'})
+        self.assertEqual([row['title'] for row in response.data['results']], ['Gig'])
+
+    def test_event_detail_query_count_is_constant(self):
+        small = make_event(self.organizer)
+        large = make_event(self.organizer, tiers=((100, 10), (200, 20), (300, 30), (400, 40)))
+        TicketCategory.objects.create(event=large, name='VIP')
+
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('event_detail', args=[small.pk]))
+        self.assertEqual(len(response.data['ticket_categories'][0]['tiers']), 1)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('event_detail', args=[large.pk]))
+        self.assertEqual([len(c['tiers']) for c in response.data['ticket_categories']], [4, 0])
+
+    def test_draft_event_is_only_visible_to_its_organizer(self):
+        draft = make_event(self.organizer, status='draft')
+        self.assertEqual(self.client.get(reverse('event_detail', args=[draft.pk])).status_code, 404)
+        self.login(self.organizer)
+        self.assertEqual(self.client.get(reverse('event_detail', args=[draft.pk])).status_code, 200)
+
+    def test_organizer_event_list_query_count_is_constant(self):
+        make_event(self.organizer, status='draft')
+        self.login(self.organizer)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('organizer_event_list'))
+        self.assertEqual(len(response.data['results']), 1)
+
+        for i in range(5):
+            make_event(self.organizer, title=f'Event {i}', tiers=((100, 10), (200, 20)))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('organizer_event_list'), {'status': 'published'})
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_organizer_event_list_pages_newest_first(self):
+        for i in range(5):
+            make_event(self.organizer, title=f'Event {i}', days_ahead=i + 1)
+        self.login(self.organizer)
+        titles, params = [], {'limit': 2}
+        while True:
+            with self.assertNumQueries(1):
+                page = self.client.get(reverse('organizer_event_list'), params).data
+            titles += [row['title'] for row in page['results']]
+            if page['next_cursor'] is None:
+                break
+            params['cursor'] = page['next_cursor']
+        self.assertEqual(titles, [f'Event {i}' for i in reversed(range(5))])
+        self.assertEqual(self.client.get(reverse('organizer_event_list'), {'status': 'nope'}).status_code, 400)
+
+
+    def test_event_list_pages_with_a_cursor(self):
+        same_start = timezone.now() + timedelta(days=3)
+        for i in range(7):
+            make_event(self.organizer, title=f'Event {i}', days_ahead=i + 1)
+        Event.objects.filter(title__in=['Event 2', 'Event 3', 'Event 4']).update(start_date=same_start)
+
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('event_list'), params)
+            seen += [row['id'] for row in response.data['results']]
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                break
+        expected = list(Event.objects.order_by('start_date', 'id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_event_list_rejects_bad_parameters(self):
+        self.assertEqual(self.client.get(reverse('event_list'), {'cursor': 'not-a-cursor'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('event_list'), {'fields': 'id,password'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('event_list'), {'limit': 1000}).status_code, 400)
+
+    def test_event_list_filters_by_date_and_location(self):
+        make_event(self.organizer, title='Soon', days_ahead=1)
+        make_event(self.organizer, title='Later', days_ahead=10, location='Cebu')
+        later_day = (timezone.localtime() + timedelta(days=10)).date()
+
+        response = self.client.get(reverse('event_list'), {'date_from': later_day.isoformat()})
+        self.assertEqual([row['title'] for row in response.data['results']], ['Later'])
+        response = self.client.get(reverse('event_list'), {'date_to': later_day.isoformat(), 'location': 'Manila'})
+        self.assertEqual([row['title'] for row in response.data['results']], ['Soon'])
+
+    def test_event_list_sparse_fields_skip_joins(self):
+        make_event(self.organizer)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('event_list'), {'fields': 'id,title'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+        self.assertNotIn('JOIN', queries[0]['sql'])
+
+    def test_event_list_supports_conditional_requests(self):
+        event = make_event(self.organizer)
+        response = self.client.get(reverse('event_list'))
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(reverse('event_list'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        TicketTier.objects.filter(event=event).update(remaining_capacity=0)
+        response = self.client.get(reverse('event_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'][0]['is_sold_out'])
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        organizer = CustomUser.objects.create_user(email='org@example.com', password='s3cure-pass', role='client')
+        self.event = make_event(organizer, tiers=((250, 5),))
+        self.tier = self.event.ticket_tiers.get()
+
+    def reserve(self, quantity, email='buyer@example.com'):
+        return self.client.post(reverse('reserve_tickets', args=[self.tier.pk]),
+                                {'quantity': quantity, 'email': email}, format='json')
+
+    def checkout(self, hold_key, key='key-1'):
+        return self.client.post(reverse('checkout'), {'hold_key': hold_key}, format='json',
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_reservations_never_exceed_capacity(self):
+        self.assertEqual(self.reserve(3).status_code, 201)
+        self.assertEqual(self.reserve(3).status_code, 409)
+        self.assertEqual(self.reserve(2).status_code, 201)
+        self.assertEqual(self.reserve(1).status_code, 409)
+        self.tier.refresh_from_db()
+        self.assertEqual(self.tier.remaining_capacity, 0)
+        self.assertTrue(self.tier.is_sold_out)
+
+    def test_unpublished_tier_is_not_on_sale(self):
+        Event.objects.filter(pk=self.event.pk).update(status='draft')
+        self.assertEqual(self.reserve(1).status_code, 404)
+
+    def test_checkout_is_idempotent(self):
+        hold_key = self.reserve(2).data['hold_key']
+        first = self.checkout(hold_key)
+        retry = self.checkout(hold_key)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(first.data['id'], retry.data['id'])
+        self.assertEqual(first.data['total_amount'], '500.00')
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Ticket.objects.filter(tier=self.tier).count(), 2)
+
+    def test_idempotency_key_cannot_be_reused_for_another_hold(self):
+        self.checkout(self.reserve(1).data['hold_key'])
+        response = self.checkout(self.reserve(1, email='other@example.com').data['hold_key'])
+        self.assertEqual(response.status_code, 422)
+
+    def test_checkout_requires_idempotency_key(self):
+        hold_key = self.reserve(1).data['hold_key']
+        response = self.client.post(reverse('checkout'), {'hold_key': hold_key}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_expired_holds_return_stock(self):
+        hold_key = self.reserve(4).data['hold_key']
+        TicketHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.checkout(hold_key).status_code, 410)
+        self.tier.refresh_from_db()
+        self.assertEqual(self.tier.remaining_capacity, 5)
+
+        self.reserve(5)
+        TicketHold.objects.filter(status='active').update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(release_expired_holds(), 1)
+        self.assertEqual(release_expired_holds(), 0)
+        self.tier.refresh_from_db()
+        self.assertEqual(self.tier.remaining_capacity, 5)
+
+    def test_release_hold(self):
+        hold_key = self.reserve(2).data['hold_key']
+        self.assertEqual(self.client.delete(reverse('release_hold', args=[hold_key])).status_code, 204)
+        self.assertEqual(self.client.delete(reverse('release_hold', args=[hold_key])).status_code, 404)
+        self.tier.refresh_from_db()
+        self.assertEqual(self.tier.remaining_capacity, 5)
+
+
+class EventSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.organizer = CustomUser.objects.create_user(email='org@example.com', password='s3cure-pass', role='client')
+
+    def search(self, **params):
+        return self.client.get(reverse('event_search'), params)
+
+    def test_search_matches_title_location_and_description(self):
+        make_event(self.organizer, title='Jazz <Night>', description='Smooth jazz by the bay.')
+        make_event(self.organizer, title='Robotics Summit', location='Cebu')
+        make_event(self.organizer, title='Jazz Draft', status='draft')
+
+        results = self.search(q='jazz').data['results']
+        self.assertEqual([row['title'] for row in results], ['Jazz <Night>'])
+        self.assertEqual(results[0]['title_highlight'], '<mark>Jazz</mark> &lt;Night&gt;')
+        self.assertIn('<mark>jazz</mark>', results[0]['snippet'])
+        self.assertEqual([row['title'] for row in self.search(q='cebu').data['results']], ['Robotics Summit'])
+
+    def test_search_requires_a_query(self):
+        self.assertEqual(self.search().status_code, 400)
+        self.assertEqual(self.search(q='jazz', limit=500).status_code, 400)
+
+    def test_trigram_indexes_are_recognised(self):
+        # Migrations skip these when pg_trgm could not be installed
+        indexes = {index.name: uses_trigrams(index) for model in (Event, Ticket) for index in model._meta.indexes}
+        self.assertEqual(sorted(name for name, trigrams in indexes.items() if trigrams),
+                         ['event_title_trgm_idx', 'ticket_email_trgm_idx', 'ticket_name_trgm_idx'])
+
+
+class OrganizerDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.organizer = CustomUser.objects.create_user(email='org@example.com', password='s3cure-pass', role='client')
+        response = self.client.post(reverse('login'), {'email': 'org@example.com', 'password': 's3cure-pass'},
+                                    format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['tokens']['access']}")
+
+    def buy(self, event, quantity, key):
+        hold = reserve(event.ticket_tiers.first().pk, quantity, 'buyer@example.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout(hold.hold_key, key)
+
+    def test_dashboard_totals_are_maintained_incrementally(self):
+        first = make_event(self.organizer, tiers=((250, 50),))
+        second = make_event(self.organizer, title='Past', days_ahead=-30, tiers=((100, 50),))
+        make_event(self.organizer, title='Draft', status='draft')
+        Event.objects.filter(pk=second.pk).update(end_date=timezone.now() + timedelta(hours=1))
+        self.buy(first, 2, 'order-1')
+        self.buy(second, 3, 'order-2')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('organizer_dashboard'))
+        self.assertEqual(response.data['total_revenue'], '800.00')
+        self.assertEqual(response.data['total_attendees'], 5)
+        self.assertEqual(response.data['total_events'], 3)
+        self.assertEqual(response.data['upcoming_events'], 2) # Ongoing events have not ended, as in the listing
+
+        for i in range(5):
+            make_event(self.organizer, title=f'More {i}')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('organizer_dashboard'))
+        self.assertEqual(response.data['upcoming_events'], 7)
+
+    def test_reconcile_corrects_drift(self):
+        event = make_event(self.organizer, tiers=((250, 50),))
+        self.buy(event, 2, 'order-1')
+        OrganizerMetrics.objects.update(total_revenue=0, total_attendees=99)
+
+        self.assertEqual(reconcile_organizer_metrics(), 1)
+        metrics = OrganizerMetrics.objects.get(pk=self.organizer.pk)
+        self.assertEqual((metrics.total_revenue, metrics.total_attendees, metrics.total_events), (500, 2, 1))
+        self.assertEqual(reconcile_organizer_metrics(), 0)
+
+    def test_deleting_an_organizer_cascades_cleanly(self):
+        make_event(self.organizer)
+        Event.objects.filter(organizer=self.organizer).delete()
+        self.assertEqual(OrganizerMetrics.objects.get(pk=self.organizer.pk).total_events, 0)
+        make_event(self.organizer)
+        OrganizerMetrics.objects.update(total_events=0) # Drifted low
+        Event.objects.filter(organizer=self.organizer).delete()
+        self.assertEqual(OrganizerMetrics.objects.get(pk=self.organizer.pk).total_events, 0) # Not -1
+        make_event(self.organizer)
+        self.organizer.delete()
+        self.assertFalse(OrganizerMetrics.objects.exists())
+
+
+def make_attendees(event, count, name='Attendee'):
+    tier = event.ticket_tiers.first()
+    order = Order.objects.create(event=event, email='buyer@example.com', status='paid')
+    Ticket.objects.bulk_create([
+        Ticket(order=order, event=event, organizer_id=event.organizer_id, tier=tier, attendee_name=f'{name} {i}',
+               attendee_email=f'guest{i}@example.com')
+        for i in range(count)
+    ], batch_size=2000)
+
+
+class AttendeeExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.organizer = CustomUser.objects.create_user(email='org@example.com', password='s3cure-pass', role='client')
+        response = self.client.post(reverse('login'), {'email': 'org@example.com', 'password': 's3cure-pass'},
+                                    format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['tokens']['access']}")
+        self.event = make_event(self.organizer)
+
+    def export(self, file_format='csv', **params):
+        response = self.client.get(reverse('attendee_export', args=[file_format]), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_csv_export_applies_filters_and_ownership(self):
+        make_attendees(self.event, 3)
+        Ticket.objects.filter(attendee_name='Attendee 2').update(attendee_name='=HYPERLINK("x")')
+        other = make_event(CustomUser.objects.create_user(email='other@example.com', role='client'))
+        make_attendees(other, 2, name='Stranger')
+
+        lines = b''.join(self.export().streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0], 'Ticket ID,Name,Email,Event,Ticket Tier,Order ID,Status,Purchased At')
+        self.assertEqual(len(lines), 4)
+        self.assertIn(',"\'=HYPERLINK(""x"")",', lines[3])
+        self.assertNotIn('Stranger', ''.join(lines))
+
+        lines = b''.join(self.export(q='guest1@').streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 2)
+        # Short queries still match anywhere, unlike the attendee list's prefix search
+        lines = b''.join(self.export(q='st').streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 4)
+
+    def test_csv_export_is_gzipped_when_accepted(self):
+        make_attendees(self.event, 5)
+        response = self.client.get(reverse('attendee_export', args=['csv']), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8-sig')
+        self.assertEqual(len(body.splitlines()), 6)
+
+    def test_xlsx_export_is_a_valid_workbook(self):
+        make_attendees(self.event, 3)
+        body = b''.join(self.export('xlsx').streaming_content)
+        with zipfile.ZipFile(io.BytesIO(body)) as workbook:
+            self.assertIsNone(workbook.testzip())
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 4)
+        self.assertIn('Attendee 2', sheet)
+
+    def test_export_memory_stays_flat(self):
+        rows, budget = 60000, 3 * 1024 * 1024
+        make_attendees(self.event, rows)
+        response = self.export()
+        tracemalloc.start()
+        try:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertGreater(size, 2 * budget)
+        self.assertLess(peak, budget, f'Exporting {rows} rows ({size} bytes) peaked at {peak} bytes')
+
+
+class AttendeeListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.organizer = CustomUser.objects.create_user(email='org@example.com', password='s3cure-pass', role='client')
+        response = self.client.post(reverse('login'), {'email': 'org@example.com', 'password': 's3cure-pass'},
+                                    format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['tokens']['access']}")
+        self.event = make_event(self.organizer)
+        make_attendees(self.event, 25)
+        make_attendees(make_event(CustomUser.objects.create_user(email='other@example.com', role='client')), 5,
+                       name='Stranger')
+
+    def list_attendees(self, **params):
+        response = self.client.get(reverse('organizer_attendees'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_keyset_pages_cover_own_attendees_once(self):
+        seen, cursor = [], None
+        with CaptureQueriesContext(connection) as queries:
+            page = self.list_attendees(limit=10)
+        self.assertEqual(len(queries), 2) # page + bounded count
+        self.assertEqual((page['count'], page['count_is_estimate']), (25, False))
+        self.assertEqual(page['results'][0]['event_title'], self.event.title)
+        while True:
+            seen += [row['id'] for row in page['results']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+            page = self.list_attendees(limit=10, cursor=cursor)
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(set(seen), set(Ticket.objects.filter(event=self.event).values_list('id', flat=True)))
+
+    def test_short_queries_match_prefixes_and_longer_ones_substrings(self):
+        self.assertEqual(self.list_attendees(q='gu')['count'], 25)
+        self.assertEqual(self.list_attendees(q='st')['count'], 0)
+        self.assertEqual(self.list_attendees(q='st1@')['count'], 1)
+        self.assertEqual(self.list_attendees(q='ATTENDEE 1')['count'], 11) # 1, 10..19
+        self.assertEqual(self.list_attendees(q='Stranger')['count'], 0)
+
+    def test_count_is_exact_only_up_to_the_limit(self):
+        tickets = organizer_attendees(self.organizer.id)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(count_attendees(tickets, exact_limit=30), (25, False))
+        self.assertIn('LIMIT 31', queries[0]['sql'])
+        # Past the limit, SQLite has no planner estimate to fall back on and counts exactly
+        self.assertEqual(count_attendees(tickets, exact_limit=10), (25, False))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('organizer_attendees'), {'cursor': '!!!'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AdminEventTabsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_superuser(email='admin@example.com',
+                                                                           password='s3cure-pass'))
+        organizer = CustomUser.objects.create_user(email='org@example.com', role='client', company_name='Tech Corp.')
+        self.ongoing = make_event(organizer, 'Kids Party', days_ahead=-0.05)
+        make_attendees(self.ongoing, 3)
+        self.upcoming = [make_event(organizer, f'Upcoming {i}', days_ahead=i + 1) for i in range(3)]
+        make_event(organizer, 'Rained Out', status='canceled')
+        make_event(organizer, 'Draft', status='draft')
+
+    def tabs(self, **params):
+        response = self.client.get(reverse('admin_event_tabs'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_counts_and_rows_per_tab(self):
+        data = self.tabs(tab='ongoing')
+        self.assertEqual(data['counts'], {'all': 6, 'ongoing': 1, 'upcoming': 3, 'canceled': 1})
+        [row] = data['results']
+        self.assertEqual((row['title'], row['state'], row['attendee_count'], row['organizer_name']),
+                         ('Kids Party', 'ongoing', 3, 'Tech Corp.'))
+        self.assertEqual([row['title'] for row in self.tabs(tab='canceled')['results']], ['Rained Out'])
+
+    def test_pages_are_keyset_paginated(self):
+        first = self.tabs(tab='upcoming', limit=2)
+        second = self.tabs(tab='upcoming', limit=2, cursor=first['next_cursor'])
+        self.assertEqual([row['title'] for row in first['results'] + second['results']],
+                         ['Upcoming 0', 'Upcoming 1', 'Upcoming 2'])
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(len(self.tabs(limit=4)['results']), 4) # All tab, most recent first
+
+    def test_results_are_cached_until_an_event_changes(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.tabs(tab='upcoming')
+        self.assertEqual(len(queries), 2) # page + counts
+        with CaptureQueriesContext(connection) as queries:
+            self.tabs(tab='upcoming')
+        self.assertEqual(len(queries), 0)
+
+        self.upcoming[0].status = 'canceled'
+        self.upcoming[0].save()
+        data = self.tabs(tab='upcoming')
+        self.assertEqual((data['counts']['upcoming'], data['counts']['canceled']), (2, 2))
+        self.assertNotIn('Upcoming 0', [row['title'] for row in data['results']])
+
+    def test_admin_only(self):
+        self.client.force_authenticate(CustomUser.objects.get(email='org@example.com'))
+        self.assertEqual(self.client.get(reverse('admin_event_tabs')).status_code, 403)
+
+
+@skipUnless(np is not None, 'numpy and scipy are not installed')
+class RecommendationTests(TestCase):
+    def setUp(self):
+        organizer = CustomUser.objects.create_user(email='org@example.com', role='client')
+        self.fan, self.friend = (CustomUser.objects.create_user(email=f'{name}@example.com') for name in ('fan', 'friend'))
+        past = make_event(organizer, 'Last Year', days_ahead=-30, category='music')
+        self.jazz = make_event(organizer, 'Jazz Night', days_ahead=5, category='music')
+        self.rock = make_event(organizer, 'Rock Fest', days_ahead=6, category='music')
+        self.run = make_event(organizer, 'Fun Run', days_ahead=7, category='sports')
+        self.buy(self.fan, past)
+        self.buy(self.friend, past)
+        self.buy(self.friend, self.jazz)
+        self.buy(None, self.rock, 5)
+        self.buy(None, self.run, 2)
+        compute_recommendations()
+
+    def buy(self, buyer, event, quantity=1):
+        order = Order.objects.create(event=event, buyer=buyer, email='buyer@example.com', status='paid')
+        Ticket.objects.bulk_create([
+            Ticket(order=order, event=event, organizer_id=event.organizer_id, tier=event.ticket_tiers.first(),
+                   attendee_email='buyer@example.com')
+            for _ in range(quantity)
+        ])
+
+    def titles(self, cards):
+        return [card['title'] for card in cards]
+
+    def test_lists_combine_co_attendance_and_category_affinity(self):
+        # The friend who shared the fan's past event bought Jazz Night; Rock Fest matches the fan's category
+        fan = RecommendationList.objects.get(key=f'user:{self.fan.pk}')
+        self.assertEqual(self.titles(fan.events), ['Jazz Night', 'Rock Fest'])
+        friend = RecommendationList.objects.get(key=f'user:{self.friend.pk}')
+        self.assertEqual(self.titles(friend.events), ['Rock Fest']) # Never their own tickets
+        self.assertEqual(self.titles(RecommendationList.objects.get(key='popular:all').events),
+                         ['Rock Fest', 'Fun Run', 'Jazz Night'])
+
+    def test_endpoint_is_one_lookup_with_popular_fallback(self):
+        client = APIClient()
+        client.force_authenticate(self.fan)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('recommended_events'))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.data['source'], 'personal')
+        self.assertEqual(self.titles(response.data['results']), ['Jazz Night', 'Rock Fest', 'Fun Run'])
+        # None of the fan's own cards are sports events
+        response = client.get(reverse('recommended_events'), {'category': 'sports'})
+        self.assertEqual((response.data['source'], self.titles(response.data['results'])), ('popular', ['Fun Run']))
+
+        client.force_authenticate(None)
+        response = client.get(reverse('recommended_events'), {'category': 'sports'})
+        self.assertEqual((response.data['source'], self.titles(response.data['results'])), ('popular', ['Fun Run']))
+
+    def test_started_events_are_skipped_and_stale_lists_removed(self):
+        cards, _ = recommended_events(self.fan.pk, now=self.jazz.start_date + timedelta(minutes=1))
+        self.assertEqual(self.titles(cards), ['Rock Fest', 'Fun Run'])
+        cards, source = recommended_events(self.fan.pk, now=self.rock.start_date + timedelta(minutes=1))
+        self.assertEqual((self.titles(cards), source), (['Fun Run'], 'popular'))
+
+        Event.objects.filter(pk__in=[self.jazz.pk, self.rock.pk, self.run.pk]).update(status='canceled')
+        compute_recommendations()
+        self.assertFalse(RecommendationList.objects.filter(key__startswith='user:').exists())
+
+
+class FindTicketsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.event = make_event(CustomUser.objects.create_user(email='org@example.com', role='client'))
+        order = Order.objects.create(event=self.event, email='Guest.Buyer@Example.com', status='paid')
+        Ticket.objects.create(order=order, event=self.event, organizer_id=self.event.organizer_id,
+                              tier=self.event.ticket_tiers.first(), attendee_name='Guest Buyer')
+        Order.objects.create(event=self.event, email='guest.buyer@example.com', status='pending')
+
+    def find(self, email, ip='203.0.113.5'):
+        return self.client.post(reverse('find_tickets'), {'email': email}, format='json', REMOTE_ADDR=ip)
+
+    def test_guest_orders_are_found_case_insensitively(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.find('GUEST.buyer@example.com')
+        self.assertEqual(response.status_code, 202)
+        self.assertIn('LOWER', queries[0]['sql'])
+        email = OutboundEmail.objects.get()
+        self.assertEqual((email.recipient, email.template_name),
+                         ('guest.buyer@example.com', 'api/emails/ticket_summary.html'))
+        self.assertEqual([(o['event_title'], o['ticket_count']) for o in email.context['orders']],
+                         [(self.event.title, 1)]) # The pending order is left out
+        html_body, _ = render_email(email)
+        self.assertIn(self.event.title, html_body)
+
+    def test_unknown_address_gets_the_same_response(self):
+        found = self.find('guest.buyer@example.com')
+        missing = self.find('nobody@example.com')
+        self.assertEqual((missing.status_code, missing.data), (found.status_code, found.data))
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+    def test_requests_are_limited_per_address_and_per_ip(self):
+        for i in range(3):
+            self.assertEqual(self.find('nobody@example.com', ip=f'198.51.100.{i}').status_code, 202)
+        response = self.find('NOBODY@example.com', ip='198.51.100.9')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+        for i in range(9): # One request from this IP already counted
+            self.assertEqual(self.find(f'user{i}@example.com', ip='198.51.100.9').status_code, 202)
+        self.assertEqual(self.find('fresh@example.com', ip='198.51.100.9').status_code, 429)
+
+    def test_bucket_refills_over_time(self):
+        bucket = TokenBucket('test', capacity=2, refill_seconds=60)
+        self.assertEqual([bucket.consume('a', now=1000)[0] for _ in range(3)], [True, True, False])
+        self.assertEqual(bucket.consume('a', now=1030), (False, 30))
+        self.assertEqual(bucket.consume('a', now=1060), (True, 0))
+
+
+class CheckInTests(TestCase):
+    def setUp(self):
+        cache.clear() # Ids are reused between tests; a new version forces valid ticket sets to reload
+        self.client = APIClient()
+        self.organizer = CustomUser.objects.create_user(email='org@example.com', role='client')
+        self.client.force_authenticate(self.organizer)
+        self.event = make_event(self.organizer)
+        make_attendees(self.event, 3)
+        self.tickets = list(Ticket.objects.filter(event=self.event).order_by('id'))
+        self.codes = [ticket_code(ticket.pk, self.event.pk) for ticket in self.tickets]
+
+    def check_in(self, codes, device_id='door-1'):
+        scanned_at = self.event.start_date.isoformat()
+        response = self.client.post(reverse('check_ins', args=[self.event.pk]), {
+            'device_id': device_id,
+            'scans': [{'code': code, 'scanned_at': scanned_at} for code in codes],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [result['status'] for result in response.data['results']]
+
+    def test_codes_verify_offline_with_the_exported_public_key(self):
+        Ticket.objects.filter(pk=self.tickets[2].pk).update(status='canceled')
+        response = self.client.get(reverse('check_in_bundle', args=[self.event.pk]))
+        bundle = response.data
+        self.assertEqual((bundle['algorithm'], bundle['revoked_ticket_ids']), ('Ed25519', [self.tickets[2].pk]))
+        public_key = base64.urlsafe_b64decode(bundle['public_key'] + '=')
+        self.assertEqual(public_key, public_key_bytes(self.event.pk))
+
+        raw = base64.urlsafe_b64decode(self.codes[0] + '=' * (-len(self.codes[0]) % 4))
+        self.assertEqual(len(self.codes[0]), 108)
+        Ed25519PublicKey.from_public_bytes(public_key).verify(raw[17:], raw[:17]) # What a door device runs
+        self.assertEqual(read_ticket_code(self.codes[0], self.event.pk), self.tickets[0].pk)
+
+        tampered = ticket_code(self.tickets[0].pk, self.event.pk + 1)
+        with self.assertRaises(InvalidTicketCode):
+            read_ticket_code(tampered, self.event.pk) # Signed for another event
+        with self.assertRaises(InvalidTicketCode):
+            read_ticket_code(self.codes[0][:-2] + 'AA', self.event.pk)
+
+    def test_batches_are_recorded_once(self):
+        ticket = self.tickets[2]
+        ticket.status = 'canceled'
+        ticket.save()
+        statuses = self.check_in([self.codes[0], self.codes[1], self.codes[0], self.codes[2], 'garbage'])
+        self.assertEqual(statuses, ['admitted', 'admitted', 'duplicate', 'canceled', 'invalid'])
+        self.assertEqual(CheckIn.objects.filter(event=self.event).count(), 2)
+
+        # Resending the batch gives the same answers; another device sees duplicates
+        self.assertEqual(self.check_in([self.codes[0], self.codes[1]]), ['admitted', 'admitted'])
+        self.assertEqual(self.check_in([self.codes[0]], device_id='door-2'), ['duplicate'])
+        self.assertEqual(CheckIn.objects.count(), 2)
+
+    def test_warm_valid_ticket_set_saves_the_ticket_query(self):
+        self.check_in([self.codes[0]])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.check_in([self.codes[1]]), ['admitted'])
+        self.assertEqual(len(queries), 3) # Event ownership check, insert, check-ins
+
+        # Tickets bought after the set was loaded are looked up; cancellations invalidate the set
+        make_attendees(self.event, 1, name='Late')
+        late = Ticket.objects.get(attendee_name='Late 0')
+        self.assertEqual(self.check_in([ticket_code(late.pk, self.event.pk)]), ['admitted'])
+        self.tickets[2].status = 'canceled'
+        self.tickets[2].save()
+        self.assertEqual(self.check_in([self.codes[2]]), ['canceled'])
+
+    def test_stale_valid_ticket_set_does_not_admit_canceled_tickets(self):
+        self.check_in([self.codes[0]])
+        # update() sends no signal, as when another worker's invalidation stays in its own cache
+        Ticket.objects.filter(pk=self.tickets[1].pk).update(status='canceled')
+        self.assertEqual(self.check_in([self.codes[1], self.codes[2]]), ['canceled', 'admitted'])
+        self.assertFalse(CheckIn.objects.filter(ticket=self.tickets[1]).exists())
+        self.assertEqual(self.check_in([self.codes[1]]), ['canceled']) # The set was reloaded
+
+    def test_other_organizers_events_are_hidden(self):
+        other = make_event(CustomUser.objects.create_user(email='other@example.com', role='client'))
+        self.assertEqual(self.client.get(reverse('check_in_bundle', args=[other.pk])).status_code, 404)
+        response = self.client.post(reverse('check_ins', args=[other.pk]), {'scans': [{'code': self.codes[0]}]},
+                                    format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_orders_carry_ticket_codes(self):
+        data = OrderSerializer(self.tickets[0].order).data
+        self.assertEqual(data['ticket_ids'], [ticket.pk for ticket in self.tickets])
+        self.assertEqual([ticket['code'] for ticket in data['tickets']], self.codes)
+
+
+def image_upload(width, height, image_format='JPEG', mode='RGB', name='banner.jpg'):
+    buffer = io.BytesIO()
+    Image.new(mode, (width, height), 'orange').save(buffer, format=image_format)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class ImageUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root, MEDIA_URL='https://cdn.example.com/media/')
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client = APIClient()
+        self.organizer = CustomUser.objects.create_user(email='org@example.com', role='client')
+        self.client.force_authenticate(self.organizer)
+        self.event = make_event(self.organizer)
+
+    def upload_banner(self, upload):
+        return self.client.post(reverse('event_banner_upload', args=[self.event.pk]), {'file': upload},
+                                format='multipart')
+
+    def listed_image(self, **params):
+        return self.client.get(reverse('event_list'), params).data['results'][0]['image']
+
+    def test_banners_are_resized_in_the_background_and_listed_by_width(self):
+        response = self.upload_banner(image_upload(1000, 500))
+        self.assertEqual((response.status_code, response.data['status']), (202, 'pending'))
+        self.assertIsNone(self.listed_image()) # Not processed yet
+
+        self.assertEqual(process_images(claim_images()), {'ready': 1, 'retried': 0, 'failed': 0})
+        image = UploadedImage.objects.get()
+        # 1280 and 1920 would be upscaled, so the original width stands in for them
+        self.assertEqual([(v['format'], v['width']) for v in image.variants],
+                         [(fmt, width) for width in (320, 640, 960, 1000) for fmt in ('avif', 'webp')])
+        for variant in image.variants:
+            with default_storage.open(variant['name']) as stored, Image.open(stored) as rendered:
+                self.assertEqual((rendered.format.lower(), rendered.size),
+                                 (variant['format'], (variant['width'], variant['height'])))
+
+        with CaptureQueriesContext(connection) as queries:
+            card = self.listed_image(image_width=300)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual((card['url'], card['width'], card['height']),
+                         (f'https://cdn.example.com/media/images/{image.key}/320w.webp', 320, 160))
+        self.assertTrue(card['srcset']['avif'].endswith('/1000w.avif 1000w'))
+        self.assertEqual(self.listed_image()['width'], 640)
+        self.assertEqual(self.listed_image(image_width=3000)['width'], 1000)
+
+    def test_profile_pictures_become_square_and_replace_the_default(self):
+        response = self.client.post(reverse('profile_picture_upload'),
+                                    {'file': image_upload(300, 200, 'PNG', 'RGBA', 'me.png')}, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        process_images(claim_images())
+        image = UploadedImage.objects.get()
+        self.assertEqual({(v['width'], v['height']) for v in image.variants}, {(64, 64), (128, 128), (200, 200)})
+        self.organizer.refresh_from_db()
+        self.assertTrue(self.organizer.profile_picture.endswith(f'/images/{image.key}/200w.webp'))
+        status = self.client.get(reverse('uploaded_image', args=[image.key])).data
+        self.assertEqual((status['status'], status['image']['width']), ('ready', 200))
+
+    def test_replaced_images_are_deleted_with_their_files(self):
+        self.upload_banner(image_upload(800, 400))
+        process_images(claim_images())
+        old = UploadedImage.objects.get()
+        directory = os.path.dirname(old.original.name)
+        self.assertEqual(len(default_storage.listdir(directory)[1]), 7) # Original and 3 widths x 2 formats
+        cache.set(VERSION_KEY, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload_banner(image_upload(900, 300))
+        self.assertFalse(UploadedImage.objects.filter(pk=old.pk).exists())
+        self.assertEqual(default_storage.listdir(directory)[1], [])
+        self.assertEqual(str(Event.objects.get(pk=self.event.pk).image.key), str(response.data['key']))
+        self.assertEqual(cache.get(VERSION_KEY), 2) # The admin tabs no longer show the old banner
+
+        # An image replaced while it was rendering leaves no variants behind
+        def render_then_replace(name, kind):
+            variants = render_variants(name, kind)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.upload_banner(image_upload(600, 300))
+            return variants
+
+        replaced = claim_images()[0]
+        with mock.patch('api.images.render_variants', render_then_replace):
+            self.assertEqual(process_images([replaced]), {'ready': 1, 'retried': 0, 'failed': 0})
+        self.assertEqual(default_storage.listdir(os.path.dirname(replaced.original.name))[1], [])
+        self.assertEqual(UploadedImage.objects.get().status, 'pending')
+
+    def test_non_images_and_oversized_files_are_refused(self):
+        response = self.upload_banner(SimpleUploadedFile('banner.jpg', b'not an image'))
+        self.assertEqual(response.status_code, 400)
+        with override_settings(IMAGE_UPLOADS={**settings.IMAGE_UPLOADS, 'MAX_BYTES': 1000}):
+            response = self.upload_banner(image_upload(2000, 2000, 'PNG', 'RGB', 'large.png'))
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(UploadedImage.objects.exists())
+
+    def test_failed_renders_are_retried_then_given_up(self):
+        self.upload_banner(image_upload(400, 200))
+        image = UploadedImage.objects.get()
+        default_storage.delete(image.original.name)
+        self.assertEqual(process_images(claim_images())['retried'], 1)
+        UploadedImage.objects.update(next_attempt_at=timezone.now(), attempts=settings.IMAGE_UPLOADS['MAX_ATTEMPTS'] - 1)
+        self.assertEqual(process_images(claim_images())['failed'], 1)
+        self.assertEqual(UploadedImage.objects.get().status, 'failed')
+
+
+@override_settings(AWS_SES_ACCESS_KEY_ID='test', AWS_SES_SECRET_ACCESS_KEY='test')
+class AnnouncementTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.organizer = CustomUser.objects.create_user(email='org@example.com', role='client')
+        self.client.force_authenticate(self.organizer)
+        self.event = make_event(self.organizer, title='Jazz & Wine')
+        make_attendees(self.event, 120)
+        tickets = Ticket.objects.filter(event=self.event).order_by('id')
+        Ticket.objects.filter(pk=tickets[0].pk).update(attendee_email='GUEST1@example.com') # Same person twice
+        Ticket.objects.filter(pk=tickets[2].pk).update(status='canceled')
+        self.server = FakeSESServer(max_send_rate=1000).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.ses = ses_client(self.server.url)
+
+    def announce(self):
+        response = self.client.post(reverse('announcements', args=[self.event.pk]), {
+            'subject': 'Gates open at 6', 'body': 'Doors open early.\n\nBring <ID> & ticket.',
+        }, format='json')
+        self.assertEqual(response.status_code, 202)
+        return response.data
+
+    def send_all(self, pacer=None):
+        pacer = pacer or SendPacer(1000, burst=50)
+        while send_due(self.ses, pacer) is not None:
+            pass
+
+    def test_each_holder_gets_one_templated_email(self):
+        announcement = self.announce()
+        self.assertEqual(announcement['recipient_count'], 118)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.send_all()
+        self.assertEqual(self.server.calls, 3) # 50 destinations per call
+        self.assertLess(len(queries), 15 * 3) # A fixed number per call, not per recipient
+        self.assertEqual(len(self.server.templates), 1)
+        self.assertEqual(set(self.server.recipients().values()), {1})
+        message = next(m for m in self.server.messages if m['to'] == 'guest3@example.com')
+        self.assertEqual(message['subject'], 'Gates open at 6')
+        self.assertIn('Hi Attendee,', message['text'])
+        self.assertIn('Bring &lt;ID&gt; &amp; ticket.</p>', message['html'])
+        self.assertIn('Jazz &amp; Wine', message['html'])
+        self.assertIn('Bring <ID> & ticket.', message['text'])
+
+        response = self.client.get(reverse('announcements', args=[self.event.pk]))
+        self.assertEqual((response.data[0]['status'], response.data[0]['progress']['sent']), ('sent', 118))
+
+    def test_token_authenticated_organizer_is_the_sender(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(self.organizer)['access']}")
+        response = client.post(reverse('announcements', args=[self.event.pk]),
+                               {'subject': 'Parking', 'body': 'Use the north lot.'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(Announcement.objects.get().sender_id, self.organizer.pk)
+
+    def test_restarted_worker_does_not_resend_an_unsettled_batch(self):
+        self.announce()
+        stranded = claim_recipients(50) # Claimed by a worker that then died
+        AnnouncementRecipient.objects.filter(pk__in=[r.pk for r in stranded]).update(
+            next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.send_all()
+        self.assertEqual(len(self.server.messages), 68)
+        self.assertEqual(AnnouncementRecipient.objects.filter(status='unknown').count(), 50)
+        self.assertEqual(Announcement.objects.get().status, 'sent')
+
+        self.assertEqual(requeue_unknown(), 50)
+        self.send_all()
+        self.assertEqual(set(self.server.recipients().values()), {1})
+        self.assertEqual(len(self.server.messages), 118)
+
+    def test_stranded_last_batch_completes_the_announcement(self):
+        self.announce()
+        stranded = claim_recipients(200) # The only batch, claimed by a worker that then died
+        self.assertEqual(len(stranded), 118)
+        AnnouncementRecipient.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertIsNone(send_due(self.ses, SendPacer(1000, burst=50)))
+        self.assertEqual(AnnouncementRecipient.objects.filter(status='unknown').count(), 118)
+        announcement = Announcement.objects.get()
+        self.assertEqual(announcement.status, 'sent')
+        self.assertIsNotNone(announcement.completed_at)
+
+    def test_throttled_batches_retry_and_rejected_addresses_fail(self):
+        self.announce()
+        self.server.reject.add('guest5@example.com')
+        self.server.max_send_rate = self.server._tokens = 20 # The worker assumes 1000/s
+        self.assertEqual(send_due(self.ses, SendPacer(1000, burst=50)),
+                         {'sent': 0, 'retried': 50, 'failed': 0, 'unknown': 0})
+        self.assertEqual(set(AnnouncementRecipient.objects.filter(status='pending').values_list('attempts', flat=True)),
+                         {0}) # Throttling does not use up attempts
+
+        AnnouncementRecipient.objects.update(next_attempt_at=timezone.now())
+        self.server.max_send_rate = self.server._tokens = 1000
+        self.send_all()
+        self.assertEqual(AnnouncementRecipient.objects.get(status='failed').email, 'guest5@example.com')
+        self.assertEqual(len(self.server.messages), 117)
+
+    def test_pacer_holds_the_rate(self):
+        now, slept = [0.0], []
+
+        def sleep(seconds):
+            slept.append(seconds)
+            now[0] += seconds
+
+        pacer = SendPacer(10, burst=10, clock=lambda: now[0], sleep=sleep)
+        for _ in range(5):
+            pacer.acquire(10)
+        self.assertEqual(slept, [1.0] * 5) # Starts empty, then one burst per second
+        now[0] += 0.5
+        pacer.acquire(5)
+        self.assertEqual(len(slept), 5)
+
+
+@override_settings(DATABASE_REPLICAS={'ALIASES': ['replica1'], 'PIN_SECONDS': 5, 'MAX_LAG_SECONDS': 2,
+                                      'LAG_CHECK_SECONDS': 1})
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('backend.db_router.replica_lag', return_value=0.0)
+        self.lag = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = ReplicaRouter()
+
+    def request(self, *operations, replica_reads=True, ip='10.0.0.1', **headers):
+        """
+        Run a view doing `operations` ('read' or 'write') through the middleware; returns the database of each.
+        """
+        used = []
+
+        def view(request):
+            for operation in operations:
+                route = self.router.db_for_read if operation == 'read' else self.router.db_for_write
+                used.append(route(Event) or 'default')
+            return HttpResponse()
+        view.replica_reads = replica_reads
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        middleware(RequestFactory().get('/', REMOTE_ADDR=ip, **headers))
+        return used
+
+    def test_only_opted_in_views_read_from_replicas(self):
+        self.assertEqual(self.request('read', 'read'), ['replica1', 'replica1'])
+        self.assertEqual(self.request('read', replica_reads=False), ['default'])
+        self.assertEqual(self.router.db_for_read(Event), None) # Outside requests
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        self.assertEqual(self.request('read', 'write', 'read'), ['replica1', 'default', 'default'])
+        self.assertEqual(self.request('read'), ['default'])
+        self.assertEqual(self.request('read', ip='10.0.0.2'), ['replica1'])
+
+        # A token holder stays pinned when their address changes
+        self.request('write', ip='10.0.0.3', HTTP_AUTHORIZATION='Bearer token-1')
+        self.assertEqual(self.request('read', ip='10.0.0.4', HTTP_AUTHORIZATION='Bearer token-1'), ['default'])
+        self.assertEqual(self.request('read', ip='10.0.0.4', HTTP_AUTHORIZATION='Bearer token-2'), ['replica1'])
+
+    def test_lagging_or_unreachable_replicas_are_skipped(self):
+        self.lag.return_value = 3.0
+        self.assertEqual(self.request('read'), ['default'])
+        self.lag.return_value = None
+        self.assertEqual(self.request('read'), ['default'])
+
+    def test_replicas_are_not_migrated(self):
+        self.assertIs(self.router.allow_migrate('replica1', 'api'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'api'))
+
+
+class QueryStatsTests(TestCase):
+    def setUp(self):
+        reset_query_stats()
+        self.addCleanup(reset_query_stats)
+        self.organizer = CustomUser.objects.create_user(email='org@example.com', password='s3cure-pass', role='client')
+        for number in range(5):
+            make_event(self.organizer, title=f'Night {number}')
+        self.client = APIClient()
+
+    def test_fingerprints_ignore_values(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM api_event WHERE id IN (%s, %s, %s) AND title = 'It''s'  LIMIT 21"),
+            'SELECT * FROM api_event WHERE id IN (...) AND title = ? LIMIT ?',
+        )
+        self.assertEqual(fingerprint('SELECT "t1"."col2" FROM t1 WHERE id = %s'),
+                         'SELECT "t1"."col2" FROM t1 WHERE id = %s')
+
+    def test_requests_are_totalled_per_url_name_for_admins(self):
+        self.client.get(reverse('event_list'))
+        self.client.get(reverse('event_list'), {'limit': 2})
+        self.assertEqual(self.client.get(reverse('query_stats')).status_code, 401)
+        self.client.force_authenticate(self.organizer)
+        self.assertEqual(self.client.get(reverse('query_stats')).status_code, 403)
+
+        self.client.force_authenticate(CustomUser.objects.create_superuser(email='admin@example.com',
+                                                                           password='s3cure-pass'))
+        endpoints = {endpoint['url_name']: endpoint for endpoint in
+                     self.client.get(reverse('query_stats')).data['endpoints']}
+        self.assertEqual(
+            {key: endpoints['event_list'][key] for key in ('requests', 'queries_max', 'query_budget', 'over_budget')},
+            {'requests': 2, 'queries_max': 1, 'query_budget': 1, 'over_budget': 0},
+        )
+
+    def test_repeated_queries_are_flagged_as_n_plus_one(self):
+        with self.assertRaises(QueryBudgetExceeded) as raised, assert_max_queries(2) as recorder:
+            for event in Event.objects.order_by('id'):
+                list(event.ticket_categories.all())
+        self.assertEqual(recorder.count, 6)
+        self.assertEqual(list(recorder.n_plus_one().values()), [5])
+        self.assertIn('5 x SELECT', str(raised.exception))
+
+    def test_requests_over_budget_fail_under_the_test_runner(self):
+        with mock.patch.object(EventListView, 'query_budget', 0):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('event_list'))
+            with override_settings(QUERY_STATS={**settings.QUERY_STATS, 'ENFORCE_BUDGETS': False}), \
+                    self.assertLogs('api.query_stats', 'WARNING'):
+                self.assertEqual(self.client.get(reverse('event_list')).status_code, 200)
+
+
+# The async auth views, served to AsyncClient by AsyncMiddlewareTests
+urlpatterns = [
+    path('auth/register/', AsyncUserRegistrationView.as_view(), name='register'),
+    path('auth/login/', AsyncUserLoginView.as_view(), name='login'),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__, AUTH_HASH_POOLS=THREAD_HASH_POOLS,
+                   DATABASE_REPLICAS={'ALIASES': ['replica1'], 'PIN_SECONDS': 5, 'MAX_LAG_SECONDS': 2,
+                                      'LAG_CHECK_SECONDS': 1})
+class AsyncMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_hash_pools()
+        reset_query_stats()
+        self.addCleanup(reset_hash_pools)
+        self.addCleanup(reset_query_stats)
+
+    def test_middleware_stays_async_for_async_views(self):
+        async def view(request):
+            return HttpResponse()
+
+        for middleware in (QueryStatsMiddleware, ReplicaRoutingMiddleware):
+            self.assertTrue(iscoroutinefunction(middleware(view)), middleware)
+            self.assertFalse(iscoroutinefunction(middleware(lambda request: HttpResponse())), middleware)
+
+    async def test_async_views_are_recorded_and_pin_writers(self):
+        response = await self.async_client.post('/auth/register/', {
+            'email': 'new@example.com', 'password': 's3cure-pass', 'confirm_password': 's3cure-pass',
+        }, content_type='application/json')
+        login = await self.async_client.post('/auth/login/', {'email': 'new@example.com', 'password': 's3cure-pass'},
+                                             content_type='application/json')
+
+        self.assertEqual((response.status_code, login.status_code), (201, 200))
+        endpoints = {endpoint['url_name']: endpoint for endpoint in query_stats()}
+        self.assertEqual({name: (endpoints[name]['requests'], endpoints[name]['query_budget'])
+                          for name in ('register', 'login')}, {'register': (1, 3), 'login': (1, 2)})
+        self.assertGreater(endpoints['register']['queries_max'], 0)
+        # The registration wrote, so the client now reads from the primary
+        pin_keys = RequestRouting(RequestFactory().get('/', REMOTE_ADDR='127.0.0.1')).pin_keys()
+        self.assertTrue(await cache.aget_many(pin_keys))
@@ -0,0 +1,279 @@
+# api/ticket_codes.py
+"""
+Signed QR codes for tickets, and door check-in.
+
+A ticket's code is 81 bytes, base64url-encoded (108 characters):
+
+    version (1) | event id (8) | ticket id (8) | Ed25519 signature (64)
+
+Integers are unsigned big-endian, and the signature covers the first 17 bytes.
+Each event has its own key pair, derived from settings.TICKET_CODES['SECRET'],
+so codes are issued and checked without storing keys or reading the
+database. Door devices only need the event's public key, which
+`verification_bundle()` exports together with the canceled tickets, so
+scanning keeps working when the venue network drops. Changing the secret
+invalidates every code already issued.
+
+Scans are uploaded in batches (`record_check_ins`) and stored with one
+INSERT ... ON CONFLICT DO NOTHING, so a device can resend a batch after a
+timeout without admitting anyone twice. Tickets are checked against an
+in-memory set of the event's valid ticket ids per worker (`valid_tickets`),
+loaded once and kept until a ticket of the event is changed or deleted
+(`invalidate_valid_tickets`, from api/signals.py) or
+TICKET_CODES['VALID_SET_MAX_AGE'] passes. Only ids missing from the set,
+such as tickets bought after it was loaded, are looked up in the database,
+so door sales do not force reloads. As with the admin event tabs,
+invalidation reaches other workers only through a shared cache, and
+QuerySet.update() sends no signal at all, so a set can be stale. The
+query that reads back a batch's check-ins therefore also reads each
+ticket's status: a ticket canceled since the set was loaded is reported
+as canceled, its check-in from this batch is removed, and the worker's
+set is reloaded on the next batch.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import CheckIn, Ticket
+
+VERSION = 1
+HEADER = struct.Struct('>BQQ') # version, event id, ticket id
+SIGNATURE_BYTES = 64
+
+
+class InvalidTicketCode(Exception):
+    pass
+
+
+@lru_cache(maxsize=1024)
+def event_key(event_id):
+    """
+    The event's signing key. Derived, not stored: HMAC-SHA256(secret, event id) is the Ed25519 seed.
+    """
+    secret = settings.TICKET_CODES['SECRET']
+    if not secret:
+        raise ImproperlyConfigured('TICKET_CODES["SECRET"] must be set to issue or check ticket codes.')
+    seed = hmac.new(secret.encode(), f'ticket-codes:event:{event_id}'.encode(), hashlib.sha256).digest()
+    return Ed25519PrivateKey.from_private_bytes(seed)
+
+
+def public_key_bytes(event_id):
+    return event_key(event_id).public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+
+
+def ticket_code(ticket_id, event_id):
+    """
+    The QR payload for a ticket.
+    """
+    header = HEADER.pack(VERSION, event_id, ticket_id)
+    return _b64encode(header + event_key(event_id).sign(header))
+
+
+def read_ticket_code(code, event_id):
+    """
+    The ticket id in `code`. Raises InvalidTicketCode unless it was signed for `event_id`.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(code + '=' * (-len(code) % 4))
+    except (binascii.Error, ValueError):
+        raise InvalidTicketCode('Not a ticket code.')
+    if len(raw) != HEADER.size + SIGNATURE_BYTES:
+        raise InvalidTicketCode('Not a ticket code.')
+    version, code_event_id, ticket_id = HEADER.unpack_from(raw)
+    if version != VERSION:
+        raise InvalidTicketCode('Unsupported ticket code version.')
+    if code_event_id != event_id:
+        raise InvalidTicketCode('This ticket is for another event.')
+    # Ed25519 signatures are deterministic, so holding the private key the server can
+    # re-sign and compare, which takes about a third of the time of verifying
+    if not hmac.compare_digest(event_key(event_id).sign(raw[:HEADER.size]), raw[HEADER.size:]):
+        raise InvalidTicketCode('The ticket code signature is not valid.')
+    return ticket_id
+
+
+def verification_bundle(event_id):
+    """
+    Everything a door device needs to check the event's codes offline.
+    """
+    public_key = public_key_bytes(event_id)
+    return {
+        'event_id': event_id,
+        'algorithm': 'Ed25519',
+        'key_id': hashlib.sha256(public_key).hexdigest()[:16],
+        'public_key': _b64encode(public_key),
+        'code_version': VERSION,
+        'revoked_ticket_ids': list(Ticket.objects.filter(event_id=event_id).exclude(status='valid')
+                                   .order_by('id').values_list('id', flat=True)),
+        'generated_at': timezone.now().isoformat(),
+    }
+
+
+class ValidTicketSets:
+    """
+    Per-process cache of {event id: frozenset of valid ticket ids} for the most
+    recently scanned events. An entry is reloaded when the event's version in
+    the Django cache changes or it is older than `max_age` seconds.
+    """
+    def __init__(self, max_events, max_age):
+        self.max_events = max_events
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._sets = OrderedDict() # event id -> (version, loaded_at, ids)
+        self._load_locks = {}
+        self.load_count = 0
+
+    def get(self, event_id):
+        version = _valid_tickets_version(event_id)
+        ids = self._fresh(event_id, version)
+        if ids is not None:
+            return ids
+        with self._lock:
+            load_lock = self._load_locks.setdefault(event_id, threading.Lock())
+        # One load per event at a time: when doors open every gate misses at once, and
+        # the others wait for that load instead of each reading the whole ticket list
+        with load_lock:
+            ids = self._fresh(event_id, version)
+            if ids is not None:
+                return ids
+            loaded_at = time.monotonic()
+            ids = frozenset(Ticket.objects.filter(event_id=event_id, status='valid').values_list('id', flat=True))
+            with self._lock:
+                self.load_count += 1
+                self._sets[event_id] = (version, loaded_at, ids)
+                self._sets.move_to_end(event_id)
+                while len(self._sets) > self.max_events:
+                    evicted, _ = self._sets.popitem(last=False)
+                    self._load_locks.pop(evicted, None)
+        return ids
+
+    def _fresh(self, event_id, version):
+        with self._lock:
+            entry = self._sets.get(event_id)
+            if entry and entry[0] == version and time.monotonic() - entry[1] < self.max_age:
+                self._sets.move_to_end(event_id)
+                return entry[2]
+        return None
+
+    def forget(self, event_id):
+        with self._lock:
+            self._sets.pop(event_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._sets.clear()
+
+
+_valid_ticket_sets = None
+
+
+def valid_tickets(event_id):
+    """
+    The event's valid ticket ids, from this worker's ValidTicketSets.
+    """
+    global _valid_ticket_sets
+    if _valid_ticket_sets is None:
+        _valid_ticket_sets = ValidTicketSets(settings.TICKET_CODES['VALID_SET_EVENTS'],
+                                             settings.TICKET_CODES['VALID_SET_MAX_AGE'])
+    return _valid_ticket_sets.get(event_id)
+
+
+def invalidate_valid_tickets(event_id):
+    try:
+        cache.incr(_version_key(event_id))
+    except ValueError:
+        pass # No version yet, so no set has been loaded under one
+
+
+def _valid_tickets_version(event_id):
+    key = _version_key(event_id)
+    version = cache.get(key)
+    if version is None:
+        # Missing or evicted: start from a value no earlier set can have used
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _version_key(event_id):
+    return f'valid-tickets:{event_id}:version'
+
+
+def record_check_ins(event_id, scans, device_id=''):
+    """
+    Record a batch of door scans, given as (code, scanned_at) pairs. Returns one
+    result per scan, in order: {'code', 'status', ...} where status is 'admitted',
+    'duplicate' (with the first check-in's `scanned_at` and `device_id`), 'canceled'
+    or 'invalid'. Two queries however large the batch while the event's valid
+    ticket set is warm and current; resending a batch with its scan times gets the same answers.
+    """
+    now = timezone.now()
+    results, ticket_ids = [], {}
+    for code, scanned_at in scans:
+        try:
+            ticket_id = read_ticket_code(code, event_id)
+        except InvalidTicketCode as e:
+            results.append({'code': code, 'status': 'invalid', 'detail': str(e)})
+            continue
+        results.append({'code': code, 'ticket_id': ticket_id, 'scanned_at': scanned_at or now})
+        ticket_ids.setdefault(ticket_id, results[-1]) # The batch's first scan of a ticket is the one recorded
+
+    valid = valid_tickets(event_id)
+    statuses = {ticket_id: 'valid' for ticket_id in ticket_ids if ticket_id in valid}
+    unknown = [ticket_id for ticket_id in ticket_ids if ticket_id not in valid]
+    if unknown:
+        # Canceled, or bought after the set was loaded
+        statuses.update(Ticket.objects.filter(event_id=event_id, pk__in=unknown).values_list('id', 'status'))
+    admissible = [ticket_id for ticket_id in ticket_ids if statuses.get(ticket_id) == 'valid']
+    CheckIn.objects.bulk_create([
+        CheckIn(ticket_id=ticket_id, event_id=event_id, device_id=device_id,
+                scanned_at=ticket_ids[ticket_id]['scanned_at'])
+        for ticket_id in admissible
+    ], ignore_conflicts=True)
+    recorded = {row['ticket_id']: row for row in CheckIn.objects.filter(ticket_id__in=admissible)
+                .values('ticket_id', 'device_id', 'scanned_at', ticket_status=F('ticket__status'))}
+    stale = [ticket_id for ticket_id, row in recorded.items() if row['ticket_status'] != 'valid']
+    if stale:
+        # Canceled since this worker's set was loaded: undo this batch's check-ins of those tickets
+        statuses.update((ticket_id, recorded[ticket_id]['ticket_status']) for ticket_id in stale)
+        ours = Q()
+        for ticket_id in stale:
+            ours |= Q(ticket_id=ticket_id, scanned_at=ticket_ids[ticket_id]['scanned_at'])
+        CheckIn.objects.filter(ours, device_id=device_id).delete()
+        _valid_ticket_sets.forget(event_id)
+
+    for result in results:
+        if 'ticket_id' not in result:
+            continue
+        scanned_at = result.pop('scanned_at')
+        ticket_status = statuses.get(result['ticket_id'])
+        if ticket_status is None:
+            result.update(status='invalid', detail='Unknown ticket.')
+        elif ticket_status != 'valid':
+            result['status'] = 'canceled'
+        else:
+            first = recorded[result['ticket_id']]
+            if ticket_ids[result['ticket_id']] is result and (first['device_id'], first['scanned_at']) == (
+                    device_id, scanned_at):
+                result['status'] = 'admitted'
+            else:
+                result.update(status='duplicate', first_scanned_at=first['scanned_at'],
+                              first_device_id=first['device_id'])
+    return results
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
@@ -0,0 +1,62 @@
+# api/ticket_lookup.py
+"""
+"Find my ticket": email a summary of the paid orders placed with an address.
+
+Orders are matched on LOWER(email), which `order_email_lower_idx` indexes,
+so guest checkouts (orders without a buyer account) are found too. The
+summary goes out through the mail queue, and callers never learn whether
+anything was found, so the endpoint cannot be used to test which addresses
+have bought tickets.
+"""
+from django.db.models import Count, Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .mail_queue import enqueue_email
+from .models import Order
+
+MAX_ORDERS = 50 # Most recent orders listed in one summary
+
+
+def normalize_email(email):
+    return email.strip().lower()
+
+
+def paid_orders_for_email(email):
+    """
+    The address's paid orders, newest first, with their event and `ticket_count` (valid tickets).
+    """
+    return (Order.objects
+            .alias(email_normalized=Lower('email'))
+            .filter(email_normalized=normalize_email(email), status='paid')
+            .select_related('event')
+            .annotate(ticket_count=Count('tickets', filter=Q(tickets__status='valid')))
+            .order_by('-created_at', '-id')[:MAX_ORDERS])
+
+
+def send_ticket_summary(email):
+    """
+    Queue a summary email if the address has paid orders. Returns the number of orders listed.
+    """
+    orders = [order for order in paid_orders_for_email(email) if order.ticket_count]
+    if orders:
+        enqueue_email(
+            'api/emails/ticket_summary.html',
+            'Your Sari-Sari Events tickets',
+            normalize_email(email),
+            {'orders': [_order_summary(order) for order in orders]},
+        )
+    return len(orders)
+
+
+def _order_summary(order):
+    # The queue stores JSON, so dates are formatted here rather than in the template
+    start = timezone.localtime(order.event.start_date)
+    return {
+        'order_id': order.pk,
+        'event_title': order.event.title,
+        'location': order.event.location,
+        'starts': f"{start:%a, %b} {start.day}, {start:%Y} {start:%I:%M %p}",
+        'ticket_count': order.ticket_count,
+        'total_amount': str(order.total_amount),
+    }
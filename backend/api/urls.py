@@ -1,5 +1,7 @@
 # api/urls.py
+from django.conf import settings
 from django.urls import path
+from .async_views import AsyncUserLoginView, AsyncUserRegistrationView
 from .views import (
     UserRegistrationView,
     UserLoginView,
@@ -9,15 +11,67 @@ from .views import (
     SendOTPView,          # Use the correct view name
     VerifyOTPView,        # Use the correct view name
     ProfileCompletionView, # Import the new view
+    HashPoolStatsView,
+    DatabasePoolStatsView,
+    QueryStatsView,
+    EventListView,
+    EventSearchView,
+    RecommendedEventsView,
+    EventDetailView,
+    OrganizerEventListView,
+    OrganizerDashboardView,
+    AdminEventTabsView,
+    OrganizerAttendeeListView,
+    AttendeeExportView,
+    ReserveTicketsView,
+    ReleaseHoldView,
+    CheckoutView,
+    FindTicketsView,
+    EventBannerUploadView,
+    ProfilePictureUploadView,
+    UploadedImageView,
+    CheckInBundleView,
+    CheckInView,
+    AnnouncementListView,
 )
 
+# Under ASGI, registration and login hash passwords on bounded worker pools (api/hash_pool.py)
+if settings.ASYNC_AUTH_VIEWS:
+    register_view = AsyncUserRegistrationView.as_view()
+    login_view = AsyncUserLoginView.as_view()
+else:
+    register_view = UserRegistrationView.as_view()
+    login_view = UserLoginView.as_view()
+
 urlpatterns = [
-    path('auth/register/', UserRegistrationView.as_view(), name='register'),
-    path('auth/login/', UserLoginView.as_view(), name='login'),
+    path('auth/register/', register_view, name='register'),
+    path('auth/login/', login_view, name='login'),
     path('auth/google/register/', GoogleAuthRegisterView.as_view(), name='google_register'),
     path('auth/google/login/', GoogleAuthLoginView.as_view(), name='google_login'),
     path('auth/email-check/', CheckEmailExistsView.as_view(), name='email_check'), # Corrected URL path
     path('auth/otp-send/', SendOTPView.as_view(), name='otp_send'), # Corrected URL path
     path('auth/otp-verify/', VerifyOTPView.as_view(), name='otp_verify'), # Corrected URL path
     path('auth/complete-profile/', ProfileCompletionView.as_view(), name='complete_profile'), # New URL
+    path('auth/profile-picture/', ProfilePictureUploadView.as_view(), name='profile_picture_upload'),
+    path('auth/hash-pools/', HashPoolStatsView.as_view(), name='hash_pool_stats'),
+    path('admin/db-pool/', DatabasePoolStatsView.as_view(), name='db_pool_stats'),
+    path('admin/query-stats/', QueryStatsView.as_view(), name='query_stats'),
+    path('events/', EventListView.as_view(), name='event_list'),
+    path('events/search/', EventSearchView.as_view(), name='event_search'),
+    path('events/recommended/', RecommendedEventsView.as_view(), name='recommended_events'),
+    path('events/<int:pk>/', EventDetailView.as_view(), name='event_detail'),
+    path('admin/events/', AdminEventTabsView.as_view(), name='admin_event_tabs'),
+    path('organizer/dashboard/', OrganizerDashboardView.as_view(), name='organizer_dashboard'),
+    path('organizer/events/', OrganizerEventListView.as_view(), name='organizer_event_list'),
+    path('organizer/events/<int:pk>/banner/', EventBannerUploadView.as_view(), name='event_banner_upload'),
+    path('organizer/events/<int:pk>/check-in/bundle/', CheckInBundleView.as_view(), name='check_in_bundle'),
+    path('organizer/events/<int:pk>/check-ins/', CheckInView.as_view(), name='check_ins'),
+    path('organizer/events/<int:pk>/announcements/', AnnouncementListView.as_view(), name='announcements'),
+    path('organizer/attendees/', OrganizerAttendeeListView.as_view(), name='organizer_attendees'),
+    path('organizer/attendees/export/<str:file_format>/', AttendeeExportView.as_view(), name='attendee_export'),
+    path('tiers/<int:tier_id>/reserve/', ReserveTicketsView.as_view(), name='reserve_tickets'),
+    path('holds/<uuid:hold_key>/', ReleaseHoldView.as_view(), name='release_hold'),
+    path('checkout/', CheckoutView.as_view(), name='checkout'),
+    path('uploads/images/<uuid:key>/', UploadedImageView.as_view(), name='uploaded_image'),
+    path('tickets/find/', FindTicketsView.as_view(), name='find_tickets'),
 ]
\ No newline at end of file
@@ -1,19 +1,28 @@
 # api/views.py
+import hashlib
+import json
 import os
+from datetime import datetime, time, timedelta
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth import authenticate
 from django.db import IntegrityError
+from django.db.models import Prefetch, Q
+from django.shortcuts import get_object_or_404
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.utils.text import compress_sequence
 import random
-import boto3
-from botocore.exceptions import ClientError
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+import re
 
 # For authentication and permissions (uncomment and configure if needed)
 # from rest_framework.permissions import IsAuthenticated
@@ -29,36 +38,61 @@ from .serializers import (
     OTPSendSerializer,
     OTPVerifySerializer,
     ProfileUpdateSerializer, # Import the new serializer
+    UserPayload,
+    EventListSerializer,
+    EventListQuerySerializer,
+    OrganizerEventQuerySerializer,
+    EventSearchQuerySerializer,
+    RecommendedEventsQuerySerializer,
+    AttendeeQuerySerializer,
+    AttendeeListQuerySerializer,
+    EventDetailSerializer,
+    AdminEventTabQuerySerializer,
+    AdminEventSerializer,
+    ReserveTicketsSerializer,
+    CheckoutSerializer,
+    FindTicketsSerializer,
+    UploadedImageSerializer,
+    CheckInBatchSerializer,
+    OrderSerializer,
+    AnnouncementSerializer,
 )
-from .models import CustomUser
+from .models import Announcement, CustomUser, Event, TicketCategory, UploadedImage
+from .authentication import add_account_claims
+from .mail_queue import enqueue_email
+from .bulk_mail import announcement_progress, create_announcement
+from .otp_store import get_otp_store
+from .hash_pool import all_pool_stats
+from .db_pool import all_pool_stats as all_db_pool_stats
+from .query_stats import query_stats
+from .permissions import IsAdmin, IsClient
+from .pagination import InvalidCursor, paginate_by_id, paginate_by_start_date
+from .attendees import ATTENDEE_COLUMNS, attendee_list_rows, count_attendees, organizer_attendees
+from .exports import CHUNK_SIZE, stream_csv, stream_xlsx
+from .metrics import dashboard_metrics
+from .ratelimit import TokenBucket, client_ip
+from .ticket_lookup import normalize_email, send_ticket_summary
+from .ticket_codes import record_check_ins, valid_tickets, verification_bundle
+from .event_status import invalidate_event_tabs, tab_cache_key, tab_counts, tab_events
+from .images import ImageTooLarge, InvalidImage, discard_images, receive_upload
+from .search import search_events
+from .recommendations import recommended_events
+from .reservations import HoldExpired, IdempotencyConflict, NotOnSale, SoldOut, checkout, release_hold, reserve
 
 # Helper function to get tokens for a user
-def get_tokens_for_user(user):
-    refresh = RefreshToken.for_user(user)
-    return {
+def get_tokens_for_user(user, payload=None):
+    """
+    JWT pair plus the profile claims the frontend reads from the token response.
+    Pass the view's `UserPayload` so the user's fields are only read once.
+    """
+    # Role and token version claims let StatelessJWTAuthentication skip the user lookup
+    refresh = add_account_claims(RefreshToken.for_user(user), user)
+    tokens = {
         'refresh': str(refresh),
         'access': str(refresh.access_token),
-        'role': user.role,
-        'phone_number': user.phone_number,
-        'birthday': user.birthday.isoformat() if user.birthday else None,
-        'gender': user.gender,
-        'company_name': user.company_name, # Include company info in tokens
-        'company_website': user.company_website, # Include company info in tokens
     }
-
-# Configure AWS SES client using settings from settings.py
-try:
-    ses_client = boto3.client(
-        'ses',
-        region_name=settings.AWS_SES_REGION_NAME,
-        aws_access_key_id=settings.AWS_SES_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SES_SECRET_ACCESS_KEY
-    )
-    print("AWS SES client initialized successfully.")
-except Exception as e:
-    print(f"Error initializing AWS SES client: {e}")
-    ses_client = None
-
+    tokens.update((payload or UserPayload(user)).token_claims()) # Includes company info
+    return tokens
 
 class UserRegistrationView(APIView):
     """
@@ -66,67 +100,32 @@ class UserRegistrationView(APIView):
     """
     authentication_classes = [] # No authentication needed for registration
     permission_classes = [] # No permissions needed for registration
+    query_budget = 3 # Most queries a request may run; see api/query_stats.py
 
     def post(self, request):
         serializer = UserRegisterSerializer(data=request.data)
         if serializer.is_valid():
             try:
                 user = serializer.save() # This calls the create method in the serializer
-                tokens = get_tokens_for_user(user)
-
-                # Determine if profile completion is needed based on role
-                needs_profile_completion = user.role == 'client'
-
-                # --- Send Account Confirmation Email ---
-                sender_email = settings.DEFAULT_FROM_EMAIL
-                subject = "Welcome to Sari-Sari Events! Your Account is Ready"
-                
-                context = {
-                    'first_name': user.first_name,
-                    'email': user.email,
-                }
-                html_confirmation_body = render_to_string('api/emails/account_confirmation.html', context)
-                text_confirmation_body = strip_tags(html_confirmation_body)
-
-                if ses_client:
-                    try:
-                        ses_client.send_email(
-                            Source=sender_email,
-                            Destination={
-                                'ToAddresses': [user.email],
-                            },
-                            Message={
-                                'Subject': {'Data': subject},
-                                'Body': {
-                                    'Html': {'Data': html_confirmation_body},
-                                    'Text': {'Data': text_confirmation_body},
-                                },
-                            }
-                        )
-                        print(f"Account confirmation email sent to {user.email}")
-                    except ClientError as e:
-                        print(f"SES Error sending confirmation email: {e.response['Error']['Message']}")
-                    except Exception as e:
-                        print(f"General Error sending confirmation email: {e}")
-                else:
-                    print("SES client not initialized. Cannot send confirmation email.")
-                # --- END NEW ---
+                # New client accounts always go through profile completion
+                payload = UserPayload(user, needs_profile_completion=user.role == 'client')
+                tokens = get_tokens_for_user(user, payload)
+
+                # --- Queue Account Confirmation Email (delivered by process_email_queue) ---
+                enqueue_email(
+                    'api/emails/account_confirmation.html',
+                    "Welcome to Sari-Sari Events! Your Account is Ready",
+                    user.email,
+                    {
+                        'first_name': user.first_name,
+                        'email': user.email,
+                    },
+                )
+                print(f"Account confirmation email queued for {user.email}")
 
                 return Response({
                     'message': 'User registered successfully.',
-                    'user': {
-                        'email': user.email,
-                        'first_name': user.first_name,
-                        'last_name': user.last_name,
-                        'profile_picture': user.profile_picture,
-                        'role': user.role,
-                        'phone_number': user.phone_number,
-                        'birthday': user.birthday.isoformat() if user.birthday else None,
-                        'gender': user.gender,
-                        'company_name': user.company_name,
-                        'company_website': user.company_website,
-                        'needs_profile_completion': needs_profile_completion, # Flag for frontend
-                    },
+                    'user': payload.data,
                     'tokens': tokens,
                 }, status=status.HTTP_201_CREATED)
             except IntegrityError:
@@ -151,38 +150,19 @@ class UserLoginView(APIView):
     """
     authentication_classes = []
     permission_classes = []
+    query_budget = 2 # The user, and an update when its password hash is upgraded
 
     def post(self, request):
         serializer = UserLoginSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             user = serializer.validated_data['user']
-            tokens = get_tokens_for_user(user)
-
-            # Determine if profile completion is needed based on role and missing fields
-            # For login, if they are a client and any required fields are missing, flag it.
-            needs_profile_completion = user.role == 'client' and (
-                not user.phone_number or
-                not user.birthday or
-                not user.gender or
-                not user.company_name or # Assuming company_name is required for clients
-                not user.company_website # Assuming company_website is required for clients
-            )
+            # For login, if they are a client and any required profile fields are missing, flag it.
+            payload = UserPayload(user)
+            tokens = get_tokens_for_user(user, payload)
 
             return Response({
                 'message': 'Login successful.',
-                'user': {
-                    'email': user.email,
-                    'first_name': user.first_name,
-                    'last_name': user.last_name,
-                    'profile_picture': user.profile_picture,
-                    'role': user.role,
-                    'phone_number': user.phone_number,
-                    'birthday': user.birthday.isoformat() if user.birthday else None,
-                    'gender': user.gender,
-                    'company_name': user.company_name,
-                    'company_website': user.company_website,
-                    'needs_profile_completion': needs_profile_completion, # Flag for frontend
-                },
+                'user': payload.data,
                 'tokens': tokens,
             }, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -262,24 +242,12 @@ class GoogleAuthRegisterView(APIView):
                         status=status.HTTP_500_INTERNAL_SERVER_ERROR
                     )
 
-            tokens = get_tokens_for_user(user)
-            needs_profile_completion = user.role == 'client' # Flag for frontend
+            payload = UserPayload(user, needs_profile_completion=user.role == 'client') # Flag for frontend
+            tokens = get_tokens_for_user(user, payload)
 
             return Response({
                 'message': message,
-                'user': {
-                    'email': user.email,
-                    'first_name': user.first_name,
-                    'last_name': user.last_name,
-                    'profile_picture': user.profile_picture,
-                    'role': user.role,
-                    'phone_number': user.phone_number,
-                    'birthday': user.birthday.isoformat() if user.birthday else None,
-                    'gender': user.gender,
-                    'company_name': user.company_name,
-                    'company_website': user.company_website,
-                    'needs_profile_completion': needs_profile_completion, # Flag for frontend
-                },
+                'user': payload.data,
                 'tokens': tokens,
             }, status=status_code)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -317,32 +285,13 @@ class GoogleAuthLoginView(APIView):
             # They should retain existing values or remain None.
             user.save()
             
-            tokens = get_tokens_for_user(user)
-            
-            # Determine if profile completion is needed based on role and missing fields
-            needs_profile_completion = user.role == 'client' and (
-                not user.phone_number or
-                not user.birthday or
-                not user.gender or
-                not user.company_name or # Assuming company_name is required for clients
-                not user.company_website # Assuming company_website is required for clients
-            )
+            # Flags clients with missing profile fields
+            payload = UserPayload(user)
+            tokens = get_tokens_for_user(user, payload)
 
             return Response({
                 'message': 'Logged in via Google successfully.',
-                'user': {
-                    'email': user.email,
-                    'first_name': user.first_name,
-                    'last_name': user.last_name,
-                    'profile_picture': user.profile_picture,
-                    'role': user.role,
-                    'phone_number': user.phone_number,
-                    'birthday': user.birthday.isoformat() if user.birthday else None,
-                    'gender': user.gender,
-                    'company_name': user.company_name,
-                    'company_website': user.company_website,
-                    'needs_profile_completion': needs_profile_completion, # Flag for frontend
-                },
+                'user': payload.data,
                 'tokens': tokens,
             }, status=status.HTTP_200_OK)
         except ObjectDoesNotExist:
@@ -368,10 +317,12 @@ class ProfileCompletionView(APIView):
         # In a real app, you'd ensure the user is authenticated.
         # For this example, we'll assume request.user is available via middleware.
         # If not using JWTAuthentication, you'd need a different way to get the user.
-        user = request.user 
-        if not user.is_authenticated: # Fallback if authentication_classes/permission_classes are not used
+        if not request.user.is_authenticated: # Fallback if authentication_classes/permission_classes are not used
              return Response({'detail': 'Authentication credentials were not provided.'}, status=status.HTTP_401_UNAUTHORIZED)
 
+        # StatelessJWTAuthentication only provides token claims; load the row we are about to update.
+        user = CustomUser.objects.get(pk=request.user.pk)
+
 
         # Use the new ProfileUpdateSerializer
         serializer = ProfileUpdateSerializer(instance=user, data=request.data, partial=True) 
@@ -381,22 +332,11 @@ class ProfileCompletionView(APIView):
 
             # Re-fetch user to ensure all fields are up-to-date in the response
             user.refresh_from_db()
+            payload = UserPayload(user, needs_profile_completion=False) # Profile is now complete
 
             return Response({
                 'message': 'Profile updated successfully.',
-                'user': {
-                    'email': user.email,
-                    'first_name': user.first_name,
-                    'last_name': user.last_name,
-                    'profile_picture': user.profile_picture,
-                    'role': user.role,
-                    'phone_number': user.phone_number,
-                    'birthday': user.birthday.isoformat() if user.birthday else None,
-                    'gender': user.gender,
-                    'company_name': user.company_name,
-                    'company_website': user.company_website,
-                    'needs_profile_completion': False, # Profile is now complete
-                }
+                'user': payload.data
             }, status=status.HTTP_200_OK)
         print("ProfileCompletionView serializer errors:", serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -406,8 +346,10 @@ class CheckEmailExistsView(APIView):
     """
     API endpoint to check if an email is already registered.
     """
+    replica_reads = True # Reads may go to a replica; see backend/db_router.py
     authentication_classes = []
     permission_classes = []
+    query_budget = 1
 
     def post(self, request):
         serializer = EmailCheckSerializer(data=request.data)
@@ -425,6 +367,7 @@ class SendOTPView(APIView):
     """
     authentication_classes = []
     permission_classes = []
+    query_budget = 2
 
     def post(self, request):
         serializer = OTPSendSerializer(data=request.data)
@@ -434,54 +377,17 @@ class SendOTPView(APIView):
             # Generate a 6-digit OTP
             otp = str(random.randint(100000, 999999))
             
-            # Store OTP in cache with a 5-minute expiry
-            # Key format: 'otp_<email>'
-            cache.set(f'otp_{email}', otp, timeout=300) # 300 seconds = 5 minutes
-
-            # Render HTML email from template
-            context = {'otp': otp}
-            html_body = render_to_string('api/emails/otp_verification.html', context)
-            
-            # Plain text fallback (good practice for email clients that don't render HTML)
-            text_body = strip_tags(html_body) # Automatically generate plain text from HTML
-
-            sender_email = settings.DEFAULT_FROM_EMAIL
-            subject = "Your Sari-Sari Events Verification Code"
-
-            if not ses_client:
-                return Response({'detail': 'Email service not configured. Cannot send OTP.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            try:
-                response = ses_client.send_email(
-                    Source=sender_email,
-                    Destination={
-                        'ToAddresses': [
-                            email,
-                        ],
-                    },
-                    Message={
-                        'Subject': {
-                            'Data': subject,
-                        },
-                        'Body': {
-                            'Html': { # Use 'Html' for HTML content
-                                'Data': html_body,
-                            },
-                            'Text': { # Provide a plain text fallback
-                                'Data': text_body,
-                            },
-                        },
-                    }
-                )
-                print(f"SES Email sent! Message ID: {response['MessageId']}")
-                return Response({'detail': 'Verification code sent successfully.'}, status=status.HTTP_200_OK)
-            except ClientError as e:
-                error_message = e.response.get('Error', {}).get('Message', 'An AWS SES error occurred.')
-                print(f"SES Error: {error_message}")
-                return Response({'detail': f'Failed to send verification code: {error_message}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            except Exception as e:
-                print(f"General Error sending OTP: {e}")
-                return Response({'detail': 'An unexpected error occurred while sending OTP.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            # Store OTP in the shared OTP store (expires after settings.OTP_STORE['TTL_SECONDS'])
+            get_otp_store().issue(email, otp)
+
+            # Queue the email; the worker renders the template and sends it through SES
+            enqueue_email(
+                'api/emails/otp_verification.html',
+                "Your Sari-Sari Events Verification Code",
+                email,
+                {'otp': otp},
+            )
+            return Response({'detail': 'Verification code sent successfully.'}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -491,6 +397,7 @@ class VerifyOTPView(APIView):
     """
     authentication_classes = []
     permission_classes = []
+    query_budget = 2
 
     def post(self, request):
         serializer = OTPVerifySerializer(data=request.data)
@@ -498,11 +405,8 @@ class VerifyOTPView(APIView):
             email = serializer.validated_data['email']
             entered_otp = serializer.validated_data['otp']
 
-            stored_otp = cache.get(f'otp_{email}')
-
-            if stored_otp and stored_otp == entered_otp:
-                # Optionally, you can clear the OTP from cache after successful verification
-                cache.delete(f'otp_{email}')
+            # Atomically checks and consumes the code, whichever worker issued it
+            if get_otp_store().verify(email, entered_otp):
                 # You might want to mark the user's email as verified in your CustomUser model here
                 # user = CustomUser.objects.get(email=email)
                 # user.email_verified = True # Assuming you have this field
@@ -511,3 +415,542 @@ class VerifyOTPView(APIView):
             else:
                 return Response({'detail': 'Invalid or expired verification code.'}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class HashPoolStatsView(APIView):
+    """
+    Admin-only view of the password hashing pools in this worker process
+    (queue depth, peak, rejections, average job time).
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response({'pools': all_pool_stats()}, status=status.HTTP_200_OK)
+
+
+class DatabasePoolStatsView(APIView):
+    """
+    Admin-only view of this worker process's database connections: whether they
+    are pooled, and the pool's size, checkouts, waits and broken connections.
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(all_db_pool_stats(), status=status.HTTP_200_OK)
+
+
+class QueryStatsView(APIView):
+    """
+    Admin-only database query totals per URL name for this worker process:
+    queries and DB time per request, duplicate queries, N+1 patterns and budget overruns.
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response({'pid': os.getpid(), 'endpoints': query_stats()}, status=status.HTTP_200_OK)
+
+
+# --- Events ---
+def event_list_queryset():
+    # One query per page: organizer joined, price and sold-out status aggregated
+    return Event.objects.with_ticket_summary().select_related('organizer', 'image').order_by('start_date', 'id')
+
+
+def conditional_response(request, response, last_modified=None):
+    """
+    Add an ETag (hash of the response data) and Last-Modified, and answer 304 when
+    the client's copy is current. The ETag also covers ticket availability, which
+    does not touch the event's `updated_at`; clients that send If-None-Match get it
+    precedence over If-Modified-Since.
+    """
+    body = json.dumps(response.data, cls=DjangoJSONEncoder, sort_keys=True)
+    etag = f'"{hashlib.sha1(body.encode()).hexdigest()}"'
+    response['ETag'] = etag
+    timestamp = None
+    if last_modified:
+        timestamp = int(last_modified.timestamp())
+        response['Last-Modified'] = http_date(timestamp)
+    patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    return get_conditional_response(request, etag=etag, last_modified=timestamp, response=response)
+
+
+# Model columns each listing field needs, so `?fields=` also trims the SELECT
+EVENT_LIST_COLUMNS = {
+    'organizer_name': ('organizer__company_name', 'organizer__first_name', 'organizer__last_name'),
+    'min_price': (),
+    'is_sold_out': (),
+    'image': ('image__status', 'image__variants'),
+}
+
+
+class EventListView(APIView):
+    """
+    Public listing of published, upcoming events, ordered by start date.
+    Filters: `category`, `location`, `date_from`, `date_to`. Paginated with an opaque
+    `cursor` (returned as `next_cursor`) and `limit`; `fields` selects a subset of fields
+    and `image_width` the size of `image`.
+    """
+    replica_reads = True
+    query_budget = 1
+
+    def get(self, request):
+        query = EventListQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+        fields = params.get('fields') or EventListSerializer.Meta.fields
+
+        events = Event.objects.published().upcoming()
+        if 'category' in params:
+            events = events.filter(category=params['category'])
+        if 'location' in params:
+            events = events.filter(location=params['location'])
+        tz = timezone.get_current_timezone()
+        if 'date_from' in params:
+            events = events.filter(start_date__gte=datetime.combine(params['date_from'], time.min, tzinfo=tz))
+        if 'date_to' in params:
+            events = events.filter(start_date__lt=datetime.combine(params['date_to'] + timedelta(days=1), time.min, tzinfo=tz))
+
+        # Only join and aggregate what the requested fields need
+        if 'min_price' in fields or 'is_sold_out' in fields:
+            events = events.with_ticket_summary()
+        if 'organizer_name' in fields:
+            events = events.select_related('organizer')
+        if 'image' in fields:
+            events = events.select_related('image')
+        columns = {'id', 'start_date', 'updated_at'}
+        for name in fields:
+            columns.update(EVENT_LIST_COLUMNS.get(name, (name,)))
+        events = events.only(*columns)
+
+        try:
+            rows, next_cursor = paginate_by_start_date(events, params.get('cursor'), params['limit'])
+        except InvalidCursor as e:
+            return Response({'cursor': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = EventListSerializer(rows, many=True, fields=fields,
+                                         context={'image_width': params['image_width']})
+        response = Response({'results': serializer.data, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+        return conditional_response(request, response, max((row.updated_at for row in rows), default=None))
+
+
+class EventSearchView(APIView):
+    """
+    Ranked, typo-tolerant search over published, upcoming events (`?q=`, optional `category`).
+    `title_highlight` and `snippet` are escaped HTML with matches wrapped in <mark>.
+    """
+    replica_reads = True
+    query_budget = 2
+
+    def get(self, request):
+        query = EventSearchQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+        results = search_events(params['q'], limit=params['limit'], category=params.get('category'))
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+class RecommendedEventsView(APIView):
+    """
+    Recommended event cards for the signed-in user, or the most popular upcoming
+    events (optionally in one `category`) for visitors and users without ticket
+    history. Reads one precomputed list; see api/recommendations.py.
+    """
+    replica_reads = True
+    query_budget = 1
+
+    def get(self, request):
+        query = RecommendedEventsQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+        user_id = request.user.id if request.user.is_authenticated else None
+        cards, source = recommended_events(user_id, category=params.get('category'), limit=params['limit'])
+        return Response({'results': cards, 'source': source}, status=status.HTTP_200_OK)
+
+
+class EventDetailView(APIView):
+    """
+    A single event with its ticket categories and tiers.
+    Unpublished events are only visible to their organizer.
+    """
+    replica_reads = True
+    query_budget = 3
+
+    def get(self, request, pk):
+        visible = Q(status='published')
+        if request.user.is_authenticated:
+            visible |= Q(organizer_id=request.user.id)
+        events = Event.objects.filter(visible).select_related('organizer', 'image').prefetch_related(
+            Prefetch('ticket_categories', queryset=TicketCategory.objects.prefetch_related('tiers')),
+        )
+        event = get_object_or_404(events, pk=pk)
+        return Response(EventDetailSerializer(event).data, status=status.HTTP_200_OK)
+
+
+class OrganizerDashboardView(APIView):
+    """
+    Totals for the organizer dashboard cards, read from the OrganizerMetrics
+    rollup in a single query however many events the organizer has.
+    """
+    replica_reads = True
+    permission_classes = [IsClient]
+    query_budget = 1
+
+    def get(self, request):
+        metrics = dashboard_metrics(request.user.id)
+        return Response({
+            'total_revenue': str(metrics['total_revenue']),
+            'total_attendees': metrics['total_attendees'],
+            'total_events': metrics['total_events'],
+            'upcoming_events': metrics['upcoming_events'],
+            'updated_at': metrics['updated_at'].isoformat() if metrics['updated_at'] else None,
+        }, status=status.HTTP_200_OK)
+
+
+class AdminEventTabsView(APIView):
+    """
+    Admin dashboard event tabs: the count of every tab (`all`, `ongoing`, `upcoming`,
+    `canceled`) and one page of the selected `tab`, soonest first for upcoming events
+    and most recent first otherwise. Cached briefly; see api/event_status.py.
+    """
+    replica_reads = True
+    permission_classes = [IsAdmin]
+    query_budget = 2
+
+    def get(self, request):
+        query = AdminEventTabQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+        tab, cursor, limit = params['tab'], params.get('cursor', ''), params['limit']
+        timeout = settings.ADMIN_DASHBOARD['CACHE_SECONDS']
+
+        page_key = tab_cache_key('page', tab, cursor, limit)
+        page = cache.get(page_key)
+        if page is None:
+            now = timezone.now()
+            try:
+                rows, next_cursor = paginate_by_start_date(tab_events(tab, now), cursor, limit,
+                                                           descending=tab != 'upcoming')
+            except InvalidCursor as e:
+                return Response({'cursor': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+            page = {
+                'results': AdminEventSerializer(rows, many=True, context={'now': now}).data,
+                'next_cursor': next_cursor,
+            }
+            cache.set(page_key, page, timeout)
+
+        counts_key = tab_cache_key('counts')
+        counts = cache.get(counts_key)
+        if counts is None:
+            counts = tab_counts(timezone.now())
+            cache.set(counts_key, counts, timeout)
+        return Response({'tab': tab, 'counts': counts, **page}, status=status.HTTP_200_OK)
+
+
+class OrganizerEventListView(APIView):
+    """
+    The signed-in organizer's own events, newest first. Optional `?status=` filter.
+    Paginated with `cursor` (returned as `next_cursor`) and `limit`, like the public listing.
+    """
+    replica_reads = True
+    permission_classes = [IsClient]
+    query_budget = 1
+
+    def get(self, request):
+        query = OrganizerEventQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+
+        events = event_list_queryset().filter(organizer_id=request.user.id)
+        if 'status' in params:
+            events = events.filter(status=params['status'])
+        try:
+            rows, next_cursor = paginate_by_start_date(events, params.get('cursor'), params['limit'], descending=True)
+        except InvalidCursor as e:
+            return Response({'cursor': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = EventListSerializer(rows, many=True)
+        return Response({'results': serializer.data, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+
+
+# --- Reservations and checkout ---
+class ReserveTicketsView(APIView):
+    """
+    Hold tickets in a tier for settings.TICKET_HOLDS['HOLD_SECONDS'] while the buyer checks out.
+    """
+    def post(self, request, tier_id):
+        serializer = ReserveTicketsSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            hold = reserve(
+                tier_id,
+                serializer.validated_data['quantity'],
+                serializer.validated_data['email'],
+                buyer_id=request.user.id if request.user.is_authenticated else None,
+            )
+        except SoldOut as e:
+            return Response({'detail': str(e)}, status=status.HTTP_409_CONFLICT)
+        except NotOnSale as e:
+            return Response({'detail': str(e)}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'hold_key': str(hold.hold_key),
+            'quantity': hold.quantity,
+            'expires_at': hold.expires_at.isoformat(),
+        }, status=status.HTTP_201_CREATED)
+
+
+class ReleaseHoldView(APIView):
+    """
+    Give held tickets back before the hold expires (e.g. the buyer left checkout).
+    """
+    def delete(self, request, hold_key):
+        if not release_hold(hold_key):
+            return Response({'detail': 'This reservation is no longer active.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CheckoutView(APIView):
+    """
+    Turn a hold into an order. Requires an `Idempotency-Key` header; retries
+    with the same key return the original order instead of buying again.
+    """
+    def post(self, request):
+        idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+        if not idempotency_key or len(idempotency_key) > 64:
+            return Response({'detail': 'An Idempotency-Key header (up to 64 characters) is required.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer = CheckoutSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            order, created = checkout(
+                serializer.validated_data['hold_key'],
+                idempotency_key,
+                attendee_name=serializer.validated_data['attendee_name'],
+            )
+        except HoldExpired as e:
+            return Response({'detail': str(e)}, status=status.HTTP_410_GONE)
+        except IdempotencyConflict as e:
+            return Response({'detail': str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return Response(OrderSerializer(order).data,
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+# --- Attendees ---
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', stream_csv),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', stream_xlsx),
+}
+
+
+class OrganizerAttendeeListView(APIView):
+    """
+    The organizer's attendees, oldest ticket first, filtered by `event`, `status`
+    and `q` (name or email), paginated with `cursor` / `limit`. `count` is exact
+    up to attendees.EXACT_COUNT_LIMIT and an estimate above it (`count_is_estimate`).
+    """
+    permission_classes = [IsClient]
+    query_budget = 3
+
+    def get(self, request):
+        query = AttendeeListQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+
+        tickets = organizer_attendees(request.user.id, event_id=params.get('event'),
+                                      search=params.get('q'), status=params.get('status'))
+        try:
+            rows, next_cursor = paginate_by_id(attendee_list_rows(tickets), params.get('cursor'), params['limit'])
+        except InvalidCursor as e:
+            return Response({'cursor': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        count, is_estimate = count_attendees(tickets)
+        return Response({
+            'results': rows,
+            'next_cursor': next_cursor,
+            'count': count,
+            'count_is_estimate': is_estimate,
+        }, status=status.HTTP_200_OK)
+
+
+class AttendeeExportView(APIView):
+    """
+    Stream the organizer's attendees as CSV or XLSX, with the same filters as the
+    attendee list (`event`, `q`, `status`). Rows are read through a server-side
+    cursor and written in chunks, so memory use does not grow with the export.
+    CSV is gzip-compressed for clients that accept it.
+    """
+    permission_classes = [IsClient]
+
+    def get(self, request, file_format):
+        if file_format not in EXPORT_FORMATS:
+            return Response({'detail': 'Unsupported export format.'}, status=status.HTTP_404_NOT_FOUND)
+        query = AttendeeQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+
+        tickets = organizer_attendees(request.user.id, event_id=params.get('event'), search=params.get('q'),
+                                      status=params.get('status'), indexed_search=False)
+        rows = tickets.values_list(*[field for _, field in ATTENDEE_COLUMNS]).iterator(chunk_size=CHUNK_SIZE)
+        content_type, writer = EXPORT_FORMATS[file_format]
+        chunks = writer([header for header, _ in ATTENDEE_COLUMNS], rows)
+
+        gzipped = file_format == 'csv' and ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        response = StreamingHttpResponse(compress_sequence(chunks) if gzipped else chunks, content_type=content_type)
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        filename = f"attendees-{timezone.now():%Y%m%d-%H%M}.{file_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+# --- Image uploads ---
+def upload_error(error):
+    code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE if isinstance(error, ImageTooLarge) else status.HTTP_400_BAD_REQUEST
+    return Response({'file': [str(error)]}, status=code)
+
+
+class EventBannerUploadView(APIView):
+    """
+    Upload a banner (multipart `file`) for one of the organizer's events. The
+    `process_images` worker creates its variants; listings show it once they are ready.
+    """
+    permission_classes = [IsClient]
+
+    def post(self, request, pk):
+        event = get_object_or_404(Event.objects.filter(organizer_id=request.user.id).only('image'), pk=pk)
+        try:
+            image = receive_upload(request, 'event_banner')
+        except InvalidImage as e:
+            return upload_error(e)
+        # update() skips post_save, so the admin tabs are invalidated here
+        Event.objects.filter(pk=pk).update(image=image, updated_at=timezone.now())
+        invalidate_event_tabs()
+        discard_images([event.image_id])
+        return Response(UploadedImageSerializer(image).data, status=status.HTTP_202_ACCEPTED)
+
+
+class ProfilePictureUploadView(APIView):
+    """
+    Upload a profile picture (multipart `file`). `profile_picture` switches to it once its variants are ready.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            image = receive_upload(request, 'profile_picture')
+        except InvalidImage as e:
+            return upload_error(e)
+        users = CustomUser.objects.filter(pk=request.user.id)
+        # The token user carries no profile_image_id
+        replaced = users.values_list('profile_image_id', flat=True).first()
+        users.update(profile_image=image)
+        discard_images([replaced])
+        return Response(UploadedImageSerializer(image).data, status=status.HTTP_202_ACCEPTED)
+
+
+class UploadedImageView(APIView):
+    """
+    Processing status and variants of one of the user's uploads, for clients to poll after uploading.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, key):
+        image = get_object_or_404(UploadedImage.objects.filter(owner_id=request.user.id), key=key)
+        return Response(UploadedImageSerializer(image).data, status=status.HTTP_200_OK)
+
+
+# --- Check-in ---
+class CheckInBundleView(APIView):
+    """
+    The event's ticket verification key and canceled tickets, for door devices to
+    download before doors open and check QR codes without the network.
+    """
+    permission_classes = [IsClient]
+    query_budget = 3
+
+    def get(self, request, pk):
+        get_object_or_404(Event.objects.filter(organizer_id=request.user.id), pk=pk)
+        valid_tickets(pk) # Devices fetch this before doors open: warm this worker's ticket set for their scans
+        return Response(verification_bundle(pk), status=status.HTTP_200_OK)
+
+
+class CheckInView(APIView):
+    """
+    Record a batch of door scans for the organizer's event. Each scan gets a result
+    (admitted / duplicate / canceled / invalid); resending a batch is safe.
+    """
+    permission_classes = [IsClient]
+
+    def post(self, request, pk):
+        get_object_or_404(Event.objects.filter(organizer_id=request.user.id), pk=pk)
+        serializer = CheckInBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        scans = [(scan['code'], scan.get('scanned_at')) for scan in serializer.validated_data['scans']]
+        results = record_check_ins(pk, scans, serializer.validated_data['device_id'])
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+# --- Announcements ---
+class AnnouncementListView(APIView):
+    """
+    The organizer's announcements for an event, newest first, with delivery progress.
+    POST queues a new one to every valid ticket holder; `send_announcements` sends it.
+    """
+    permission_classes = [IsClient]
+
+    def get(self, request, pk):
+        event = get_object_or_404(Event.objects.filter(organizer_id=request.user.id), pk=pk)
+        announcements = list(Announcement.objects.filter(event=event).order_by('-created_at', '-id'))
+        progress = announcement_progress([announcement.pk for announcement in announcements])
+        serializer = AnnouncementSerializer(announcements, many=True, context={'progress': progress})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def post(self, request, pk):
+        event = get_object_or_404(Event.objects.filter(organizer_id=request.user.id), pk=pk)
+        serializer = AnnouncementSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        announcement = create_announcement(event, serializer.validated_data['subject'],
+                                           serializer.validated_data['body'], sender_id=request.user.id)
+        return Response(AnnouncementSerializer(announcement).data, status=status.HTTP_202_ACCEPTED)
+
+
+class FindTicketsView(APIView):
+    """
+    "Find my ticket": email the address a summary of its paid orders (guest
+    checkouts included) through the mail queue. The response is the same
+    whether or not anything was found; requests are limited per client IP
+    and per address (settings.RATE_LIMITS) to stop address enumeration and
+    mail bombing.
+    """
+    authentication_classes = []
+    permission_classes = []
+    query_budget = 2
+
+    def post(self, request):
+        serializer = FindTicketsSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        email = serializer.validated_data['email']
+
+        for bucket, identity in (('find_tickets_ip', client_ip(request)),
+                                 ('find_tickets_email', normalize_email(email))):
+            allowed, retry_after = TokenBucket.named(bucket).consume(identity)
+            if not allowed:
+                response = Response({'detail': 'Too many requests. Please try again later.'},
+                                    status=status.HTTP_429_TOO_MANY_REQUESTS)
+                response['Retry-After'] = str(retry_after)
+                return response
+
+        send_ticket_summary(email)
+        return Response({'detail': 'If there are tickets for this email address, we have sent them to it.'},
+                        status=status.HTTP_202_ACCEPTED)
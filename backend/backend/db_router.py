@@ -0,0 +1,187 @@
+# backend/db_router.py
+"""
+Read-replica routing.
+
+Replicas are the extra databases listed in settings.DATABASE_REPLICAS['ALIASES']
+(configured from DATABASE_REPLICA_URLS). Everything goes to `default`, the
+primary, except the reads of views that opt in with `replica_reads = True`,
+and even those stay on the primary:
+
+* for the rest of a request once it has written anything, and for
+  PIN_SECONDS after it, for every request from the same client (its bearer
+  token or its IP address), so people see their own writes;
+* inside a transaction on the primary, or for objects loaded from it;
+* when every replica is more than MAX_LAG_SECONDS behind or unreachable.
+  Each worker measures a replica's lag at most every LAG_CHECK_SECONDS.
+
+A request reads from one replica throughout. Pins are kept in the Django
+cache, so they only hold across workers when that cache is shared
+(CACHE_REDIS_URL). Management commands and background workers always use
+the primary.
+"""
+import contextvars
+import hashlib
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Zero when the standby has replayed everything it received; NULL on a primary
+LAG_QUERY = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+_routing = contextvars.ContextVar('db_routing', default=None)
+_lag_checks = {} # alias -> (monotonic time measured, lag in seconds or None if unreachable)
+
+
+def replica_lag(alias):
+    """
+    Seconds `alias` is behind the primary, or None if it could not be reached.
+    Measured at most every LAG_CHECK_SECONDS per worker process.
+    """
+    now = time.monotonic()
+    checked = _lag_checks.get(alias)
+    if checked and now - checked[0] < settings.DATABASE_REPLICAS['LAG_CHECK_SECONDS']:
+        return checked[1]
+    lag = _measure_lag(alias)
+    _lag_checks[alias] = (now, lag)
+    return lag
+
+
+def _measure_lag(alias):
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(LAG_QUERY)
+            lag = cursor.fetchone()[0]
+    except DatabaseError as e:
+        logger.warning('Replica %s unavailable (%s); reading from the primary.', alias, e)
+        return None
+    return float(lag or 0)
+
+
+def pin_seconds():
+    # A replica within the lag limit has caught up with any write older than this
+    replicas = settings.DATABASE_REPLICAS
+    return max(replicas['PIN_SECONDS'], replicas['MAX_LAG_SECONDS'] + replicas['LAG_CHECK_SECONDS'])
+
+
+class RequestRouting:
+    """
+    Routing state of one request, shared by the middleware and the router.
+    """
+    def __init__(self, request):
+        self.request = request
+        self.replica_reads = False # Set by the view's `replica_reads`
+        self.wrote = False
+        self._pinned = None
+        self._replica = None
+
+    def pin_keys(self):
+        from api.ratelimit import client_ip
+
+        identities = [f'ip:{client_ip(self.request)}']
+        authorization = self.request.META.get('HTTP_AUTHORIZATION')
+        if authorization:
+            identities.append(f'auth:{authorization}')
+        # Hashed so tokens and IPs never appear in cache keys
+        return [f'db-primary-pin:{hashlib.sha256(identity.encode()).hexdigest()[:32]}' for identity in identities]
+
+    def pinned(self):
+        if self._pinned is None:
+            self._pinned = bool(cache.get_many(self.pin_keys()))
+        return self._pinned
+
+    def replica(self):
+        """
+        The replica this request reads from, or None for the primary.
+        """
+        if self._replica is None:
+            max_lag = settings.DATABASE_REPLICAS['MAX_LAG_SECONDS']
+            healthy = [alias for alias in settings.DATABASE_REPLICAS['ALIASES']
+                       if (lag := replica_lag(alias)) is not None and lag <= max_lag]
+            self._replica = random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+        return None if self._replica == DEFAULT_DB_ALIAS else self._replica
+
+
+class ReplicaRouter:
+    """
+    Database router sending the reads of opted-in views to a replica; see the module docstring.
+    """
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is None or not routing.replica_reads or routing.wrote:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block or routing.pinned():
+            return None
+        return routing.replica()
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True # Replicas hold the same rows as the primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in settings.DATABASE_REPLICAS['ALIASES'] else None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Tracks each request's routing state, and pins the client to the primary after it writes.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS['ALIASES']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = RequestRouting(request)
+        token = _routing.set(routing)
+        try:
+            return self.get_response(request)
+        finally:
+            _routing.reset(token)
+            if routing.wrote:
+                cache.set_many(dict.fromkeys(routing.pin_keys(), 1), timeout=pin_seconds())
+
+    async def __acall__(self, request):
+        # sync_to_async() copies the context, so the ORM calls of async views see this routing state
+        routing = RequestRouting(request)
+        token = _routing.set(routing)
+        try:
+            return await self.get_response(request)
+        finally:
+            _routing.reset(token)
+            if routing.wrote:
+                await cache.aset_many(dict.fromkeys(routing.pin_keys(), 1), timeout=pin_seconds())
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _routing.get()
+        if routing is not None:
+            view = getattr(view_func, 'view_class', view_func)
+            routing.replica_reads = getattr(view, 'replica_reads', False)
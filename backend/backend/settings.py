@@ -38,11 +38,14 @@ STATICFILES_DIRS = [
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Point at a CDN in front of the media storage in production; uploaded image names never change
+MEDIA_URL = os.getenv('MEDIA_URL', '/media/')
 
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # Reads role/version claims instead of loading the user row (see api/authentication.py)
+        "api.authentication.StatelessJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         # Set to AllowAny for authentication endpoints, then restrict others as needed
@@ -50,6 +53,10 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Seconds a worker may serve a user's cached is_active/role/token_version before re-reading it.
+# Also the longest a deactivated user or revoked token can keep working on another worker.
+AUTH_STATE_CACHE_TTL = int(os.getenv('AUTH_STATE_CACHE_TTL', '30'))
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60), # Increased for better user experience
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
@@ -99,6 +106,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres', # Full-text and trigram search lookups (api/search.py)
     'api',
     'rest_framework',
     'corsheaders'
@@ -106,6 +114,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.query_stats.QueryStatsMiddleware',
+    'backend.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -141,6 +151,62 @@ else:
         'default': dj_database_url.config(default=os.getenv("DATABASE_URL"))
     }
 
+# --- Database connections (see api/db_pool.py) ---
+# On PostgreSQL each worker process keeps a pool of open connections (psycopg_pool), so requests
+# skip the TCP and authentication handshake. A connection is checked with a round trip before a
+# request gets it, and dropped if the server closed it. With DB_POOL_ENABLED=False each request
+# opens its own connection, or reuses one for DB_CONN_MAX_AGE seconds if that is set.
+DB_POOL = {
+    'ENABLED': os.getenv('DB_POOL_ENABLED', 'True') == 'True',
+    'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', '1')),
+    # Per worker process; at least the number of threads that use the database at once
+    'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', '4')),
+    'MAX_IDLE': int(os.getenv('DB_POOL_MAX_IDLE', '300')), # Idle connections beyond MIN_SIZE are closed after this
+    'MAX_LIFETIME': int(os.getenv('DB_POOL_MAX_LIFETIME', '1800')), # Replaced after this, e.g. to pick up failovers
+    'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', '5')), # A request waits this long for a free connection
+}
+
+# --- Read replicas (see backend/db_router.py) ---
+# DATABASE_REPLICA_URLS lists replica URLs separated by spaces; they become the aliases replica1,
+# replica2, ... Views with `replica_reads = True` read from them unless the client wrote in the last
+# PIN_SECONDS (raised to MAX_LAG_SECONDS + LAG_CHECK_SECONDS if lower) or the replicas are lagging.
+DATABASE_REPLICAS = {
+    'ALIASES': [],
+    'PIN_SECONDS': float(os.getenv('DB_REPLICA_PIN_SECONDS', '5')),
+    'MAX_LAG_SECONDS': float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', '2')), # Lagging replicas are skipped
+    'LAG_CHECK_SECONDS': float(os.getenv('DB_REPLICA_LAG_CHECK_SECONDS', '1')), # Per worker and replica
+}
+for number, url in enumerate(os.getenv('DATABASE_REPLICA_URLS', '').split(), start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {**dj_database_url.parse(url), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS['ALIASES'].append(alias)
+DATABASE_ROUTERS = ['backend.db_router.ReplicaRouter']
+
+for database in DATABASES.values():
+    # CONN_HEALTH_CHECKS makes the pool run psycopg_pool's check_connection on each checkout
+    database['CONN_HEALTH_CHECKS'] = True
+    if database.get('ENGINE') == 'django.db.backends.postgresql' and DB_POOL['ENABLED']:
+        database['CONN_MAX_AGE'] = 0 # Connections go back to the pool at the end of each request
+        database.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DB_POOL['MIN_SIZE'],
+            'max_size': DB_POOL['MAX_SIZE'],
+            'max_idle': DB_POOL['MAX_IDLE'],
+            'max_lifetime': DB_POOL['MAX_LIFETIME'],
+            'timeout': DB_POOL['TIMEOUT'],
+        }
+    else:
+        database['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '0'))
+
+# --- Query statistics (see api/query_stats.py) ---
+# Queries per request are counted by URL name and served at /api/admin/query-stats/. Views can
+# declare a `query_budget`; going over it is logged, and fails the test suite via TEST_RUNNER.
+QUERY_STATS = {
+    'ENABLED': os.getenv('QUERY_STATS_ENABLED', 'True') == 'True',
+    'N_PLUS_ONE_THRESHOLD': int(os.getenv('QUERY_STATS_N_PLUS_ONE_THRESHOLD', '5')), # Repeats of one query
+    'ENFORCE_BUDGETS': False, # Raise instead of logging; on under the test runner
+}
+TEST_RUNNER = 'api.testing.QueryBudgetTestRunner'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -160,6 +226,51 @@ TEMPLATES = [
 STATIC_URL = 'static/'
 
 
+# Password hashing (see api/hashing.py)
+# TIER picks the hasher for new hashes: 'argon2', 'bcrypt' or 'pbkdf2'. Existing hashes keep
+# working and are re-hashed with the preferred hasher/work factor on the next successful login.
+PASSWORD_HASHING = {
+    'TIER': os.getenv('PASSWORD_HASHING_TIER', 'bcrypt'),
+    'BCRYPT_ROUNDS': int(os.getenv('PASSWORD_BCRYPT_ROUNDS', '10')),
+    'ARGON2_TIME_COST': int(os.getenv('PASSWORD_ARGON2_TIME_COST', '2')),
+    'ARGON2_MEMORY_COST': int(os.getenv('PASSWORD_ARGON2_MEMORY_COST', '19456')), # KiB
+    'ARGON2_PARALLELISM': int(os.getenv('PASSWORD_ARGON2_PARALLELISM', '1')),
+    'PBKDF2_ITERATIONS': int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', '1000000')),
+}
+PASSWORD_HASHER_TIERS = {
+    'argon2': 'api.hashing.TunedArgon2PasswordHasher',
+    'bcrypt': 'api.hashing.TunedBCryptSHA256PasswordHasher',
+    'pbkdf2': 'api.hashing.TunedPBKDF2PasswordHasher',
+}
+# The preferred hasher comes first; the others only verify (and upgrade) existing hashes.
+PASSWORD_HASHERS = [PASSWORD_HASHER_TIERS[PASSWORD_HASHING['TIER']]] + [
+    path for tier, path in PASSWORD_HASHER_TIERS.items() if tier != PASSWORD_HASHING['TIER']
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+AUTHENTICATION_BACKENDS = [
+    'api.hashing.HashingPolicyBackend',
+]
+
+# Serve auth/register/ and auth/login/ with the async views in api/async_views.py (run under backend/asgi.py).
+# They hash passwords on these per-process pools; when WORKERS + MAX_QUEUE jobs are in flight
+# the endpoint answers 503 with Retry-After. EXECUTOR is 'process' or 'thread'.
+ASYNC_AUTH_VIEWS = os.getenv('ASYNC_AUTH_VIEWS', 'False') == 'True'
+AUTH_HASH_POOLS = {
+    'login': {
+        'WORKERS': int(os.getenv('LOGIN_HASH_WORKERS', '2')),
+        'MAX_QUEUE': int(os.getenv('LOGIN_HASH_MAX_QUEUE', '64')),
+        'EXECUTOR': 'process',
+    },
+    'register': {
+        'WORKERS': int(os.getenv('REGISTER_HASH_WORKERS', '1')),
+        'MAX_QUEUE': int(os.getenv('REGISTER_HASH_MAX_QUEUE', '32')),
+        'EXECUTOR': 'process',
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -216,15 +327,139 @@ AWS_SES_AUTO_THROTTLE_ENABLED = os.getenv('AWS_SES_AUTO_THROTTLE_ENABLED', defau
 # Set the default 'from' email address for all emails sent by Django
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', default="noreply@yourdomain.com")
 
-# In your settings.py
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake', # Can be any unique string
-    }
+# --- Outbound email queue (see api/mail_queue.py) ---
+# Views only enqueue messages; `python manage.py process_email_queue` delivers them.
+# TRANSPORT is 'ses' in production, 'file' or 'smtp' (e.g. a local SMTP sink) for offline testing.
+EMAIL_QUEUE = {
+    'TRANSPORT': os.getenv('EMAIL_QUEUE_TRANSPORT', 'ses'),
+    'FILE_PATH': os.getenv('EMAIL_QUEUE_FILE_PATH', os.path.join(BASE_DIR, 'sent_emails')),
+    'SMTP_HOST': os.getenv('EMAIL_QUEUE_SMTP_HOST', 'localhost'),
+    'SMTP_PORT': int(os.getenv('EMAIL_QUEUE_SMTP_PORT', '1025')),
+    'BATCH_SIZE': int(os.getenv('EMAIL_QUEUE_BATCH_SIZE', '25')),
+    'MAX_ATTEMPTS': int(os.getenv('EMAIL_QUEUE_MAX_ATTEMPTS', '6')),
+    'BACKOFF_SECONDS': 15, # First retry waits up to 15s, doubling each attempt
+    'MAX_BACKOFF_SECONDS': 1800,
+    'LEASE_SECONDS': 120, # A claimed message is reclaimed if its worker dies
+    # Contexts holding secrets, cleared when dead-lettered too and never requeued
+    'SECRET_TEMPLATES': ['api/emails/otp_verification.html'],
+    'RETENTION_DAYS': int(os.getenv('EMAIL_QUEUE_RETENTION_DAYS', '30')), # Then sent and dead rows are purged
+}
+
+# --- Event announcements (see api/bulk_mail.py) ---
+# `python manage.py send_announcements` sends them with SES SendBulkTemplatedEmail calls.
+BULK_EMAIL = {
+    # e.g. http://127.0.0.1:<port> for api.testing.FakeSESServer; empty for the real SES endpoint
+    'SES_ENDPOINT_URL': os.getenv('BULK_EMAIL_SES_ENDPOINT_URL') or None,
+    'TEMPLATE_PREFIX': os.getenv('BULK_EMAIL_TEMPLATE_PREFIX', 'sari-sari-announcement'),
+    'MAX_SEND_RATE': float(os.getenv('BULK_EMAIL_MAX_SEND_RATE', '0')), # Messages/sec; 0 asks SES for the account's
+    'RATE_HEADROOM': 0.9, # Share of the account's rate used, leaving room for transactional mail
+    'DESTINATIONS_PER_CALL': 50, # The SES maximum
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_SECONDS': 30, # First retry waits up to 30s, doubling each attempt
+    'LEASE_SECONDS': 300, # Rows still 'sending' after this are marked 'unknown'
+    'MAX_BODY_CHARS': 20_000,
+}
+
+# --- Email verification codes (see api/otp_store.py) ---
+# Must be shared by every worker: use the database table or a Redis-protocol server.
+OTP_STORE = {
+    'BACKEND': os.getenv('OTP_STORE_BACKEND', 'api.otp_store.DatabaseOTPStore'),
+    'REDIS_URL': os.getenv('OTP_REDIS_URL', 'redis://localhost:6379/0'),
+    'TTL_SECONDS': 300, # 5 minutes, as stated in the OTP email
+    'MAX_ATTEMPTS': 5, # Wrong guesses before the code is burned
+}
+
+# --- Ticket reservations (see api/reservations.py) ---
+# Held tickets go back on sale after HOLD_SECONDS; run `python manage.py release_expired_holds` every minute.
+TICKET_HOLDS = {
+    'HOLD_SECONDS': int(os.getenv('TICKET_HOLD_SECONDS', '600')),
+    'MAX_PER_HOLD': 10,
 }
 
+# --- Ticket QR codes and check-in (see api/ticket_codes.py) ---
+TICKET_CODES = {
+    # Per-event signing keys are derived from this; changing it invalidates every issued code
+    'SECRET': os.getenv('TICKET_CODE_SECRET') or SECRET_KEY,
+    'MAX_SCANS_PER_BATCH': 500,
+    # Each worker keeps the valid ticket ids of this many recently scanned events in memory,
+    # reloading a set after this many seconds or when a ticket of the event changes
+    'VALID_SET_EVENTS': 16,
+    'VALID_SET_MAX_AGE': int(os.getenv('TICKET_VALID_SET_MAX_AGE', '300')),
+}
+
+# --- Image uploads (see api/images.py) ---
+# Variants are generated by `python manage.py process_images`; keep one running.
+IMAGE_UPLOADS = {
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'MAX_PIXELS': 40_000_000, # Larger images are refused rather than decoded
+    'WIDTHS': {
+        'event_banner': (320, 640, 960, 1280, 1920),
+        'profile_picture': (64, 128, 256), # Square crops
+    },
+    # Encoder options per variant format, in order of preference
+    'FORMATS': {
+        'avif': {'quality': 55, 'speed': 8},
+        'webp': {'quality': 80, 'method': 4},
+    },
+    'WORKERS': int(os.getenv('IMAGE_WORKERS', '0')) or None, # Processes per worker command; None = one per CPU
+    'BATCH_SIZE': 8,
+    'LEASE_SECONDS': 300,
+    'MAX_ATTEMPTS': 3,
+}
+
+# --- Event search (see api/search.py) ---
+# Typo tolerance needs the pg_trgm extension: migrate as a role with CREATE on the database, or have an
+# administrator run `CREATE EXTENSION pg_trgm` first (see api/migration_operations.py).
+EVENT_SEARCH = {
+    'CONFIG': os.getenv('EVENT_SEARCH_CONFIG', 'english'), # PostgreSQL text search configuration
+    'TRIGRAM_THRESHOLD': 0.3, # Minimum title similarity for typo matches (pg_trgm's default)
+}
+
+# --- Recommended events (see api/recommendations.py) ---
+# Lists are precomputed by `python manage.py compute_recommendations`; run it hourly.
+RECOMMENDATIONS = {
+    'LIST_SIZE': int(os.getenv('RECOMMENDATIONS_LIST_SIZE', '24')), # Cards stored per user and per category
+}
+
+# --- Admin dashboard (see api/event_status.py) ---
+ADMIN_DASHBOARD = {
+    # Event tab counts and pages are cached this long; any event save invalidates them sooner
+    'CACHE_SECONDS': int(os.getenv('ADMIN_DASHBOARD_CACHE_SECONDS', '30')),
+}
+
+# --- Rate limits (see api/ratelimit.py) ---
+RATE_LIMITS = {
+    'CACHE': 'default', # Must be shared by every worker (set CACHE_REDIS_URL) for limits to hold across workers
+    # Proxies in front of Django that append to X-Forwarded-For (e.g. 1 behind the load balancer)
+    'TRUSTED_PROXY_COUNT': int(os.getenv('TRUSTED_PROXY_COUNT', '0')),
+    # Token buckets: name -> (capacity, seconds to regain one token)
+    'BUCKETS': {
+        'find_tickets_ip': (10, 360), # Bursts of 10, then 10 an hour per client IP
+        'find_tickets_email': (3, 1200), # 3 an hour per email address
+    },
+}
+
+# Per-process by default. Set CACHE_REDIS_URL (e.g. redis://localhost:6379/1) to share the
+# cache between workers, which the rate limits and the other cached state rely on.
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake', # Can be any unique string
+        }
+    }
+
 CORS_ALLOW_ALL_ORIGINS = DEBUG
 CORS_ALLOWS_CREDENTIALS = True
 
-GOOGLE_CLIENT_ID = '1012610059915-plt61d82bht9hnk9j9p8ntnaf8ta4nu7.apps.googleusercontent.com'
\ No newline at end of file
+GOOGLE_CLIENT_ID = '1012610059915-plt61d82bht9hnk9j9p8ntnaf8ta4nu7.apps.googleusercontent.com'
+# Google's ID token signing certificates, cached per process by api/google_auth.py
+GOOGLE_CERTS_URL = os.getenv('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v1/certs')
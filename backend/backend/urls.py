@@ -1,4 +1,6 @@
 # backend/urls.py
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
@@ -6,3 +8,5 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
 ]
+# Uploaded images, in development only; production serves MEDIA_URL from storage or a CDN
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
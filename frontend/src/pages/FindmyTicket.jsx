@@ -1,5 +1,6 @@
 import React, { useState } from 'react';
 import { IoIosArrowBack } from "react-icons/io";
+import api from "../api.js";
 
 const FindMyTicket = () => {
   const [email, setEmail] = useState('');
@@ -16,13 +17,15 @@ const FindMyTicket = () => {
     }
     
     setIsLoading(true);
-    // Simulate an API call
     try {
-      console.log(`Looking up tickets for: ${email}`);
-      await new Promise(resolve => setTimeout(resolve, 2000));
-      console.log('Ticket found!');
+      // Always answers the same way, whether or not the email has tickets
+      const response = await api.post('/tickets/find/', { email });
+      alert(response.data.detail);
     } catch (error) {
       console.error('Failed to find ticket:', error);
+      const data = error.response?.data;
+      if (data?.email) alert(`Email: ${data.email[0]}`);
+      else alert(data?.detail || 'Something went wrong. Please try again.');
     } finally {
       setIsLoading(false);
     }